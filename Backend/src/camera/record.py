@@ -1,5 +1,6 @@
 import cv2
 import os
+import json
 import time
 from datetime import datetime
 from pathlib import Path
@@ -13,7 +14,8 @@ class ContinuousRecorder:
         frame_width=1280,
         frame_height=720,
         fps=20,
-        segment_duration=180  # 3 minutes per file
+        segment_duration=180,  # 3 minutes per file
+        detector=None  # optional LiveDetector fed with every recorded frame
     ):
         self.camera_id = camera_id
         self.output_dir = Path(output_dir)
@@ -23,11 +25,14 @@ class ContinuousRecorder:
         self.frame_height = frame_height
         self.fps = fps
         self.segment_duration = segment_duration
+        self.detector = detector
         
         self.cap = None
         self.writer = None
         self.current_filename = None
         self.segment_start_time = None
+        self.segment_frame_count = 0
+        self.last_frame_time = None
         
     def initialize_camera(self):
         """Initialize camera capture."""
@@ -47,11 +52,40 @@ class ContinuousRecorder:
         
         print(f"Camera initialized: {actual_width}x{actual_height} @ {actual_fps} FPS")
         
+    def write_segment_info(self, capture_end=None):
+        """
+        Sidecar <segment>.json with the capture interval (epoch seconds). The encryptor
+        carries it over, so videos docs are searchable by when footage was recorded.
+        """
+        info = {
+            'segment': self.current_filename,
+            'camera_id': str(self.camera_id),
+            'capture_start': self.segment_start_time,
+            'fps': self.fps,
+        }
+        if capture_end is not None:
+            info['capture_end'] = capture_end
+            info['frames'] = self.segment_frame_count
+        path = (self.output_dir / self.current_filename).with_suffix('.json')
+        tmp = path.with_suffix('.json.tmp')
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(info, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"⚠️ Failed to write segment info for {self.current_filename}: {e}")
+
+    def close_segment(self):
+        self.writer.release()
+        self.write_segment_info(capture_end=self.last_frame_time or time.time())
+
     def create_new_segment(self):
         """Create a new video segment file."""
         if self.writer is not None:
-            self.writer.release()
+            self.close_segment()
             print(f"Completed: {self.current_filename}")
+            if self.detector is not None:
+                self.detector.segment_closed(self.current_filename)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.current_filename = f"cam_{self.camera_id}_{timestamp}.mp4"
@@ -66,6 +100,9 @@ class ContinuousRecorder:
         )
         
         self.segment_start_time = time.time()
+        self.segment_frame_count = 0
+        self.last_frame_time = None
+        self.write_segment_info()
         print(f"Started recording: {self.current_filename}")
         
     def should_create_new_segment(self):
@@ -103,7 +140,13 @@ class ContinuousRecorder:
                 # Write frame
                 if self.writer is not None:
                     self.writer.write(frame)
+                    self.last_frame_time = time.time()
                     frame_count += 1
+                    
+                    # Hand the already-decoded frame to detection (non-blocking)
+                    if self.detector is not None:
+                        self.detector.submit(self.current_filename, self.segment_frame_count, frame)
+                    self.segment_frame_count += 1
                 
                 # Display (optional - remove for headless)
                 cv2.imshow('Recording', frame)
@@ -118,8 +161,10 @@ class ContinuousRecorder:
     def cleanup(self):
         """Release resources."""
         if self.writer is not None:
-            self.writer.release()
+            self.close_segment()
             print(f"Final segment saved: {self.current_filename}")
+            if self.detector is not None:
+                self.detector.segment_closed(self.current_filename)
         
         if self.cap is not None:
             self.cap.release()
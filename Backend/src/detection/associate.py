@@ -0,0 +1,152 @@
+# associate.py (vectorized plate -> vehicle association + batched crops)
+import time
+import argparse
+
+import numpy as np
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise IoU between boxes a (N,4) and b (M,4) in xyxy, returns (N,M).
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def associate_plates(plate_xyxy: np.ndarray, vehicle_xyxy: np.ndarray, vehicle_ids: np.ndarray) -> np.ndarray:
+    """
+    For every plate pick the vehicle whose box contains the plate centre,
+    breaking ties between overlapping vehicles by highest IoU with the plate.
+    Returns (N,) vehicle ids, -1 where no vehicle contains the plate.
+    """
+    plate_xyxy = np.asarray(plate_xyxy, dtype=np.float32).reshape(-1, 4)
+    vehicle_xyxy = np.asarray(vehicle_xyxy, dtype=np.float32).reshape(-1, 4)
+    vehicle_ids = np.asarray(vehicle_ids, dtype=np.int64).reshape(-1)
+
+    n = len(plate_xyxy)
+    if n == 0 or len(vehicle_xyxy) == 0:
+        return np.full(n, -1, dtype=np.int64)
+
+    cx = (plate_xyxy[:, 0] + plate_xyxy[:, 2]) / 2
+    cy = (plate_xyxy[:, 1] + plate_xyxy[:, 3]) / 2
+    inside = (
+        (vehicle_xyxy[None, :, 0] <= cx[:, None]) & (cx[:, None] <= vehicle_xyxy[None, :, 2])
+        & (vehicle_xyxy[None, :, 1] <= cy[:, None]) & (cy[:, None] <= vehicle_xyxy[None, :, 3])
+    )
+
+    score = np.where(inside, box_iou(plate_xyxy, vehicle_xyxy), -1.0)
+    best = score.argmax(axis=1)
+    hit = score[np.arange(n), best] >= 0
+    return np.where(hit, vehicle_ids[best], -1)
+
+
+def clip_boxes(boxes: np.ndarray, w: int, h: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Clip xyxy boxes to the image like safe_crop does, returns (int boxes, valid mask).
+    """
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).astype(np.int64)
+    b[:, [0, 2]] = np.clip(b[:, [0, 2]], 0, w - 1)
+    b[:, [1, 3]] = np.clip(b[:, [1, 3]], 0, h - 1)
+    valid = (b[:, 2] > b[:, 0]) & (b[:, 3] > b[:, 1])
+    return b, valid
+
+
+def safe_crop_batch(img, boxes: np.ndarray) -> list:
+    """
+    Batched safe_crop: one clip pass over all boxes, returns a list of crops (None if empty).
+    """
+    h, w = img.shape[:2]
+    b, valid = clip_boxes(boxes, w, h)
+    return [img[y1:y2, x1:x2].copy() if ok else None for (x1, y1, x2, y2), ok in zip(b.tolist(), valid.tolist())]
+
+
+# ------------------ Micro-benchmark ------------------
+def _associate_loop(plate_xyxy, vehicle_boxes):
+    """The original per-plate Python loop (first containing vehicle wins)."""
+    out = []
+    for px1, py1, px2, py2 in plate_xyxy:
+        cx = (px1 + px2) / 2
+        cy = (py1 + py2) / 2
+        assoc_id = -1
+        for (x1, y1, x2, y2, tid) in vehicle_boxes:
+            if x1 <= cx <= x2 and y1 <= cy <= y2:
+                assoc_id = tid
+                break
+        out.append(assoc_id)
+    return out
+
+
+def _random_frame(rng, n_vehicles, n_plates, w=1920, h=1080):
+    vx1 = rng.uniform(0, w - 200, n_vehicles)
+    vy1 = rng.uniform(0, h - 150, n_vehicles)
+    vw = rng.uniform(80, 400, n_vehicles)
+    vh = rng.uniform(60, 300, n_vehicles)
+    vehicles = np.stack([vx1, vy1, np.minimum(vx1 + vw, w), np.minimum(vy1 + vh, h)], axis=1).astype(np.float32)
+
+    # Plates sit near the bottom centre of a random vehicle
+    owner = rng.integers(0, n_vehicles, n_plates)
+    v = vehicles[owner]
+    pcx = (v[:, 0] + v[:, 2]) / 2
+    pcy = v[:, 1] + (v[:, 3] - v[:, 1]) * 0.8
+    plates = np.stack([pcx - 30, pcy - 10, pcx + 30, pcy + 10], axis=1).astype(np.float32)
+    return vehicles, plates
+
+
+def bench(vehicle_counts=(5, 30, 60), plates_per_frame=None, frames=500, seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    print(f"{'vehicles':>8} {'plates':>6} {'loop_us':>9} {'numpy_us':>9} {'speedup':>7} {'crops_loop_us':>13} {'crops_batch_us':>14}")
+    for nv in vehicle_counts:
+        npl = plates_per_frame or max(1, nv // 2)
+        data = [_random_frame(rng, nv, npl) for _ in range(frames)]
+        ids = np.arange(nv)
+
+        t = time.perf_counter()
+        for vehicles, plates in data:
+            vb = [(*vehicles[i], int(ids[i])) for i in range(nv)]
+            _associate_loop(plates, vb)
+        loop_us = (time.perf_counter() - t) / frames * 1e6
+
+        t = time.perf_counter()
+        for vehicles, plates in data:
+            associate_plates(plates, vehicles, ids)
+        np_us = (time.perf_counter() - t) / frames * 1e6
+
+        from src.detection.plates_detect import safe_crop
+        t = time.perf_counter()
+        for _, plates in data:
+            for px1, py1, px2, py2 in plates:
+                safe_crop(img, px1, py1, px2, py2)
+        crop_loop_us = (time.perf_counter() - t) / frames * 1e6
+
+        t = time.perf_counter()
+        for _, plates in data:
+            safe_crop_batch(img, plates)
+        crop_batch_us = (time.perf_counter() - t) / frames * 1e6
+
+        print(f"{nv:>8} {npl:>6} {loop_us:>9.1f} {np_us:>9.1f} {loop_us / np_us:>6.1f}x {crop_loop_us:>13.1f} {crop_batch_us:>14.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmark plate->vehicle association")
+    ap.add_argument("--vehicles", type=int, nargs="+", default=[5, 30, 60])
+    ap.add_argument("--plates", type=int, default=None, help="plates per frame (default: vehicles/2)")
+    ap.add_argument("--frames", type=int, default=500)
+    args = ap.parse_args()
+    bench(args.vehicles, args.plates, args.frames)
+
+
+if __name__ == "__main__":
+    main()
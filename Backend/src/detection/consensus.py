@@ -0,0 +1,112 @@
+# consensus.py (multi-frame plate reads: top-K crops per track + per-character vote)
+import os
+import heapq
+import itertools
+
+from src.detection.ocr_plates import PLATE_RE, read_plate
+
+
+DEFAULT_TOP_K = int(os.environ.get('EV_OCR_TOP_K', 3))
+
+
+class TopKCrops:
+    """
+    Keeps the K best crops (by quality score) of every track, so a track's plate
+    is read from several frames instead of the single sharpest one.
+    """
+
+    def __init__(self, k: int = DEFAULT_TOP_K):
+        self.k = max(1, int(k))
+        self.tracks = {}  # tid -> min-heap of (score, seq, crop, ts, frame_no)
+        self._seq = itertools.count()  # tie-break so crops are never compared
+
+    def add(self, tid, score: float, crop, ts: float, frame_no: int = None):
+        heap = self.tracks.setdefault(tid, [])
+        entry = (score, next(self._seq), crop, ts, frame_no)
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def pop(self, tid):
+        """Remove a track; returns its crops best first as (score, crop, ts, frame_no)."""
+        heap = self.tracks.pop(tid, [])
+        return [(s, crop, ts, fno) for s, _, crop, ts, fno in sorted(heap, reverse=True)]
+
+    def __contains__(self, tid):
+        return tid in self.tracks
+
+    def __iter__(self):
+        return iter(list(self.tracks))
+
+    def __len__(self):
+        return len(self.tracks)
+
+
+class PlateVote:
+    """
+    Confidence-weighted per-character vote over several reads of one plate.
+
+    Reads are grouped by letter/digit layout (e.g. LLDDLLDDDD) so positions line
+    up; the heaviest group wins and each position takes its heaviest character.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.groups = {}  # layout -> [total weight, [{char: weight} per position]]
+
+    def add(self, text: str, conf: float):
+        self.reads += 1
+        if not text:
+            return
+        layout = "".join("D" if c.isdigit() else "L" for c in text)
+        group = self.groups.get(layout)
+        if group is None:
+            group = self.groups[layout] = [0.0, [dict() for _ in text]]
+        w = max(float(conf), 1e-3)
+        group[0] += w
+        for pos, c in zip(group[1], text):
+            pos[c] = pos.get(c, 0.0) + w
+
+    def leader(self):
+        """(text, conf): conf is the mean weight behind each chosen char per read."""
+        if not self.groups:
+            return "", 0.0
+        _, positions = max(self.groups.values(), key=lambda g: g[0])
+        chars = [max(pos.items(), key=lambda kv: kv[1]) for pos in positions]
+        text = "".join(c for c, _ in chars)
+        return text, sum(w for _, w in chars) / len(chars) / self.reads
+
+
+def read_track(crops, min_len: int = 6, patience: int = 2, accept_conf: float = 0.9, read_fn=read_plate):
+    """
+    OCR a track's crops (best first) until the vote settles.
+
+    Stops once the consensus text is unchanged for `patience` reads in a row, or
+    right after the first read if it is plate-shaped with conf >= accept_conf.
+    Returns (text, conf, reads used).
+    """
+    vote = PlateVote()
+    leader, streak = "", 0
+    used = 0
+
+    for crop in crops:
+        text, conf, _, _ = read_fn(crop, min_len=min_len)
+        used += 1
+        vote.add(text, conf)
+
+        if used == 1 and text and conf >= accept_conf and PLATE_RE.match(text):
+            break
+
+        current, _ = vote.leader()
+        if current and current == leader:
+            streak += 1
+        else:
+            leader, streak = current, (1 if current else 0)
+        if streak >= patience:
+            break
+
+    text, conf = vote.leader()
+    if len(text) < min_len:
+        return "", 0.0, used
+    return text, conf, used
@@ -0,0 +1,258 @@
+# crop_store.py (append-only pack files + compact index for plate crops)
+import os
+import mmap
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+DEFAULT_STORE_DIR = os.environ.get('EV_CROP_STORE', 'data/plates_store')
+DEFAULT_PACK_BYTES = int(os.environ.get('EV_CROP_PACK_MB', 256)) * 1024 * 1024
+
+INDEX_NAME = "crops.idx"
+LOCK_NAME = "crops.lock"
+PACK_FMT = "crops_{:06d}.pack"
+
+# One fixed-size record per crop, appended after the bytes hit the pack file
+INDEX_DTYPE = np.dtype([
+    ("pack", "<u4"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("track", "<i8"),
+    ("ts", "<f8"),
+    ("camera", "S16"),
+])
+
+CropRecord = namedtuple("CropRecord", "seq pack offset length track ts camera data")
+
+
+def crop_name(ts: float, track: int) -> str:
+    """Same name the loose-JPEG layout used, so CSV rows stay comparable."""
+    from datetime import datetime
+    stamp = datetime.fromtimestamp(ts).strftime("%Y%m%d_%H%M%S_%f")
+    return f"plate_{stamp}_vid{track}.jpg"
+
+
+class StoreLock:
+    """Exclusive lock on the store's lock file, shared by every writer process."""
+
+    def __init__(self, path: str):
+        self._fh = open(path, "a+b")
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        self._fh.close()
+
+
+class CropStoreWriter:
+    """
+    Appends encoded crops to the current pack file and one index record per crop.
+    Pack files roll over at max_pack_bytes; nothing is ever rewritten in place.
+    Each append holds the store lock, and offsets come from the pack's size on
+    disk, so several processes can write to one store.
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, camera_id: str = "", max_pack_bytes: int = DEFAULT_PACK_BYTES):
+        self.store_dir = store_dir
+        self.camera_id = str(camera_id or "")
+        self.max_pack_bytes = int(max_pack_bytes)
+        os.makedirs(self.store_dir, exist_ok=True)
+
+        self.index_path = os.path.join(self.store_dir, INDEX_NAME)
+        self._index = open(self.index_path, "ab")
+        self._lock = StoreLock(os.path.join(self.store_dir, LOCK_NAME))
+
+        # Drop a torn trailing record so new records stay aligned
+        with self._lock:
+            size = os.fstat(self._index.fileno()).st_size
+            if size % INDEX_DTYPE.itemsize:
+                self._index.truncate(size - size % INDEX_DTYPE.itemsize)
+
+        # Resume on the newest pack so restarts keep appending
+        packs = sorted(f for f in os.listdir(self.store_dir) if f.startswith("crops_") and f.endswith(".pack"))
+        self.pack_id = int(packs[-1][6:12]) if packs else 0
+        self._open_pack()
+
+    def _pack_path(self, pack_id: int) -> str:
+        return os.path.join(self.store_dir, PACK_FMT.format(pack_id))
+
+    def _open_pack(self):
+        self._pack = open(self._pack_path(self.pack_id), "ab")
+
+    def _roll(self):
+        self._pack.close()
+        self.pack_id += 1
+        self._open_pack()
+
+    def append(self, data: bytes, track: int, ts: float, camera_id: str = None) -> int:
+        """Append one encoded crop (e.g. JPEG bytes). Returns its offset in the pack."""
+        rec = np.zeros(1, dtype=INDEX_DTYPE)
+        rec["length"] = len(data)
+        rec["track"] = int(track)
+        rec["ts"] = float(ts)
+        rec["camera"] = (camera_id if camera_id is not None else self.camera_id).encode("utf-8")[:16]
+
+        with self._lock:
+            # another writer may have rolled over to a newer pack
+            while os.path.exists(self._pack_path(self.pack_id + 1)):
+                self._roll()
+            size = os.fstat(self._pack.fileno()).st_size
+            if size and size + len(data) > self.max_pack_bytes:
+                self._roll()
+                size = 0
+
+            self._pack.write(data)
+            self._pack.flush()
+
+            rec["pack"] = self.pack_id
+            rec["offset"] = size
+            self._index.write(rec.tobytes())
+            self._index.flush()
+        return size
+
+    def append_image(self, img, track: int, ts: float, camera_id: str = None, quality: int = 95):
+        """Encode a BGR crop as JPEG and append it. Returns the offset or None."""
+        import cv2
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if not ok:
+            return None
+        return self.append(buf.tobytes(), track, ts, camera_id)
+
+    def close(self):
+        for fh in (self._pack, self._index, self._lock):
+            try:
+                fh.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CropStoreReader:
+    """
+    Reads the whole index in one go and serves crop bytes from mmapped packs,
+    so iterating millions of crops never lists or opens files per crop.
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self.index_path = os.path.join(self.store_dir, INDEX_NAME)
+        if not os.path.isfile(self.index_path):
+            raise RuntimeError(f"Crop store index not found: {self.index_path}")
+
+        # A torn trailing record (writer killed mid-write) is ignored
+        size = os.path.getsize(self.index_path)
+        count = size // INDEX_DTYPE.itemsize
+        # records live in a buffer that doubles when full, so refresh() only reads what's new
+        self._buf = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count)
+        self._n = len(self._buf)
+        self._maps = {}
+
+    @property
+    def index(self):
+        return self._buf[:self._n]
+
+    def __len__(self):
+        return self._n
+
+    def refresh(self):
+        """Pick up records appended since the index was read; returns their positions."""
+        old = self._n
+        count = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        if count <= old:
+            return range(old, old)
+        if count > len(self._buf):
+            grown = np.empty(max(count, 2 * len(self._buf)), dtype=INDEX_DTYPE)
+            grown[:old] = self._buf[:old]
+            self._buf = grown
+        self._buf[old:count] = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count - old,
+                                           offset=old * INDEX_DTYPE.itemsize)
+        self._n = count
+        # packs may have grown or rolled over since they were mapped
+        self.close()
+        return range(old, count)
+
+    def _map(self, pack_id: int):
+        m = self._maps.get(pack_id)
+        if m is None:
+            path = os.path.join(self.store_dir, PACK_FMT.format(pack_id))
+            with open(path, "rb") as fh:
+                m = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[pack_id] = m
+        return m
+
+    def select(self, camera_id: str = None, since: float = None, until: float = None, track: int = None):
+        """Return index positions matching the filters, in append order."""
+        mask = np.ones(self._n, dtype=bool)
+        if camera_id is not None:
+            mask &= self.index["camera"] == str(camera_id).encode("utf-8")[:16]
+        if since is not None:
+            mask &= self.index["ts"] >= since
+        if until is not None:
+            mask &= self.index["ts"] < until
+        if track is not None:
+            mask &= self.index["track"] == int(track)
+        return np.flatnonzero(mask)
+
+    def get(self, seq: int) -> CropRecord:
+        r = self.index[seq]
+        off = int(r["offset"])
+        n = int(r["length"])
+        data = memoryview(self._map(int(r["pack"])))[off: off + n]
+        return CropRecord(
+            int(seq), int(r["pack"]), off, n, int(r["track"]), float(r["ts"]),
+            r["camera"].decode("utf-8", "replace"), data,
+        )
+
+    def __iter__(self):
+        for seq in range(self._n):
+            yield self.get(seq)
+
+    def iter_records(self, **filters):
+        for seq in self.select(**filters):
+            yield self.get(int(seq))
+
+    def iter_images(self, **filters):
+        """Yield (record, BGR image) decoded straight from the mmapped bytes."""
+        import cv2
+        for rec in self.iter_records(**filters):
+            img = cv2.imdecode(np.frombuffer(rec.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            yield rec, img
+
+    def close(self):
+        for m in self._maps.values():
+            try:
+                m.close()
+            except Exception:
+                pass
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,309 @@
+# live_detect.py (detection stage fed by ContinuousRecorder frames)
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from src.detection.associate import associate_plates, safe_crop_batch
+from src.detection.ocr_worker import OcrWorker, SUBMIT_TIMEOUT_S as OCR_SUBMIT_TIMEOUT_S
+from src.detection.consensus import TopKCrops, DEFAULT_TOP_K
+from src.detection.plate_text import plate_keys, ensure_sighting_indexes
+from src.detection.models import get_yolo, warmup_yolo
+from src.detection import watchlist as watchlist_mod
+
+
+# COCO vehicle classes: car(2), motorcycle(3), bus(5), truck(7)
+VEHICLE_CLASSES = [2, 3, 5, 7]
+
+_SEGMENT_END = object()
+_STOP = object()
+
+
+class LiveDetector:
+    """
+    Runs vehicle tracking + plate detection on frames the recorder already decoded.
+
+    The recorder calls submit() for every frame and segment_closed() when it rolls
+    to a new file. Neither call ever blocks: when detection falls behind, frames are
+    dropped (and counted) instead of slowing down recording. A track unseen for
+    track_timeout frames goes to the OCR worker right away (its top_k best crops,
+    read by consensus) so watchlist alerts don't wait for the segment to close;
+    the rest go when it closes, and the plates are written to Mongo once the worker
+    has read them all.
+    """
+
+    def __init__(
+        self,
+        camera_id=os.environ.get('EV_CAMERA_ID', 'cam_01'),
+        car_model=os.environ.get('EV_CAR_MODEL', 'yolov8n.pt'),
+        plate_model=os.environ.get('EV_PLATE_MODEL', ''),
+        car_conf=0.35,
+        plate_conf=0.35,
+        tracker="bytetrack.yaml",
+        detect_every=int(os.environ.get('EV_DETECT_EVERY', 2)),
+        max_pending=int(os.environ.get('EV_DETECT_MAX_PENDING', 8)),
+        min_len=6,
+        top_k=DEFAULT_TOP_K,
+        track_timeout=int(os.environ.get('EV_TRACK_TIMEOUT_FRAMES', 40)),
+        db=None,
+        watchlist=None,
+        warmup=os.environ.get('EV_MODEL_WARMUP', 'false').lower() == 'true',
+    ):
+        self.camera_id = camera_id
+        self.car_model_path = car_model
+        self.plate_model_path = plate_model
+        self.car_conf = car_conf
+        self.plate_conf = plate_conf
+        self.tracker = tracker
+        self.detect_every = max(1, int(detect_every))
+        self.max_pending = max(1, int(max_pending))
+        self.db = db
+        self.top_k = max(1, int(top_k))
+        self.track_timeout = int(track_timeout or 0)  # 0: tracks are only read at segment close
+        self.watchlist = watchlist
+        self.warmup = warmup
+        self.ocr = OcrWorker(min_len=min_len, warmup=warmup)
+
+        self.q = queue.Queue()
+        self.thread = None
+        self.enabled = True
+
+        self.car_model = None
+        self.plate_model = None
+
+        # segment name -> TopKCrops (tid -> its best crops)
+        self.best = {}
+        # segment name -> {tid: last frame_no seen}, and the OcrResults read so far
+        self.last_seen = {}
+        self.reads = {}
+
+        self.stats = {"submitted": 0, "dropped": 0, "ocr_dropped": 0, "processed": 0, "segments": 0, "plates": 0, "lag_s": 0.0}
+
+    # ------------------ Recorder side (never blocks) ------------------
+    def submit(self, segment: str, frame_no: int, frame, ts: float = None):
+        if not self.enabled or frame_no % self.detect_every:
+            return
+        self.stats["submitted"] += 1
+        if self.q.qsize() >= self.max_pending:
+            self.stats["dropped"] += 1
+            return
+        self.q.put_nowait((segment, frame_no, frame, ts or time.time()))
+
+    def segment_closed(self, segment: str):
+        if not self.enabled:
+            return
+        # control messages are never dropped
+        self.q.put_nowait((segment, None, _SEGMENT_END, time.time()))
+
+    # ------------------ Worker ------------------
+    def start(self):
+        self.ocr.start()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="Detection")
+        self.thread.start()
+        return self.thread
+
+    def close(self, timeout: float = 10.0):
+        """Stop taking frames, finish the queued ones and their OCR, then deliver pending watchlist alerts."""
+        self.enabled = False
+        if self.thread is not None:
+            self.q.put_nowait((None, None, _STOP, time.time()))
+            self.thread.join(timeout)
+        self.ocr.close(timeout)
+        if self.watchlist is not None:
+            self.watchlist.close(timeout)
+
+    def _load_models(self):
+        # without a plate model nothing would be read: don't load (or download) the car model either
+        if not self.plate_model_path or not os.path.exists(self.plate_model_path):
+            raise RuntimeError(f"plate model not provided/found: {self.plate_model_path!r} (set EV_PLATE_MODEL)")
+        t = time.perf_counter()
+        self.car_model = get_yolo(self.car_model_path)
+        self.plate_model = get_yolo(self.plate_model_path)
+        print(f"✅ Plate model loaded: {self.plate_model_path}", flush=True)
+
+        if self.warmup:
+            for m in (self.car_model, self.plate_model):
+                if m is not None:
+                    warmup_yolo(m)
+        print(f"⏱ detection models ready in {time.perf_counter() - t:.2f}s", flush=True)
+
+    def _connect_db(self):
+        if self.db is not None:
+            return
+        from src.server.mongo import get_db
+
+        if not os.environ.get('ev_mongo'):
+            print("⚠️ Detection: no MongoDB URI, plates will only be logged", flush=True)
+            return
+        self.db = get_db()
+        ensure_sighting_indexes(self.db)
+        if self.watchlist is None:
+            try:
+                self.watchlist = watchlist_mod.from_env(self.db)
+            except Exception as e:
+                print(f"⚠️ Watchlist disabled: {e}", flush=True)
+
+    def run(self):
+        try:
+            self._load_models()
+            self._connect_db()
+        except Exception as e:
+            # recording/encryption carry on without detection
+            self.enabled = False
+            print(f"❌ Detection stage disabled: {e}", flush=True)
+            return
+        print(f"Detection stage started (every {self.detect_every} frame(s), max pending {self.max_pending})", flush=True)
+
+        while True:
+            segment, frame_no, frame, ts = self.q.get()
+            if frame is _STOP:
+                break
+            try:
+                if frame is _SEGMENT_END:
+                    self.finish_segment(segment)
+                else:
+                    self.process_frame(segment, frame_no, frame, ts)
+                    self.stats["processed"] += 1
+                    self.stats["lag_s"] = time.time() - ts
+                    if self.stats["processed"] == 1:
+                        print(f"⏱ first frame detected {self.stats['lag_s']:.2f}s after capture", flush=True)
+            except Exception as e:
+                print(f"⚠️ Detection error on {segment}: {e}", flush=True)
+
+    def reset_tracker(self):
+        """Start tracking afresh (new track ids, no hand-over) for an unrelated video."""
+        predictor = getattr(self.car_model, "predictor", None)
+        for tracker in getattr(predictor, "trackers", None) or ():
+            tracker.reset()
+
+    def process_frame(self, segment, frame_no, frame, ts):
+        from src.detection.plates_detect import quality_score
+
+        if self.plate_model is None:
+            return
+
+        try:
+            res = self.car_model.track(
+                source=frame, conf=self.car_conf, classes=VEHICLE_CLASSES,
+                tracker=self.tracker, persist=True, verbose=False,
+            )[0]
+        except Exception:
+            res = self.car_model.predict(source=frame, conf=self.car_conf, classes=VEHICLE_CLASSES, verbose=False)[0]
+
+        if res.boxes is None or res.boxes.xyxy is None or getattr(res.boxes, "id", None) is None:
+            return
+        vehicle_xyxy = res.boxes.xyxy.cpu().numpy()
+        vehicle_ids = res.boxes.id.cpu().numpy().astype(np.int64)
+
+        pres = self.plate_model.predict(frame, conf=self.plate_conf, verbose=False)[0]
+        if pres.boxes is None or pres.boxes.xyxy is None or len(pres.boxes) == 0:
+            return
+        pxyxy = pres.boxes.xyxy.cpu().numpy()
+
+        assoc_ids = associate_plates(pxyxy, vehicle_xyxy, vehicle_ids)
+        crops = safe_crop_batch(frame, pxyxy)
+
+        best = self.best.get(segment)
+        if best is None:
+            best = self.best[segment] = TopKCrops(self.top_k)
+        seen = self.last_seen.setdefault(segment, {})
+        for tid, crop in zip(assoc_ids.tolist(), crops):
+            if tid == -1 or crop is None:
+                continue
+            best.add(tid, quality_score(crop), crop, ts, frame_no)
+            seen[tid] = frame_no
+
+        # tracks not seen for a while are final: read them now, not at segment close
+        if self.track_timeout:
+            for tid in [t for t in best if frame_no - seen.get(t, frame_no) > self.track_timeout]:
+                seen.pop(tid, None)
+                self.hand_over(segment, tid, best.pop(tid))
+
+    def hand_over(self, segment, tid, crops):
+        """Send one track's crops (best first) to OCR; a sighting is timed by the earliest kept crop."""
+        if not crops:
+            return
+        _, _, ts, frame_no = min(crops, key=lambda c: c[2])
+        # the detection thread may wait for OCR (frames then back up and are dropped
+        # at submit(), never in the recorder); a track is only lost past the timeout
+        if not self.ocr.submit(tid, [c for _, c, _, _ in crops], meta={"segment": segment, "ts": ts, "frame": frame_no},
+                               callback=self.on_read, block=True, timeout=OCR_SUBMIT_TIMEOUT_S):
+            self.stats["ocr_dropped"] += 1
+
+    def on_read(self, res):
+        """OCR worker thread: keep the read for its segment and check it against the watchlist."""
+        if not res.text:
+            return
+        segment = res.meta["segment"]
+        self.reads.setdefault(segment, []).append(res)
+        print(f"✅ {segment} vid{res.track_id} -> {res.text} ({res.conf:.2f})", flush=True)
+        if self.watchlist is not None:
+            self.watchlist.check(res.text, res.conf, camera_id=self.camera_id, meta=res.meta, read_at=res.done_at)
+
+    def finish_segment(self, segment):
+        """Hand the remaining tracks to OCR; plates are saved when the last one is read."""
+        top = self.best.pop(segment, None)
+        tracks = {tid: top.pop(tid) for tid in top} if top is not None else {}
+        self.last_seen.pop(segment, None)
+        for tid, crops in sorted(tracks.items(), key=lambda kv: min(c[2] for c in kv[1])):
+            self.hand_over(segment, tid, crops)
+
+        def on_done():
+            reads = self.reads.pop(segment, [])
+            plates = sorted({res.text for res in reads})
+            self.stats["segments"] += 1
+            self.stats["plates"] += len(plates)
+            self.save_plates(segment, plates)
+            self.save_sightings(segment, reads)
+
+        self.ocr.flush(on_done)
+
+    def save_plates(self, segment, plates):
+        """
+        Record plates for a raw segment. The uploader creates the videos doc later
+        (or already did), so write both places; $addToSet makes either order converge.
+        """
+        if self.db is None or not plates:
+            return
+        try:
+            self.db.segment_plates.update_one(
+                {'segment': segment},
+                {
+                    '$addToSet': {'plate_numbers': {'$each': plates}},
+                    '$set': {'camera_id': self.camera_id, 'detected_at': datetime.utcnow()},
+                },
+                upsert=True,
+            )
+            self.db.videos.update_one(
+                {'segment': segment},
+                {'$addToSet': {'plate_numbers': {'$each': plates}, 'plate_keys': {'$each': plate_keys(plates)}}},
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to save plates for {segment}: {e}", flush=True)
+
+    def save_sightings(self, segment, reads):
+        """One plate_sightings doc per read track, inserted in a single unordered batch."""
+        if self.db is None or not reads:
+            return
+        try:
+            video = self.db.videos.find_one({'segment': segment}, {'_id': 1})
+            docs = [
+                {
+                    'plate': res.text,
+                    'plate_keys': plate_keys([res.text]),
+                    'camera_id': self.camera_id,
+                    'ts': datetime.utcfromtimestamp(res.meta['ts']),
+                    'segment': segment,
+                    'video_id': video['_id'] if video else None,
+                    'frame': res.meta.get('frame'),
+                    'conf': round(float(res.conf), 4),
+                    'track_id': int(res.track_id),
+                }
+                for res in reads
+            ]
+            self.db.plate_sightings.insert_many(docs, ordered=False)
+        except Exception as e:
+            print(f"⚠️ Failed to save sightings for {segment}: {e}", flush=True)
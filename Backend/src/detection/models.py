@@ -0,0 +1,99 @@
+# models.py (lazy, cached model loaders shared by detection and OCR)
+import sys
+import time
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+
+
+_lock = threading.Lock()
+_models = {}
+
+
+def _cached(key, build):
+    """Build a model once per process; later calls (any thread) get the same object."""
+    m = _models.get(key)
+    if m is None:
+        with _lock:
+            m = _models.get(key)
+            if m is None:
+                m = build()
+                _models[key] = m
+    return m
+
+
+def get_yolo(path: str):
+    """YOLO model for `path`; ultralytics is only imported on first use."""
+    def build():
+        from ultralytics import YOLO
+        return YOLO(path)
+    return _cached(("yolo", path), build)
+
+
+def get_ocr_reader(langs=("en",), gpu: bool = False):
+    """The process-wide easyocr.Reader; easyocr/torch are only imported on first use."""
+    def build():
+        import easyocr
+        return easyocr.Reader(list(langs), gpu=gpu)
+    return _cached(("easyocr", tuple(langs), gpu), build)
+
+
+def warmup_yolo(model, size=(640, 640)) -> float:
+    """One dummy inference so the first real frame doesn't pay for lazy init. Returns seconds."""
+    t = time.perf_counter()
+    model.predict(np.zeros((size[1], size[0], 3), dtype=np.uint8), verbose=False)
+    return time.perf_counter() - t
+
+
+def warmup_ocr() -> float:
+    """Build the Reader and run one dummy readtext. Returns seconds."""
+    t = time.perf_counter()
+    get_ocr_reader().readtext(np.full((64, 256), 255, dtype=np.uint8))
+    return time.perf_counter() - t
+
+
+ENTRY_POINTS = (
+    "src.detection.ocr_plates",
+    "src.detection.plates_detect",
+    "src.detection.live_detect",
+    "src.detection.ocr_worker",
+    "src.detection.reanalyze",
+)
+
+
+def import_seconds(module: str) -> float:
+    """Wall time to import `module` in a fresh interpreter (no models are built)."""
+    code = ("import time; t = time.perf_counter(); import importlib; "
+            f"importlib.import_module({module!r}); print(time.perf_counter() - t)")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cold-start report: import time per entry point, optional model load/warm-up")
+    ap.add_argument("--yolo", default=None, help="also time loading + warming this YOLO weights file")
+    ap.add_argument("--ocr", action="store_true", help="also time building + warming the easyocr.Reader")
+    args = ap.parse_args()
+
+    for module in ENTRY_POINTS:
+        try:
+            print(f"{module:32s} import {import_seconds(module):6.2f}s")
+        except subprocess.CalledProcessError as e:
+            print(f"{module:32s} import failed: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+
+    if args.yolo:
+        t = time.perf_counter()
+        model = get_yolo(args.yolo)
+        load = time.perf_counter() - t
+        print(f"{'YOLO ' + args.yolo:32s} load {load:6.2f}s  warm-up {warmup_yolo(model):6.2f}s")
+    if args.ocr:
+        t = time.perf_counter()
+        get_ocr_reader()
+        load = time.perf_counter() - t
+        print(f"{'easyocr.Reader':32s} load {load:6.2f}s  warm-up {warmup_ocr():6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
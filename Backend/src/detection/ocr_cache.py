@@ -0,0 +1,144 @@
+# ocr_cache.py (perceptual-hash LRU cache of plate reads for near-duplicate crops)
+import os
+import json
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+DEFAULT_CACHE_PATH = os.environ.get('EV_OCR_CACHE', 'data/ocr_cache.json')
+
+
+def phash(img: np.ndarray) -> int:
+    """
+    64-bit DCT perceptual hash of the contrast-normalized grayscale crop.
+    Near-identical crops of the same plate land within a few bits of each other.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class OcrCache:
+    """
+    Size-bounded LRU of phash -> plate read, persisted as JSON between runs.
+
+    Reads are kept per OCR mode (the settings that produced them), so a cache
+    file never serves a read made under other settings. By default only an
+    identical hash is a hit: different plates of the same style can land a few
+    bits apart. With max_distance > 0 (measure with --bench-cache first),
+    lookups use a multi-index: the 64 bits are split into max_distance + 1
+    bands, and any hash that close must match at least one band exactly, so
+    only a handful of candidates are compared.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 50000, max_distance: int = 0, mode: str = ""):
+        self.path = path
+        self.mode = mode
+        self.max_entries = max(1, int(max_entries))
+        self.max_distance = max(0, int(max_distance))
+        self._other_modes = {}  # mode -> raw entries, kept as loaded so save() doesn't drop them
+
+        n = self.max_distance + 1
+        widths = [64 // n + (1 if i < 64 % n else 0) for i in range(n)]
+        self._bands = []
+        shift = 64
+        for w in widths:
+            shift -= w
+            self._bands.append((shift, (1 << w) - 1))
+
+        self.entries = OrderedDict()                 # hash -> value
+        self._index = [dict() for _ in self._bands]  # band -> {band value: set(hashes)}
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0}
+
+        if self.path and os.path.isfile(self.path):
+            self.load()
+
+    # ------------------ index ------------------
+    def _band_keys(self, h: int):
+        return [(h >> shift) & mask for shift, mask in self._bands]
+
+    def _add(self, h: int, value):
+        self.entries[h] = value
+        for idx, k in zip(self._index, self._band_keys(h)):
+            idx.setdefault(k, set()).add(h)
+
+    def _remove(self, h: int):
+        self.entries.pop(h, None)
+        for idx, k in zip(self._index, self._band_keys(h)):
+            bucket = idx.get(k)
+            if bucket is not None:
+                bucket.discard(h)
+                if not bucket:
+                    del idx[k]
+
+    # ------------------ API ------------------
+    def key(self, img: np.ndarray) -> int:
+        return phash(img)
+
+    def get(self, h: int):
+        """Cached value for h or its nearest neighbour within max_distance, else None."""
+        if h in self.entries:
+            self.entries.move_to_end(h)
+            self.stats["hits"] += 1
+            return self.entries[h]
+
+        best, best_d = None, self.max_distance + 1
+        for idx, k in zip(self._index, self._band_keys(h)):
+            for cand in idx.get(k, ()):
+                d = (cand ^ h).bit_count()
+                if d < best_d:
+                    best, best_d = cand, d
+
+        if best is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.entries.move_to_end(best)
+        self.stats["near_hits"] += 1
+        return self.entries[best]
+
+    def put(self, h: int, value):
+        if h in self.entries:
+            self.entries[h] = value
+            self.entries.move_to_end(h)
+            return
+        self._add(h, value)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["near_hits"] + self.stats["misses"]
+        return (self.stats["hits"] + self.stats["near_hits"]) / total if total else 0.0
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"OCR cache: hit rate {self.hit_rate():.1%} "
+                f"(exact {s['hits']}, near {s['near_hits']}, miss {s['misses']}, entries {len(self.entries)})")
+
+    # ------------------ persistence ------------------
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        # files without per-mode sections predate the mode key; their reads are not reused
+        modes = data.get("modes", {})
+        for h_hex, value in modes.pop(self.mode, []):
+            self.put(int(h_hex, 16), tuple(value))
+        self._other_modes = modes
+
+    def save(self):
+        if not self.path:
+            return
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            modes = dict(self._other_modes)
+            modes[self.mode] = [[f"{h:016x}", list(v)] for h, v in self.entries.items()]
+            json.dump({"modes": modes}, f)
+        os.replace(tmp, self.path)
@@ -1,38 +1,120 @@
 # ocr_plates.py (EasyOCR + multi-preprocess + digit-fix for Indian plates)
 import os
-import re
 import csv
+import json
+import time
 import argparse
+import threading
 from datetime import datetime
 
 import cv2
 import numpy as np
-import easyocr
+
+from src.detection.crop_store import CropStoreReader, crop_name
+from src.detection.ocr_cache import OcrCache, DEFAULT_CACHE_PATH
+from src.detection.models import get_ocr_reader, warmup_ocr
+# Plate grammar and confusion tables live in plate_text (shared with the server)
+from src.detection.plate_text import PLATE_RE, DIGIT_FIX, LETTER_FIX, clean_text
 
 
 DEFAULT_PLATES_DIR = os.environ.get('EV_PLATES_DIR', 'data/plates')
 DEFAULT_OUT_CSV = os.environ.get('EV_PLATES_CSV', 'data/plates.csv')
 
-ALNUM_RE = re.compile(r"[^A-Z0-9]+")
-PLATE_RE = re.compile(r"^([A-Z]{2})([0-9]{1,2})([A-Z]{1,2})([0-9]{4})$")
+# The easyocr.Reader is built lazily (first OCR call) by get_ocr_reader(), so
+# importing helpers like fix_india_plate stays cheap.
+
+
+# Valid RTO state/UT codes, for normalize_plate(..., state_codes=INDIA_STATE_CODES)
+INDIA_STATE_CODES = frozenset((
+    "AN AP AR AS BR CG CH CT DD DL DN GA GJ HP HR JH JK KA KL LA LD MH ML MN MP MZ "
+    "NL OD OR PB PY RJ SK TG TN TR TS UA UK UP WB"
+).split())
+CHECK_STATE_CODES = os.environ.get('EV_PLATE_STATE_CHECK', 'false').lower() == 'true'
+
+# Cost of one DIGIT_FIX/LETTER_FIX substitution, and of dropping one junk char
+# (e.g. an "IND" strip) from either end of the OCR string
+CONFUSION_COST = 0.5
+TRIM_COST = 1.0
+_NO_FIT = 1e6  # a char that can't be read as the slot class (kept finite so prefix sums subtract)
+
+# Plate layouts PLATE_RE accepts: LL D{1,2} L{1,2} DDDD
+PLATE_LAYOUTS = [(d, a) for d in (1, 2) for a in (1, 2)]
+
+
+# char -> (char read in that slot class, cost); anything else can't fill the slot
+_AS_LETTER = {c: (c, 0.0) for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+_AS_LETTER.update({chr(k): (v, CONFUSION_COST) for k, v in LETTER_FIX.items()})
+_AS_DIGIT = {c: (c, 0.0) for c in "0123456789"}
+_AS_DIGIT.update({chr(k): (v, CONFUSION_COST) for k, v in DIGIT_FIX.items()})
+
+
+def normalize_plate(raw: str, state_codes=None):
+    """
+    Lowest-cost reading of an OCR string as an India plate (LL D{1,2} L{1,2} DDDD).
+
+    Every char of the chosen window is mapped to its slot class; a confusion
+    (DIGIT_FIX / LETTER_FIX) costs CONFUSION_COST and each char trimmed off
+    either end costs TRIM_COST. Prefix sums of the per-char costs make every
+    (start, layout) candidate O(1), so the whole search is linear in len(raw).
+    With state_codes, the first two letters must be one of them.
+
+    Returns (plate, cost); (cleaned text, inf) when no window can be a plate.
+    """
+    t = clean_text(raw)
+    n = len(t)
+    if n < 8:
+        return t, float("inf")
 
-# Confusion fixes
-DIGIT_FIX = str.maketrans({"O": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8", "G": "6", "D": "0"})
-LETTER_FIX = str.maketrans({"0": "O", "1": "I", "2": "Z", "5": "S", "8": "B", "6": "G"})
+    # cum_x[k] = cost of reading t[:k] entirely as class x
+    cum_l = [0.0] * (n + 1)
+    cum_d = [0.0] * (n + 1)
+    for k, c in enumerate(t):
+        cum_l[k + 1] = cum_l[k] + _AS_LETTER.get(c, (c, _NO_FIT))[1]
+        cum_d[k + 1] = cum_d[k] + _AS_DIGIT.get(c, (c, _NO_FIT))[1]
 
-# Init once (slow)
-reader = easyocr.Reader(["en"], gpu=False)
+    best = None
+    best_cost = _NO_FIT
+    for i in range(n - 7):
+        code_cost = cum_l[i + 2] - cum_l[i]
+        if code_cost >= _NO_FIT:
+            continue
+        if state_codes is not None:
+            code = _AS_LETTER[t[i]][0] + _AS_LETTER[t[i + 1]][0]
+            if code not in state_codes:
+                continue
+        for d, a in PLATE_LAYOUTS:
+            j = i + 2 + d + a + 4
+            if j > n:
+                continue
+            cost = (
+                code_cost
+                + cum_d[i + 2 + d] - cum_d[i + 2]
+                + cum_l[i + 2 + d + a] - cum_l[i + 2 + d]
+                + cum_d[j] - cum_d[i + 2 + d + a]
+                + TRIM_COST * (n - (j - i))
+            )
+            if cost < best_cost:
+                best, best_cost = (i, d, a, j), cost
 
+    if best is None:
+        return t, float("inf")
 
-def clean_text(s: str) -> str:
-    return ALNUM_RE.sub("", (s or "").upper())
+    i, d, a, j = best
+    classes = [_AS_LETTER] * 2 + [_AS_DIGIT] * d + [_AS_LETTER] * a + [_AS_DIGIT] * 4
+    return "".join(cls[c][0] for cls, c in zip(classes, t[i:j])), best_cost
 
 
 def fix_india_plate(raw: str) -> str:
     """
     Try to correct common OCR confusions using a common India plate pattern:
-    LL DD L{1,2} DDDD (e.g., DL1LAA6957, DL1LX7096)
+    LL D{1,2} L{1,2} DDDD (e.g., DL1CA6957, MH12AB1234)
+    Takes the cheapest correction (normalize_plate), not the first window that matches.
     """
+    return normalize_plate(raw, INDIA_STATE_CODES if CHECK_STATE_CODES else None)[0]
+
+
+def fix_india_plate_windows(raw: str) -> str:
+    """Previous brute-force window search (first match wins); kept for --bench-normalize."""
     t = clean_text(raw)
     if len(t) < 8:
         return t
@@ -67,53 +149,137 @@ def sharpness_score(gray: np.ndarray) -> float:
     return float(cv2.Laplacian(gray, cv2.CV_64F).var())
 
 
-def preprocess_variants(img_bgr: np.ndarray):
+# Upscale/downscale so glyphs land in this height range (EasyOCR's recognizer runs
+# at 64px line height); glyphs are roughly GLYPH_FRACTION of a tight plate crop.
+GLYPH_PX_RANGE = tuple(int(v) for v in os.environ.get('EV_OCR_GLYPH_PX', '32,64').split(","))
+GLYPH_FRACTION = 0.6
+SCALE_LIMITS = (0.25, 3.5)
+# EV_OCR_FIXED_SCALE=3.5 restores the old fixed upscale instead of glyph-height scaling
+FIXED_SCALE = float(os.environ.get('EV_OCR_FIXED_SCALE') or 0) or None
+
+# Per-thread CLAHE object and output buffers (one flat array per step, grown as needed), reused across calls
+_PRE = threading.local()
+
+# step -> [calls, seconds], see preprocess_stats(); OCR threads share it under the lock
+PREPROCESS_TIMES = {}
+_TIMES_LOCK = threading.Lock()
+
+
+def glyph_scale(height: int) -> float:
+    """Resize factor putting the estimated glyph height inside GLYPH_PX_RANGE."""
+    lo, hi = GLYPH_PX_RANGE
+    glyph = max(1.0, height * GLYPH_FRACTION)
+    if lo <= glyph <= hi:
+        return 1.0
+    scale = (lo + hi) / 2.0 / glyph
+    return min(max(scale, SCALE_LIMITS[0]), SCALE_LIMITS[1])
+
+
+_BUFFER_KEYS = ("resized", "clahe", "v1", "blur", "otsu", "adapt", "inv_otsu")
+
+
+def _buffers(shape):
+    """Contiguous (h, w) views into this thread's step buffers; they only grow (doubling) for a larger crop."""
+    size = shape[0] * shape[1]
+    if getattr(_PRE, "capacity", 0) < size:
+        _PRE.capacity = max(size, 2 * getattr(_PRE, "capacity", 0))
+        _PRE.flat = {k: np.empty(_PRE.capacity, dtype=np.uint8) for k in _BUFFER_KEYS}
+    return {k: buf[:size].reshape(shape) for k, buf in _PRE.flat.items()}
+
+
+def _clahe():
+    clahe = getattr(_PRE, "clahe", None)
+    if clahe is None:
+        clahe = _PRE.clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
+    return clahe
+
+
+def _timed(step, t):
+    now = time.perf_counter()
+    with _TIMES_LOCK:
+        rec = PREPROCESS_TIMES.get(step)
+        if rec is None:
+            rec = PREPROCESS_TIMES[step] = [0, 0.0]
+        rec[0] += 1
+        rec[1] += now - t
+    return now
+
+
+def preprocess_stats(reset: bool = False) -> dict:
+    """Mean milliseconds per call for each preprocessing step."""
+    with _TIMES_LOCK:
+        out = {step: 1000.0 * secs / max(1, calls) for step, (calls, secs) in PREPROCESS_TIMES.items()}
+        if reset:
+            PREPROCESS_TIMES.clear()
+    return out
+
+
+def preprocess_variants(img_bgr: np.ndarray, scale: float = None, reuse: bool = False):
     """
     Produce multiple preprocessed versions.
     OCR sometimes reads digits better on binary images.
+
+    scale defaults to FIXED_SCALE when set, else glyph_scale() of the crop. With reuse=True the returned
+    arrays are per-thread buffers overwritten by the next call, so only use it
+    when each call's variants are consumed before the next one.
     """
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    t = time.perf_counter()
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY) if img_bgr.ndim == 3 else img_bgr
 
-    # Upscale (digits need pixels!)
-    gray = cv2.resize(gray, None, fx=3.5, fy=3.5, interpolation=cv2.INTER_CUBIC)
+    # Resize so glyphs are big enough to read (digits need pixels!) but no bigger
+    if scale is None:
+        scale = FIXED_SCALE or glyph_scale(gray.shape[0])
+    shape = (max(1, int(round(gray.shape[0] * scale))), max(1, int(round(gray.shape[1] * scale))))
+    bufs = _buffers(shape) if reuse else dict.fromkeys(_BUFFER_KEYS)
+    if scale != 1.0:
+        interp = cv2.INTER_CUBIC if scale > 1.0 else cv2.INTER_AREA
+        gray = cv2.resize(gray, (shape[1], shape[0]), dst=bufs["resized"], interpolation=interp)
+    t = _timed("resize", t)
 
     # Variant 1: CLAHE + bilateral (natural)
-    clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
-    v1 = clahe.apply(gray)
-    v1 = cv2.bilateralFilter(v1, 7, 60, 60)
+    clahe = _clahe().apply(gray, bufs["clahe"])
+    v1 = cv2.bilateralFilter(clahe, 7, 60, 60, dst=bufs["v1"])
+    t = _timed("clahe", t)
 
     # Variant 2: Otsu threshold
-    blur = cv2.GaussianBlur(v1, (5, 5), 0)
-    _, v2 = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    blur = cv2.GaussianBlur(v1, (5, 5), 0, dst=bufs["blur"])
+    _, v2 = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=bufs["otsu"])
+    t = _timed("otsu", t)
 
     # Variant 3: Adaptive threshold
     v3 = cv2.adaptiveThreshold(
-        v1, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+        v1, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10, dst=bufs["adapt"]
     )
+    t = _timed("adapt", t)
 
     # Variant 4: Inverted Otsu (for yellow plates / dark background cases)
-    v4 = cv2.bitwise_not(v2)
+    v4 = cv2.bitwise_not(v2, dst=bufs["inv_otsu"])
+    _timed("inv_otsu", t)
 
     return [("clahe", v1), ("otsu", v2), ("adapt", v3), ("inv_otsu", v4)]
 
 
-def ocr_easy(img_gray: np.ndarray):
+VARIANT_ORDER = ["clahe", "otsu", "adapt", "inv_otsu"]
+
+
+# readtext settings that help digits (shared by single and batched OCR)
+OCR_KW = dict(
+    detail=1,
+    paragraph=False,
+    allowlist="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
+    decoder="beamsearch",
+    beamWidth=10,
+    text_threshold=0.5,
+    low_text=0.3,
+    contrast_ths=0.1,
+    adjust_contrast=0.7,
+)
+
+
+def join_results(results):
     """
-    Run EasyOCR with settings that help digits, return (text, conf).
+    Join EasyOCR (bbox, text, conf) boxes left-to-right, return (text, avg conf).
     """
-    results = reader.readtext(
-        img_gray,
-        detail=1,
-        paragraph=False,
-        allowlist="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
-        decoder="beamsearch",
-        beamWidth=10,
-        text_threshold=0.5,
-        low_text=0.3,
-        contrast_ths=0.1,
-        adjust_contrast=0.7,
-    )
-
     if not results:
         return "", 0.0
 
@@ -136,6 +302,35 @@ def ocr_easy(img_gray: np.ndarray):
     return joined, avg_conf
 
 
+def ocr_easy(img_gray: np.ndarray):
+    """
+    Run EasyOCR with settings that help digits, return (text, conf).
+    """
+    return join_results(get_ocr_reader().readtext(img_gray, **OCR_KW))
+
+
+def ocr_easy_batch(images: list, batch_size: int = 16):
+    """
+    Batched ocr_easy: returns one (text, conf) per input image, in order.
+    readtext_batched needs equal-sized inputs, so images are batched only with
+    others of exactly their shape (a crop's variants all share one) and never
+    padded: padding adds edges the detector can read as glyphs.
+    """
+    out = [("", 0.0)] * len(images)
+    groups = {}
+    for i, img in enumerate(images):
+        groups.setdefault(img.shape[:2], []).append(i)
+
+    for group in groups.values():
+        for k in range(0, len(group), batch_size):
+            idx = group[k : k + batch_size]
+            batch = get_ocr_reader().readtext_batched([images[i] for i in idx], batch_size=batch_size, **OCR_KW)
+            for i, res in zip(idx, batch):
+                out[i] = join_results(res)
+
+    return out
+
+
 def plate_score(text: str, conf: float) -> float:
     """
     Prefer:
@@ -153,87 +348,682 @@ def plate_score(text: str, conf: float) -> float:
     return base
 
 
+def read_plate(img_bgr: np.ndarray, min_len: int = 6, debug: bool = False, scale: float = None):
+    """
+    OCR every preprocess variant of one crop and keep the best-scoring read.
+    Returns (text, conf, variant, sharpness); text is "" when shorter than min_len.
+    """
+    best_text = ""
+    best_conf = 0.0
+    best_tag = ""
+    best_s = -1.0
+
+    for tag, proc in preprocess_variants(img_bgr, scale=scale, reuse=True):
+        # Skip very blurry variants quickly
+        s = sharpness_score(proc)
+        text, conf = ocr_easy(proc)
+
+        # Apply India plate correction (helps digits a LOT)
+        fixed = fix_india_plate(text)
+
+        score = plate_score(fixed, conf)
+
+        if debug:
+            print(f"   [{tag}] raw={text} fixed={fixed} conf={conf:.2f} sharp={s:.1f} score={score:.2f}")
+
+        if score > plate_score(best_text, best_conf):
+            best_text, best_conf, best_tag, best_s = fixed, conf, tag, s
+
+    # Filter junk
+    if len(best_text) < min_len:
+        best_text = ""
+        best_conf = 0.0
+
+    return best_text, best_conf, best_tag, best_s
+
+
+def variant_order_from_csv(path: str, default=VARIANT_ORDER):
+    """
+    Order variants by how often they won (best_variant column of a previous run's CSV).
+    Variants never seen keep their default position after the ranked ones.
+    """
+    wins = {}
+    if path and os.path.isfile(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if row.get("plate_text") and row.get("best_variant"):
+                    wins[row["best_variant"]] = wins.get(row["best_variant"], 0) + 1
+    return sorted(default, key=lambda tag: (-wins.get(tag, 0), default.index(tag)))
+
+
+def read_plate_cascade(img_bgr: np.ndarray, order=VARIANT_ORDER, conf_threshold: float = 0.6, min_len: int = 6, debug: bool = False):
+    """
+    read_plate that OCRs variants in `order` and stops at the first read that
+    matches PLATE_RE with conf >= conf_threshold; harder crops fall through to
+    the remaining variants. Returns (text, conf, variant, sharpness, ocr_calls).
+    """
+    variants = dict(preprocess_variants(img_bgr, reuse=True))
+
+    best_text = ""
+    best_conf = 0.0
+    best_tag = ""
+    best_s = -1.0
+    calls = 0
+
+    for tag in order:
+        proc = variants[tag]
+        s = sharpness_score(proc)
+        text, conf = ocr_easy(proc)
+        calls += 1
+
+        fixed = fix_india_plate(text)
+        score = plate_score(fixed, conf)
+
+        if debug:
+            print(f"   [{tag}] raw={text} fixed={fixed} conf={conf:.2f} sharp={s:.1f} score={score:.2f}")
+
+        if score > plate_score(best_text, best_conf):
+            best_text, best_conf, best_tag, best_s = fixed, conf, tag, s
+
+        if PLATE_RE.match(fixed) and conf >= conf_threshold:
+            break
+
+    if len(best_text) < min_len:
+        best_text = ""
+        best_conf = 0.0
+
+    return best_text, best_conf, best_tag, best_s, calls
+
+
+def read_plates_batch(imgs: list, min_len: int = 6, batch_size: int = 16):
+    """
+    read_plate for many crops at once: every variant of every crop goes through
+    ocr_easy_batch, then results are split back per crop and scored the same way.
+    """
+    variants = []  # (crop index, tag, sharpness, image)
+    for n, img in enumerate(imgs):
+        for tag, proc in preprocess_variants(img):
+            variants.append((n, tag, sharpness_score(proc), proc))
+
+    reads = ocr_easy_batch([v[3] for v in variants], batch_size=batch_size)
+
+    best = [("", 0.0, "", -1.0) for _ in imgs]
+    for (n, tag, s, _), (text, conf) in zip(variants, reads):
+        fixed = fix_india_plate(text)
+        if plate_score(fixed, conf) > plate_score(best[n][0], best[n][1]):
+            best[n] = (fixed, conf, tag, s)
+
+    # Filter junk
+    return [(t, c, tag, s) if len(t) >= min_len else ("", 0.0, tag, s) for t, c, tag, s in best]
+
+
 def iter_images(folder: str):
     for f in sorted(os.listdir(folder)):
         if f.lower().endswith((".jpg", ".jpeg", ".png")):
             yield f
 
 
+def list_refs(args, store=None):
+    """
+    (name, ref) for every crop still to do: ref is a crop-store index or an image path.
+    Skips names in args.done and, with args.since, anything not newer than it.
+    """
+    done = getattr(args, "done", None) or ()
+    since = getattr(args, "since", None)
+
+    if args.crop_store:
+        if store is None:
+            with CropStoreReader(args.crop_store) as store:
+                return list_refs(args, store)
+        idx = store.select(camera_id=args.camera_id, since=since)
+        if since is not None:
+            idx = idx[store.index["ts"][idx] > since]
+        refs = [(crop_name(float(store.index["ts"][i]), int(store.index["track"][i])), int(i)) for i in idx]
+        return [(f, i) for f, i in refs if f not in done]
+
+    refs = [(f, os.path.join(args.plates_dir, f)) for f in iter_images(args.plates_dir) if f not in done]
+    if since is not None:
+        refs = [(f, p) for f, p in refs if os.path.getmtime(p) > since]
+    return refs
+
+
+def newest_source_time(args):
+    """Newest mtime (crop-store ts) among the crops still to do, or None when there are none."""
+    if args.crop_store:
+        with CropStoreReader(args.crop_store) as store:
+            idx = [i for _, i in list_refs(args, store)]
+            return float(store.index["ts"][idx].max()) if idx else None
+    times = [os.path.getmtime(p) for _, p in list_refs(args)]
+    return max(times) if times else None
+
+
+def iter_sources(args):
+    """
+    Yield (name, img) from the packed crop store when --crop-store is given,
+    otherwise from loose image files in --plates-dir.
+    """
+    if args.crop_store:
+        with CropStoreReader(args.crop_store) as store:
+            for fname, seq in list_refs(args, store):
+                rec = store.get(seq)
+                yield fname, cv2.imdecode(np.frombuffer(rec.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return
+
+    for fname, path in list_refs(args):
+        yield fname, cv2.imread(path)
+
+
+# ------------------ Resumable CSV output ------------------
+CSV_HEADER = ["filename", "plate_text", "confidence", "best_variant", "sharpness", "processed_at"]
+
+
+def state_path(out_csv: str) -> str:
+    return out_csv + ".state.json"
+
+
+def load_done(out_csv: str) -> set:
+    """Filenames already in the CSV (a torn last line from a crash is dropped first)."""
+    if not os.path.isfile(out_csv) or os.path.getsize(out_csv) == 0:
+        return set()
+
+    # Drop a partial trailing row so it is redone rather than half-recorded
+    with open(out_csv, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        tail_start = max(0, size - 64 * 1024)
+        f.seek(tail_start)
+        tail = f.read()
+        if not tail.endswith(b"\n"):
+            f.truncate(tail_start + tail.rfind(b"\n") + 1)
+
+    with open(out_csv, newline="", encoding="utf-8") as f:
+        return {row["filename"] for row in csv.DictReader(f) if row.get("filename")}
+
+
+def load_last_run(out_csv: str):
+    try:
+        with open(state_path(out_csv), encoding="utf-8") as f:
+            return float(json.load(f)["last_run"])
+    except Exception:
+        return None
+
+
+def save_last_run(out_csv: str, newest: float):
+    """Record the newest crop time a complete run covered; --since-last-run starts after it."""
+    tmp = state_path(out_csv) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"last_run": newest}, f)
+    os.replace(tmp, state_path(out_csv))
+
+
+def open_csv(out_csv: str, restart: bool = False):
+    """Open the CSV for appending (header only when new); returns (file, writer)."""
+    mode = "w" if restart else "a"
+    f = open(out_csv, mode, newline="", encoding="utf-8")
+    w = csv.writer(f)
+    if f.tell() == 0:
+        w.writerow(CSV_HEADER)
+        f.flush()
+    return f, w
+
+
+def iter_reads(sources, args, cache=None):
+    """
+    Yield (name, img, (text, conf, variant, sharpness)) for every source image.
+    Crops are read in chunks of --batch-size: cache hits are answered straight
+    from the OCR cache, misses go through the cascade, batched or per-image path.
+    """
+    size = max(1, args.batch_size)
+    chunk = []
+
+    def read_misses(imgs):
+        if args.cascade:
+            reads = []
+            for img in imgs:
+                *read, calls = read_plate_cascade(img, args.variant_order, args.cascade_conf, args.min_len, args.debug)
+                args.ocr_calls += calls
+                reads.append(tuple(read))
+            return reads
+        if size > 1:
+            return read_plates_batch(imgs, min_len=args.min_len, batch_size=size)
+        return [read_plate(img, min_len=args.min_len, debug=args.debug) for img in imgs]
+
+    def drain():
+        reads = [None] * len(chunk)
+        keys = [None] * len(chunk)
+        todo = []
+        for n, (_, img) in enumerate(chunk):
+            if img is None:
+                continue
+            if cache is not None:
+                keys[n] = cache.key(img)
+                reads[n] = cache.get(keys[n])
+            if reads[n] is None:
+                todo.append(n)
+
+        for n, read in zip(todo, read_misses([chunk[n][1] for n in todo])):
+            reads[n] = read
+            if cache is not None:
+                cache.put(keys[n], read)
+
+        for (fname, img), read in zip(chunk, reads):
+            yield fname, img, read
+        chunk.clear()
+
+    for item in sources:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield from drain()
+    yield from drain()
+
+
+def bench_batches(args, sizes):
+    """Report plates/second for the per-image path and several batch sizes."""
+    from itertools import islice
+
+    imgs = [img for _, img in islice(iter_sources(args), args.bench_limit) if img is not None]
+    if not imgs:
+        raise RuntimeError("No images to benchmark")
+
+    # warm-up so model init isn't counted
+    read_plate(imgs[0], min_len=args.min_len)
+
+    print(f"Benchmark on {len(imgs)} crops ({len(imgs) * 4} variants)")
+    print(f"{'batch':>6} {'seconds':>8} {'plates/s':>9}")
+    for size in sizes:
+        t = time.perf_counter()
+        if size <= 1:
+            for img in imgs:
+                read_plate(img, min_len=args.min_len)
+        else:
+            for k in range(0, len(imgs), size):
+                read_plates_batch(imgs[k : k + size], min_len=args.min_len, batch_size=size)
+        dt = time.perf_counter() - t
+        print(f"{size:>6} {dt:>8.2f} {len(imgs) / dt:>9.2f}")
+
+    print("Preprocess ms/crop: " + ", ".join(f"{k}={v:.2f}" for k, v in preprocess_stats().items()))
+
+
+def cache_mode(args) -> str:
+    """Settings a cached read depends on; reads made under others are not reused."""
+    mode = f"cascade@{args.cascade_conf}" if args.cascade else "all"
+    return f"{mode},min_len={args.min_len},scale={FIXED_SCALE or 'glyph'}"
+
+
+def open_cache(args):
+    if not args.ocr_cache:
+        return None
+    return OcrCache(args.ocr_cache, args.cache_size, args.cache_distance, mode=cache_mode(args))
+
+
+def bench_cache(args, max_distance: int = 6):
+    """
+    False-hit rate of near-duplicate cache lookups on real crops: for each crop, the
+    nearest earlier crop within d bits is what the cache would return; a hit is
+    false when OCRing the crop itself gives a different plate.
+    """
+    from itertools import islice
+    from src.detection.ocr_cache import phash
+
+    rows = [(phash(img), read[0]) for _, img, read in iter_reads(islice(iter_sources(args), args.bench_limit), args, None)
+            if img is not None and read is not None]
+    if not rows:
+        raise RuntimeError("No crops found to benchmark")
+
+    nearest = []  # (bits to the nearest earlier crop, whether its plate differs)
+    for i, (h, text) in enumerate(rows):
+        if i:
+            d, other = min(((h ^ hj).bit_count(), tj) for hj, tj in rows[:i])
+            nearest.append((d, other != text))
+
+    print(f"Cache lookups on {len(rows)} crops ({cache_mode(args)})")
+    print(f"{'distance':>8} {'hits':>6} {'false':>6} {'false %':>8}")
+    for d in range(max_distance + 1):
+        hits = [wrong for dist, wrong in nearest if dist <= d]
+        rate = sum(hits) / len(hits) if hits else 0.0
+        print(f"{d:>8} {len(hits):>6} {sum(hits):>6} {rate:>8.1%}")
+
+
+def bench_preprocess(args):
+    """Per-variant preprocessing time: old fixed 3.5x upscale vs glyph-height scaling."""
+    from itertools import islice
+
+    imgs = [img for _, img in islice(iter_sources(args), args.bench_limit) if img is not None]
+    if not imgs:
+        raise RuntimeError("No images to benchmark")
+
+    steps = ["resize", "clahe", "otsu", "adapt", "inv_otsu"]
+    print(f"Preprocess benchmark on {len(imgs)} crops (ms per crop)")
+    print(f"{'mode':>10} " + " ".join(f"{s:>9}" for s in steps) + f" {'total':>8} {'Mpx':>7}")
+    for mode, scale in (("fixed 3.5", 3.5), ("adaptive", None)):
+        preprocess_stats(reset=True)
+        pixels = 0
+        for img in imgs:
+            pixels += preprocess_variants(img, scale=scale, reuse=True)[0][1].size
+        ms = preprocess_stats(reset=True)
+        print(f"{mode:>10} " + " ".join(f"{ms.get(s, 0.0):>9.2f}" for s in steps)
+              + f" {sum(ms.values()):>8.2f} {pixels / 1e6:>7.1f}")
+
+
+def bench_normalize(n: int = 20000, seed: int = 0):
+    """Speed and accuracy of normalize_plate vs the old window search on synthetic OCR noise."""
+    import random
+
+    rng = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    to_wrong = {}  # true char -> what OCR misreads it as
+    for k, v in DIGIT_FIX.items():
+        to_wrong.setdefault(v, []).append(chr(k))
+    for k, v in LETTER_FIX.items():
+        to_wrong.setdefault(v, []).append(chr(k))
+
+    cases = []
+    for _ in range(n):
+        plate = (rng.choice(sorted(INDIA_STATE_CODES))
+                 + "".join(rng.choices("0123456789", k=rng.choice((1, 2))))
+                 + "".join(rng.choices(letters, k=rng.choice((1, 2))))
+                 + "".join(rng.choices("0123456789", k=4)))
+        raw = "".join(rng.choice(to_wrong[c]) if c in to_wrong and rng.random() < 0.15 else c for c in plate)
+        if rng.random() < 0.2:
+            raw = "IND " + raw
+        if rng.random() < 0.2:
+            raw = raw + rng.choice(letters)
+        cases.append((raw, plate))
+
+    print(f"{'normalizer':>16} {'us/call':>8} {'exact':>7}")
+    for name, fn in (("windows (old)", fix_india_plate_windows),
+                     ("normalize_plate", lambda r: normalize_plate(r)[0]),
+                     ("+ state codes", lambda r: normalize_plate(r, INDIA_STATE_CODES)[0])):
+        t = time.perf_counter()
+        out = [fn(raw) for raw, _ in cases]
+        dt = time.perf_counter() - t
+        exact = sum(o == plate for o, (_, plate) in zip(out, cases)) / len(cases)
+        print(f"{name:>16} {dt / len(cases) * 1e6:>8.1f} {exact:>7.1%}")
+
+
+# ------------------ Multi-process OCR ------------------
+_POOL = {}  # per-worker state set by _init_pool_worker
+
+
+def _init_pool_worker(args, torch_threads):
+    """Runs once per worker: cap torch/OpenCV threads, warm this process's Reader."""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+    cv2.setNumThreads(1)
+
+    _POOL["args"] = args
+    _POOL["store"] = CropStoreReader(args.crop_store) if args.crop_store else None
+    # load the model here, not on this worker's first crop
+    get_ocr_reader()
+
+
+def _ocr_shard(shard):
+    """OCR one shard of (name, ref); returns [(name, read or None, ocr_calls)] in order."""
+    args = _POOL["args"]
+    store = _POOL["store"]
+
+    def load(ref):
+        if store is not None:
+            return cv2.imdecode(np.frombuffer(store.get(ref).data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return cv2.imread(ref)
+
+    args.ocr_calls = 0
+    out = [(fname, read) for fname, _, read in iter_reads(((f, load(ref)) for f, ref in shard), args)]
+    return [(fname, read, args.ocr_calls if n == 0 else 0) for n, (fname, read) in enumerate(out)]
+
+
+def iter_pool_reads(args, refs, workers: int, shard_size: int = 16):
+    """
+    Shard refs across a process pool with one easyocr.Reader per worker and yield
+    (name, read) back in input order for a single CSV writer.
+    """
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    shards = [refs[k : k + shard_size] for k in range(0, len(refs), shard_size)]
+    ctx = mp.get_context("spawn")  # fresh interpreter: no forked torch state
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_pool_worker, initargs=(args, torch_threads)) as pool:
+        for shard_out in pool.map(_ocr_shard, shards):
+            for fname, read, calls in shard_out:
+                args.ocr_calls += calls
+                yield fname, read
+
+
+def bench_workers(args, max_workers: int):
+    """Report plates/second and speedup for 1..max_workers worker processes."""
+
+    refs = list_refs(args)[: args.bench_limit]
+    if not refs:
+        raise RuntimeError("No images to benchmark")
+
+    print(f"Worker scaling on {len(refs)} crops ({os.cpu_count()} cores)")
+    print(f"{'workers':>7} {'seconds':>8} {'plates/s':>9} {'speedup':>8}")
+    base = None
+    for n in range(1, max_workers + 1):
+        t = time.perf_counter()
+        for _ in iter_pool_reads(args, refs, n):
+            pass
+        dt = time.perf_counter() - t
+        base = base or dt
+        print(f"{n:>7} {dt:>8.2f} {len(refs) / dt:>9.2f} {base / dt:>7.2f}x")
+
+
+def eval_cascade(args):
+    """Accuracy and OCR calls per plate: cascade vs all variants, on a labeled folder."""
+    with open(args.eval_labels, newline="", encoding="utf-8") as f:
+        labels = {row["filename"]: clean_text(row["plate_text"]) for row in csv.DictReader(f)}
+
+    n = full_ok = casc_ok = casc_calls = 0
+    for fname, img in iter_sources(args):
+        if fname not in labels or img is None:
+            continue
+        n += 1
+        full_text = read_plate(img, min_len=args.min_len)[0]
+        *casc, calls = read_plate_cascade(img, args.variant_order, args.cascade_conf, args.min_len)
+        full_ok += full_text == labels[fname]
+        casc_ok += casc[0] == labels[fname]
+        casc_calls += calls
+
+    if not n:
+        raise RuntimeError("No labeled images found")
+
+    full_acc = full_ok / n
+    casc_acc = casc_ok / n
+    print(f"Labeled crops: {n}  order: {' > '.join(args.variant_order)}  conf>={args.cascade_conf}")
+    print(f"all variants: acc={full_acc:.3f} calls/plate={len(VARIANT_ORDER):.2f}")
+    print(f"cascade     : acc={casc_acc:.3f} calls/plate={casc_calls / n:.2f}")
+    print(f"delta       : acc={casc_acc - full_acc:+.3f}")
+
+
+def eval_scale(args):
+    """Accuracy on a labeled folder: old fixed 3.5x upscale vs glyph-height scaling (all variants)."""
+    with open(args.eval_labels, newline="", encoding="utf-8") as f:
+        labels = {row["filename"]: clean_text(row["plate_text"]) for row in csv.DictReader(f)}
+
+    modes = (("fixed 3.5", 3.5), ("glyph", None))
+    n = 0
+    ok = {name: 0 for name, _ in modes}
+    secs = {name: 0.0 for name, _ in modes}
+    for fname, img in iter_sources(args):
+        if fname not in labels or img is None:
+            continue
+        n += 1
+        for name, scale in modes:
+            t = time.perf_counter()
+            # glyph scaling explicitly, whatever EV_OCR_FIXED_SCALE says
+            text = read_plate(img, min_len=args.min_len, scale=scale or glyph_scale(img.shape[0]))[0]
+            secs[name] += time.perf_counter() - t
+            ok[name] += text == labels[fname]
+
+    if not n:
+        raise RuntimeError("No labeled images found")
+
+    print(f"Labeled crops: {n}")
+    for name, _ in modes:
+        print(f"{name:>10}: acc={ok[name] / n:.3f} ms/plate={1000.0 * secs[name] / n:.1f}")
+    print(f"{'delta':>10}: acc={(ok['glyph'] - ok['fixed 3.5']) / n:+.3f}")
+
+
 def main():
+    t_main = time.perf_counter()
     ap = argparse.ArgumentParser()
     ap.add_argument("--plates-dir", default=DEFAULT_PLATES_DIR)
+    ap.add_argument("--crop-store", default=os.environ.get('EV_CROP_STORE', ''), help="read crops from a packed crop store instead of --plates-dir")
+    ap.add_argument("--camera-id", default=None, help="only OCR crops from this camera (crop store only)")
     ap.add_argument("--out-csv", default=DEFAULT_OUT_CSV)
     ap.add_argument("--min-len", type=int, default=6)
     ap.add_argument("--debug", action="store_true", help="print extra debug info")
+    ap.add_argument("--batch-size", type=int, default=int(os.environ.get('EV_OCR_BATCH', 1)), help="crops per batched OCR call (1 = per-image)")
+    ap.add_argument("--bench-batch", type=int, nargs="+", default=None, help="benchmark these batch sizes and exit, e.g. 1 4 16 32")
+    ap.add_argument("--bench-limit", type=int, default=200, help="crops used by --bench-batch")
+    ap.add_argument("--cascade", action="store_true", help="stop OCRing variants once a confident plate-shaped read is found")
+    ap.add_argument("--cascade-conf", type=float, default=0.6, help="confidence needed to stop the cascade early")
+    ap.add_argument("--variant-stats", default=None, help="CSV whose best_variant column orders the cascade (default: --out-csv)")
+    ap.add_argument("--eval-labels", default=None, help="CSV (filename,plate_text) for --plates-dir: compare cascade vs all variants and exit")
+    ap.add_argument("--eval-scale", action="store_true", help="with --eval-labels: compare fixed 3.5x vs glyph-height scaling instead")
+    ap.add_argument("--ocr-cache", default=DEFAULT_CACHE_PATH, help="perceptual-hash OCR cache file (reuses reads of near-duplicate crops; \"\" = no cache)")
+    ap.add_argument("--cache-size", type=int, default=50000, help="max cached reads (LRU)")
+    ap.add_argument("--cache-distance", type=int, default=0, help="max Hamming distance between hashes to reuse a read (0 = identical only; check --bench-cache first)")
+    ap.add_argument("--bench-cache", action="store_true", help="measure the false-hit rate of near cache lookups per distance and exit")
+    ap.add_argument("--workers", type=int, default=int(os.environ.get('EV_OCR_WORKERS', 1)), help="OCR worker processes (one Reader each)")
+    ap.add_argument("--bench-workers", type=int, default=None, help="benchmark 1..N workers and exit")
+    ap.add_argument("--restart", action="store_true", help="start a fresh CSV instead of resuming the existing one")
+    ap.add_argument("--since-last-run", action="store_true", help="only OCR crops newer than the newest one a previous complete run processed")
+    ap.add_argument("--fsync-every", type=int, default=100, help="fsync the CSV every N rows (rows are flushed always)")
+    ap.add_argument("--watch", action="store_true", help="keep running and OCR new crops as they land")
+    ap.add_argument("--poll-interval", type=float, default=1.0, help="scan interval when filesystem events are unavailable")
+    ap.add_argument("--watch-batch", type=int, default=8, help="max crops OCRed together in watch mode")
+    ap.add_argument("--watch-linger", type=float, default=0.2, help="seconds to wait for more crops before OCRing a batch")
+    ap.add_argument("--stats-every", type=float, default=30.0, help="seconds between watch latency reports (<out_csv>.watch.json)")
+    ap.add_argument("--warmup", action="store_true", default=os.environ.get('EV_MODEL_WARMUP', 'false').lower() == 'true', help="build the Reader and run one dummy OCR before starting")
+    ap.add_argument("--bench-preprocess", action="store_true", help="time each preprocessing step (fixed vs adaptive scale) and exit")
+    ap.add_argument("--bench-normalize", type=int, default=None, help="benchmark the plate normalizer on N synthetic reads and exit")
     args = ap.parse_args()
 
-    if not os.path.isdir(args.plates_dir):
+    if args.bench_normalize:
+        bench_normalize(args.bench_normalize)
+        return
+
+    args.variant_order = variant_order_from_csv(args.variant_stats or args.out_csv)
+    args.ocr_calls = 0
+
+    if not args.crop_store and not os.path.isdir(args.plates_dir):
         raise RuntimeError(f"Plates folder not found: {args.plates_dir}")
 
+    if args.bench_batch:
+        bench_batches(args, args.bench_batch)
+        return
+
+    if args.bench_preprocess:
+        bench_preprocess(args)
+        return
+
+    if args.bench_cache:
+        bench_cache(args)
+        return
+
+    if args.eval_labels:
+        if args.eval_scale:
+            eval_scale(args)
+        else:
+            eval_cascade(args)
+        return
+
+    if args.bench_workers:
+        bench_workers(args, args.bench_workers)
+        return
+
+    if args.warmup:
+        print(f"OCR warm-up: {warmup_ocr():.2f}s")
+
+    if args.cascade:
+        print(f"Cascade order: {' > '.join(args.variant_order)} (stop at conf >= {args.cascade_conf})")
+
     os.makedirs(os.path.dirname(args.out_csv), exist_ok=True)
 
-    rows = []
-    total = 0
-    good = 0
+    args.done = set() if args.restart else load_done(args.out_csv)
+    args.since = load_last_run(args.out_csv) if args.since_last_run else None
+    # the last-run mark only moves past crops this run is sure to cover (watch mode never finishes)
+    newest = None if args.watch else newest_source_time(args)
+    if args.done:
+        print(f"Resuming: {len(args.done)} crops already in {args.out_csv}")
+    if args.since is not None:
+        print(f"Only crops newer than {datetime.fromtimestamp(args.since).isoformat(timespec='seconds')}")
 
-    for fname in iter_images(args.plates_dir):
-        total += 1
-        path = os.path.join(args.plates_dir, fname)
-        img = cv2.imread(path)
-        if img is None:
-            print(f"⚠️ {fname} -> could not read")
-            continue
+    out_f, out_w = open_csv(args.out_csv, restart=args.restart)
 
-        best_text = ""
-        best_conf = 0.0
-        best_tag = ""
-        best_s = -1.0
+    if args.watch:
+        from src.detection.ocr_watch import iter_watch_reads
 
-        for tag, proc in preprocess_variants(img):
-            # Skip very blurry variants quickly
-            s = sharpness_score(proc)
-            text, conf = ocr_easy(proc)
+        cache = open_cache(args)
+        results = iter_watch_reads(args, cache)
+    elif args.workers > 1:
+        # the perceptual-hash cache is per-process state; only the single-process path uses it
+        cache = None
+        results = iter_pool_reads(args, list_refs(args), args.workers)
+    else:
+        cache = open_cache(args)
+        results = ((fname, read) for fname, _, read in iter_reads(iter_sources(args), args, cache))
 
-            # Apply India plate correction (helps digits a LOT)
-            fixed = fix_india_plate(text)
+    total = 0
+    good = 0
+    unread = 0
+    interrupted = False
 
-            score = plate_score(fixed, conf)
+    try:
+        for fname, read in results:
+            total += 1
+            if total == 1:
+                print(f"⏱ first result {time.perf_counter() - t_main:.2f}s after start")
+            if read is None:
+                unread += 1
+                print(f"⚠️ {fname} -> could not read")
+                continue
 
-            if args.debug:
-                print(f"   [{tag}] raw={text} fixed={fixed} conf={conf:.2f} sharp={s:.1f} score={score:.2f}")
+            best_text, best_conf, best_tag, best_s = read
 
-            if score > plate_score(best_text, best_conf):
-                best_text, best_conf, best_tag, best_s = fixed, conf, tag, s
+            if best_text:
+                good += 1
+                print(f"✅ {fname} -> {best_text} ({best_conf:.2f}) [{best_tag}]")
+            else:
+                print(f"✅ {fname} -> (no read)")
 
-        # Filter junk
-        if len(best_text) < args.min_len:
-            best_text = ""
-            best_conf = 0.0
+            out_w.writerow([
+                fname,
+                best_text,
+                f"{best_conf:.4f}",
+                best_tag,
+                f"{best_s:.1f}",
+                datetime.now().isoformat(timespec="seconds")
+            ])
+            out_f.flush()
+            if args.fsync_every and total % args.fsync_every == 0:
+                os.fsync(out_f.fileno())
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n🛑 Stopping... (last-run mark not updated)")
 
-        if best_text:
-            good += 1
-            print(f"✅ {fname} -> {best_text} ({best_conf:.2f}) [{best_tag}]")
-        else:
-            print(f"✅ {fname} -> (no read)")
-
-        rows.append([
-            fname,
-            best_text,
-            f"{best_conf:.4f}",
-            best_tag,
-            f"{best_s:.1f}",
-            datetime.now().isoformat(timespec="seconds")
-        ])
-
-    with open(args.out_csv, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["filename", "plate_text", "confidence", "best_variant", "sharpness", "processed_at"])
-        w.writerows(rows)
+    os.fsync(out_f.fileno())
+    out_f.close()
+    # unread crops are not in the CSV either; keep the old mark so the next run retries them
+    if not interrupted and not unread and newest is not None:
+        save_last_run(args.out_csv, newest)
 
     print("\nDONE ✅")
     print("Images processed:", total)
     print("Plates read:", good)
     print("Saved CSV:", args.out_csv)
+    if cache is not None:
+        cache.save()
+        print(cache.summary())
+    if args.cascade:
+        print(f"Avg OCR calls per plate: {args.ocr_calls / max(1, total):.2f} (all variants = {len(VARIANT_ORDER)})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+# ocr_watch.py (ocr_plates --watch: OCR crops as they land)
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from src.detection.crop_store import CropStoreReader, crop_name
+
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+class LatencyStats:
+    """Queue latency (crop noticed -> row written) over a sliding window."""
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def snapshot(self, backlog: int = 0) -> dict:
+        s = np.asarray(self.samples, dtype=np.float64)
+        return {
+            "crops": self.count,
+            "backlog": backlog,
+            "latency_mean_s": round(float(s.mean()), 3) if len(s) else None,
+            "latency_p50_s": round(float(np.percentile(s, 50)), 3) if len(s) else None,
+            "latency_p95_s": round(float(np.percentile(s, 95)), 3) if len(s) else None,
+            "latency_max_s": round(self.max, 3),
+            "updated_at": time.time(),
+        }
+
+
+class CropWatcher:
+    """
+    Feeds new crops into a queue: filesystem events via watchdog when it is
+    installed, otherwise a polling scan. Crop stores are tailed through the index.
+    """
+
+    def __init__(self, args, poll_interval: float = 1.0):
+        self.args = args
+        self.poll_interval = poll_interval
+        self.pending = queue.Queue()  # (name, ref, noticed_at)
+        self.known = set()
+        self._known_lock = threading.Lock()  # watchdog and poll threads both enqueue
+        self.store = CropStoreReader(args.crop_store) if args.crop_store else None
+        self.observer = None
+        self.mode = "poll"
+        self._last_scan = 0.0
+
+    def enqueue(self, name, ref, noticed_at=None):
+        with self._known_lock:
+            if name in self.known:
+                return
+            self.known.add(name)
+        self.pending.put((name, ref, noticed_at or time.time()))
+
+    def start(self, backlog):
+        for name, ref in backlog:
+            self.enqueue(name, ref)
+
+        if self.store is None:
+            with self._known_lock:
+                self.known.update(getattr(self.args, "done", None) or ())
+            try:
+                self._start_events()
+                self.mode = "events"
+            except Exception:
+                pass
+            threading.Thread(target=self._poll, daemon=True, name="OCRWatch").start()
+        else:
+            self.mode = "index"
+        return self
+
+    def _start_events(self):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+        plates_dir = self.args.plates_dir
+
+        class Handler(FileSystemEventHandler):
+            def _add(self, path):
+                if path.lower().endswith(IMAGE_EXTS) and os.path.dirname(path) == os.path.normpath(plates_dir):
+                    watcher.enqueue(os.path.basename(path), path)
+
+            def on_created(self, event):
+                if not event.is_directory:
+                    self._add(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    self._add(event.dest_path)
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), os.path.normpath(plates_dir), recursive=False)
+        self.observer.daemon = True
+        self.observer.start()
+
+    def _poll(self):
+        # With events the scan is only a slow safety net for missed notifications
+        interval = self.poll_interval if self.mode == "poll" else max(30.0, self.poll_interval)
+        while True:
+            time.sleep(interval)
+            try:
+                with os.scandir(self.args.plates_dir) as it:
+                    for e in it:
+                        if e.name.lower().endswith(IMAGE_EXTS) and e.name not in self.known:
+                            self.enqueue(e.name, e.path)
+            except Exception as e:
+                print(f"⚠️ watch scan failed: {e}", flush=True)
+
+    def _scan_store(self):
+        """Tail the crop-store index (same thread as load(), since refresh remaps packs)."""
+        if time.time() - self._last_scan < self.poll_interval:
+            return
+        self._last_scan = time.time()
+        cam = self.args.camera_id
+        try:
+            for seq in self.store.refresh():
+                r = self.store.index[seq]
+                if cam is None or r["camera"].decode("utf-8", "replace") == cam:
+                    self.enqueue(crop_name(float(r["ts"]), int(r["track"])), int(seq))
+        except Exception as e:
+            print(f"⚠️ watch scan failed: {e}", flush=True)
+
+    def load(self, ref):
+        if self.store is not None:
+            return cv2.imdecode(np.frombuffer(self.store.get(ref).data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return cv2.imread(ref)
+
+    def next_batch(self, size: int, linger: float):
+        """Block for one crop, then take up to size-1 more that arrive within linger seconds."""
+        if self.store is not None and self.pending.empty():
+            self._scan_store()
+        try:
+            batch = [self.pending.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + linger
+        while len(batch) < size:
+            try:
+                batch.append(self.pending.get(timeout=max(0.0, deadline - time.time())))
+            except queue.Empty:
+                break
+        return batch
+
+
+def iter_watch_reads(args, cache=None, retry_for: float = 10.0):
+    """
+    Endless (name, read) stream for ocr_plates --watch. The easyocr.Reader stays
+    warm between batches; latency stats go to <out_csv>.watch.json.
+    """
+    from src.detection.ocr_plates import iter_reads, list_refs
+
+    watcher = CropWatcher(args, poll_interval=args.poll_interval)
+    watcher.start(list_refs(args, watcher.store))
+    stats = LatencyStats()
+    stats_path = args.out_csv + ".watch.json"
+    last_report = time.time()
+    retry = []  # (name, ref, noticed_at) whose file was still being written
+
+    print(f"👀 Watching {args.crop_store or args.plates_dir} ({watcher.mode}), backlog {watcher.pending.qsize()}", flush=True)
+
+    while True:
+        batch = watcher.next_batch(max(1, args.batch_size, args.watch_batch), args.watch_linger)
+
+        now = time.time()
+        for item in retry:
+            watcher.pending.put(item)
+        retry = []
+
+        loaded = []
+        for name, ref, noticed in batch:
+            img = watcher.load(ref)
+            if img is None and now - noticed < retry_for:
+                retry.append((name, ref, noticed))
+                continue
+            loaded.append((name, img, noticed))
+
+        if not loaded and retry:
+            time.sleep(0.2)  # only half-written files pending: give the writer a moment
+
+        if loaded:
+            noticed_at = {name: noticed for name, _, noticed in loaded}
+            for name, _, read in iter_reads(((n, img) for n, img, _ in loaded), args, cache):
+                yield name, read
+                stats.add(time.time() - noticed_at[name])
+
+        if time.time() - last_report >= args.stats_every:
+            snap = stats.snapshot(backlog=watcher.pending.qsize() + len(retry))
+            tmp = stats_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f)
+            os.replace(tmp, stats_path)
+            print(f"[watch] crops={snap['crops']} backlog={snap['backlog']} "
+                  f"p50={snap['latency_p50_s']}s p95={snap['latency_p95_s']}s max={snap['latency_max_s']}s", flush=True)
+            last_report = time.time()
+
@@ -0,0 +1,117 @@
+# ocr_worker.py (long-lived OCR thread fed with in-memory crops)
+import os
+import time
+import queue
+import threading
+from collections import namedtuple
+
+
+OcrResult = namedtuple("OcrResult", "track_id text conf variant meta queued_at done_at reads", defaults=(1,))
+
+_STOP = object()
+
+# longest a detection thread waits for room in the OCR queue before dropping a track
+SUBMIT_TIMEOUT_S = float(os.environ.get('EV_OCR_SUBMIT_TIMEOUT_S', 5))
+
+
+def merge_results(prev, res):
+    """One result for a track read more than once: a text read beats none, then the higher conf wins."""
+    if prev is None:
+        return res
+    best = res if (bool(res.text), res.conf) > (bool(prev.text), prev.conf) else prev
+    return best._replace(reads=prev.reads + res.reads)
+
+
+class OcrWorker:
+    """
+    Owns the single easyocr.Reader and OCRs crops handed over as NumPy arrays.
+
+    Detection calls submit() with a track's final best crop, or a list of its
+    top crops (best first) to read them by consensus; the result (plate text
+    tied to the track id) goes to the per-item callback, or to self.results
+    when no callback is given. No JPEG is written or re-read.
+    """
+
+    def __init__(self, min_len: int = 6, max_pending: int = 256, warmup: bool = False):
+        self.min_len = min_len
+        self.warmup = warmup
+        self.q = queue.Queue(maxsize=max(1, int(max_pending)))
+        self.results = queue.Queue()
+        self.thread = None
+        self.stats = {"submitted": 0, "dropped": 0, "done": 0, "errors": 0, "reads": 0, "latency_s": 0.0}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True, name="OCR")
+        self.thread.start()
+        return self
+
+    def submit(self, track_id, crop, meta=None, callback=None, block: bool = False, timeout: float = None) -> bool:
+        """
+        Queue one crop or list of crops (non-blocking by default; block waits up to
+        timeout seconds). Returns False, counted and logged, when the queue stays full.
+        """
+        self.stats["submitted"] += 1
+        try:
+            self.q.put((track_id, crop, meta, callback, time.time()), block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            print(f"⚠️ OCR queue full, track {track_id} not read ({self.stats['dropped']} dropped so far)", flush=True)
+            return False
+
+    def flush(self, callback):
+        """Call callback() in the worker once everything queued before it is done."""
+        self.q.put((None, None, None, callback, None))
+
+    def close(self, timeout: float = None):
+        """Finish queued crops, then stop the thread."""
+        if self.thread is None:
+            return
+        self.q.put((None, _STOP, None, None, None))
+        self.thread.join(timeout)
+
+    def run(self):
+        from src.detection.ocr_plates import read_plate
+        from src.detection.consensus import read_track
+        from src.detection.models import warmup_ocr
+
+        # the Reader is built lazily on first OCR; warm-up moves that to stage start
+        if self.warmup:
+            print(f"OCR warm-up: {warmup_ocr():.2f}s", flush=True)
+
+        while True:
+            track_id, crop, meta, callback, queued_at = self.q.get()
+            if crop is _STOP:
+                break
+            if crop is None:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"⚠️ OCR flush callback failed: {e}", flush=True)
+                continue
+
+            reads = 1
+            try:
+                if isinstance(crop, list):
+                    text, conf, reads = read_track(crop, min_len=self.min_len)
+                    tag = f"vote{reads}/{len(crop)}"
+                else:
+                    text, conf, tag, _ = read_plate(crop, min_len=self.min_len)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ OCR failed for track {track_id}: {e}", flush=True)
+                text, conf, tag = "", 0.0, ""
+
+            done_at = time.time()
+            self.stats["done"] += 1
+            self.stats["reads"] += reads
+            self.stats["latency_s"] = done_at - queued_at
+
+            res = OcrResult(track_id, text, conf, tag, meta, queued_at, done_at, reads)
+            if callback is not None:
+                try:
+                    callback(res)
+                except Exception as e:
+                    print(f"⚠️ OCR callback failed for track {track_id}: {e}", flush=True)
+            else:
+                self.results.put(res)
@@ -0,0 +1,151 @@
+# plate_text.py (plate string rules + index keys for fuzzy plate lookup; no OpenCV)
+import re
+
+
+ALNUM_RE = re.compile(r"[^A-Z0-9]+")
+PLATE_RE = re.compile(r"^([A-Z]{2})([0-9]{1,2})([A-Z]{1,2})([0-9]{4})$")
+
+# Confusion fixes
+DIGIT_FIX = str.maketrans({"O": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "B": "8", "G": "6", "D": "0"})
+LETTER_FIX = str.maketrans({"0": "O", "1": "I", "2": "Z", "5": "S", "8": "B", "6": "G"})
+
+# Fuzzy matching: a confusable pair costs less than any other edit
+CONFUSABLE_COST = 0.5
+EDIT_COST = 1.0
+GRAM = 3
+
+
+def clean_text(s: str) -> str:
+    return ALNUM_RE.sub("", (s or "").upper())
+
+
+def fold(plate: str) -> str:
+    """Collapse every confusable pair onto one char (O/D->0, I/L->1, ...), so DL1LAA69S7 == DL1LAA6957."""
+    return clean_text(plate).translate(DIGIT_FIX)
+
+
+def deletion_keys(folded: str):
+    """The folded plate and every single-char deletion of it: two plates within one edit share a key."""
+    return {folded} | {folded[:i] + folded[i + 1:] for i in range(len(folded))}
+
+
+def plate_keys(plates) -> list:
+    """
+    Index keys stored (multikey) next to plate_numbers / plate:
+    'd:' deletion neighbourhood of the folded plate, 'g:' its 3-grams for partial plates.
+    """
+    keys = set()
+    for p in plates:
+        f = fold(p)
+        if not f:
+            continue
+        keys.update("d:" + k for k in deletion_keys(f))
+        keys.update("g:" + f[i:i + GRAM] for i in range(len(f) - GRAM + 1))
+    return sorted(keys)
+
+
+def lookup_filter(query: str, field: str = "plate_keys", min_full: int = 8):
+    """
+    Mongo filter for candidates of a plate query, answered from the plate_keys index:
+    full plates (>= min_full chars) by shared deletion key, shorter ones as partial
+    plates by requiring all their 3-grams. None when the query is too short.
+    """
+    f = fold(query)
+    if len(f) >= min_full:
+        return {field: {"$in": ["d:" + k for k in sorted(deletion_keys(f))]}}
+    if len(f) >= GRAM:
+        return {field: {"$all": sorted({"g:" + f[i:i + GRAM] for i in range(len(f) - GRAM + 1)})}}
+    return None
+
+
+def _sub_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    if a.translate(DIGIT_FIX) == b.translate(DIGIT_FIX):
+        return CONFUSABLE_COST
+    return EDIT_COST
+
+
+def plate_distance(query: str, plate: str, partial: bool = False) -> float:
+    """
+    Edit cost from query to plate (confusable substitutions are cheap). With partial,
+    the query may match anywhere inside the plate (unmatched plate chars are free).
+    """
+    q, p = clean_text(query), clean_text(plate)
+    prev = [0.0 if partial else j * EDIT_COST for j in range(len(p) + 1)]
+    for i in range(1, len(q) + 1):
+        cur = [i * EDIT_COST] + [0.0] * len(p)
+        for j in range(1, len(p) + 1):
+            cur[j] = min(
+                prev[j - 1] + _sub_cost(q[i - 1], p[j - 1]),
+                prev[j] + EDIT_COST,
+                cur[j - 1] + EDIT_COST,
+            )
+        prev = cur
+    return min(prev) if partial else prev[-1]
+
+
+def rank_plates(query: str, plates, min_full: int = 8):
+    """(cost, plate) of the closest plate in `plates` to the query."""
+    partial = len(fold(query)) < min_full
+    scored = [(plate_distance(query, p, partial=partial), p) for p in plates or ()]
+    return min(scored) if scored else (float("inf"), None)
+
+
+def ensure_sighting_indexes(db):
+    """plate_sightings: by plate (exact or fuzzy keys) or camera over time, by segment for the uploader's back-fill."""
+    try:
+        db.plate_sightings.create_index([('plate', 1), ('ts', -1), ('_id', -1)])
+        db.plate_sightings.create_index([('plate_keys', 1), ('ts', -1)])
+        db.plate_sightings.create_index([('camera_id', 1), ('ts', -1), ('_id', -1)])
+        db.plate_sightings.create_index('segment')
+        db.plate_sightings.create_index('video_id')
+        # same retention as the footage it points into
+        db.plate_sightings.create_index('ts', expireAfterSeconds=604800)
+    except Exception:
+        pass
+
+
+def backfill(db, batch: int = 1000):
+    """Add plate_keys to videos / plate_sightings written before fuzzy search existed."""
+    from pymongo import UpdateOne
+
+    for coll, field in ((db.videos, "plate_numbers"), (db.plate_sightings, "plate")):
+        ops, done = [], 0
+        query = {"plate_keys": {"$exists": False}, field: {"$exists": True, "$ne": []}}
+        for doc in coll.find(query, {field: 1}):
+            value = doc.get(field)
+            plates = value if isinstance(value, list) else [value]
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"plate_keys": plate_keys(plates)}}))
+            if len(ops) >= batch:
+                coll.bulk_write(ops, ordered=False)
+                done += len(ops)
+                ops = []
+        if ops:
+            coll.bulk_write(ops, ordered=False)
+            done += len(ops)
+        print(f"{coll.name}: plate_keys added to {done} docs")
+
+
+def main():
+    import argparse
+    from src.server.mongo import get_db
+
+    ap = argparse.ArgumentParser(description="Fuzzy plate keys: inspect or back-fill")
+    ap.add_argument("plates", nargs="*", help="print the keys / distances for these plates")
+    ap.add_argument("--backfill", action="store_true", help="add plate_keys to existing videos and sightings")
+    args = ap.parse_args()
+
+    for p in args.plates:
+        print(p, fold(p), plate_keys([p]))
+    if len(args.plates) > 1:
+        q = args.plates[0]
+        for p in args.plates[1:]:
+            print(f"{q} -> {p}: {plate_distance(q, p, partial=len(fold(q)) < 8):.1f}")
+
+    if args.backfill:
+        backfill(get_db())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,13 @@ from collections import deque
 from datetime import datetime
 
 import cv2
-import pandas as pd
-from ultralytics import YOLO
+import numpy as np
+
+from src.detection.associate import associate_plates, safe_crop_batch
+from src.detection.crop_store import CropStoreWriter, DEFAULT_STORE_DIR
+from src.detection.ocr_worker import OcrWorker, merge_results
+from src.detection.consensus import TopKCrops, DEFAULT_TOP_K
+from src.detection.models import get_yolo, warmup_yolo
 
 
 # ------------------ Rolling Buffer Writer ------------------
@@ -153,12 +158,25 @@ def parse_args():
     # Best-only saving controls
     ap.add_argument("--best-only", action="store_true", help="Save only the best plate image per vehicle ID")
     ap.add_argument("--min-improve", type=float, default=1.15, help="New plate must be this much better to replace old")
-  
+
+    # Crop storage: loose JPEGs (default) or the packed store
+    ap.add_argument("--store", choices=["pack", "jpeg"], default=os.environ.get('EV_CROP_STORE_MODE', 'jpeg'), help="jpeg = loose files in EV_PLATES_DIR, pack = append-only crop store")
+    ap.add_argument("--crop-store", type=str, default=DEFAULT_STORE_DIR, help="crop store directory (for --store pack)")
+    ap.add_argument("--camera-id", type=str, default=os.environ.get('EV_CAMERA_ID', 'cam_01'), help="camera id recorded with each crop")
+
+    # In-memory OCR handoff
+    ap.add_argument("--ocr", action="store_true", help="OCR each track's final best crops in a background worker")
+    ap.add_argument("--ocr-top-k", type=int, default=DEFAULT_TOP_K, help="crops per track read by consensus vote (1 = best crop only)")
+    ap.add_argument("--track-timeout", type=int, default=None, help="frames without a sighting before a track is final (default: 2s of video)")
+    ap.add_argument("--watchlist", action="store_true", default=os.environ.get('EV_WATCHLIST', 'false').lower() == 'true', help="check OCR reads against the Mongo watchlist (needs --ocr and ev_mongo)")
+
+    ap.add_argument("--warmup", action="store_true", default=os.environ.get('EV_MODEL_WARMUP', 'false').lower() == 'true', help="run one dummy inference per model before the first frame")
 
     return ap.parse_args()
 
 
 def main():
+    t_main = time.perf_counter()
     args = parse_args()
 
     print("HELLO FROM MAIN.PY", flush=True)
@@ -205,16 +223,23 @@ def main():
         keep_minutes=args.buffer_min,
     )
 
+    crop_store = CropStoreWriter(args.crop_store, camera_id=args.camera_id) if args.store == "pack" else None
+
     # Models
-    car_model = YOLO(args.car_model)
+    car_model = get_yolo(args.car_model)
 
     plate_model = None
     if args.plate_model and os.path.exists(args.plate_model):
-        plate_model = YOLO(args.plate_model)
+        plate_model = get_yolo(args.plate_model)
         print("✅ Plate model loaded:", args.plate_model, flush=True)
     else:
         print("⚠️ Plate model not provided/found. Plate detection will be skipped.", flush=True)
 
+    if args.warmup:
+        secs = sum(warmup_yolo(m, (W, H)) for m in (car_model, plate_model) if m is not None)
+        print(f"Model warm-up: {secs:.2f}s", flush=True)
+    print(f"⏱ models ready {time.perf_counter() - t_main:.2f}s after start", flush=True)
+
     # COCO vehicle classes: car(2), motorcycle(3), bus(5), truck(7)
     vehicle_classes = [2, 3, 5, 7]
 
@@ -225,6 +250,42 @@ def main():
     best_plate = {}  # tid -> {"score": float, "path": str, "row": dict}
     log_rows = []    # used when best-only is OFF
 
+    # Background OCR: tid -> best crop so far, handed over once the track goes stale
+    ocr_worker = OcrWorker().start() if args.ocr else None
+    track_timeout = args.track_timeout or max(1, int(fps * 2))
+    ocr_best = TopKCrops(args.ocr_top_k)  # tid -> its top-K crops so far
+    last_seen = {}     # tid -> frame_idx
+    ocr_results = {}   # tid -> OcrResult
+
+    watchlist = None
+    if ocr_worker is not None and args.watchlist:
+        from src.server.mongo import get_db
+        from src.detection.watchlist import Watchlist
+
+        watchlist = Watchlist(get_db()).start()
+
+    def on_plate_read(res):
+        # a track seen again after hand-over is read again: keep the better of its reads
+        ocr_results[res.track_id] = merge_results(ocr_results.get(res.track_id), res)
+        if res.text:
+            print(f"🔤 vid{res.track_id} -> {res.text} ({res.conf:.2f}) [{res.variant}] "
+                  f"{res.done_at - res.meta['ts']:.1f}s after capture", flush=True)
+            if watchlist is not None:
+                watchlist.check(res.text, res.conf, camera_id=args.camera_id, meta=res.meta, read_at=res.done_at)
+
+    def store_best(tid):
+        """Append a finished track's best crop to the pack and drop it from memory."""
+        v = best_plate[tid]
+        if v["crop"] is None:
+            return
+        if crop_store.append_image(v["crop"], tid, v["ts"]) is None:
+            print(f"⚠️ Failed to store plate crop for vehicle {tid}", flush=True)
+        v["crop"] = None
+
+    def hand_over(tid):
+        crops = ocr_best.pop(tid)
+        ocr_worker.submit(tid, [c for _, c, _, _ in crops], meta={"ts": crops[0][2]}, callback=on_plate_read, block=True)
+
     frame_idx = 0
     t0 = time.time()
     last_plate_debug = 0.0
@@ -238,6 +299,7 @@ def main():
 
         if frame_idx == 1:
             print("[debug] first frame reached, writing to buffer...", flush=True)
+            t_first = time.perf_counter()
 
         # 1) store raw buffer
         buffer_writer.write(frame)
@@ -267,26 +329,26 @@ def main():
         processed_writer.write(processed_frame)
 
 
-        vehicle_boxes = []
+        vehicle_xyxy = np.zeros((0, 4), dtype=np.float32)
+        vehicle_ids = np.zeros(0, dtype=np.int64)
         cars_in_frame = 0
 
         if results.boxes is not None and results.boxes.xyxy is not None:
-            xyxy = results.boxes.xyxy.cpu().numpy()
+            vehicle_xyxy = results.boxes.xyxy.cpu().numpy()
+            vehicle_ids = np.full(len(vehicle_xyxy), -1, dtype=np.int64)
 
-            ids = None
             if getattr(results.boxes, "id", None) is not None:
                 try:
-                    ids = results.boxes.id.cpu().numpy().astype(int)
+                    vehicle_ids = results.boxes.id.cpu().numpy().astype(np.int64)
                 except Exception:
-                    ids = None
+                    pass
+
+            cars_in_frame = len(vehicle_xyxy)
+            seen_vehicle_ids.update(vehicle_ids[vehicle_ids != -1].tolist())
 
-            for i in range(len(xyxy)):
-                x1, y1, x2, y2 = xyxy[i]
-                tid = int(ids[i]) if ids is not None else -1
-                vehicle_boxes.append((x1, y1, x2, y2, tid))
-                cars_in_frame += 1
-                if tid != -1:
-                    seen_vehicle_ids.add(tid)
+            if ocr_worker is not None or args.best_only:
+                for tid in vehicle_ids[vehicle_ids != -1].tolist():
+                    last_seen[tid] = frame_idx
 
         # 3) plate detection + crop (only if plate_model is available)
         if plate_model is not None:
@@ -300,33 +362,32 @@ def main():
                 pxyxy = pres.boxes.xyxy.cpu().numpy()
                 pconf = pres.boxes.conf.cpu().numpy() if pres.boxes.conf is not None else None
 
+                # associate all plates -> vehicles at once (centre containment, best IoU wins)
+                assoc_ids = associate_plates(pxyxy, vehicle_xyxy, vehicle_ids)
+                crops = safe_crop_batch(frame, pxyxy)
+
                 for j in range(len(pxyxy)):
-                    px1, py1, px2, py2 = pxyxy[j]
                     confv = float(pconf[j]) if pconf is not None else None
 
-                    crop = safe_crop(frame, px1, py1, px2, py2)
+                    crop = crops[j]
                     if crop is None:
                         continue
 
-                    # associate plate -> vehicle if plate center inside a vehicle box
-                    cx = (px1 + px2) / 2
-                    cy = (py1 + py2) / 2
-                    assoc_id = -1
-                    for (x1, y1, x2, y2, tid) in vehicle_boxes:
-                        if x1 <= cx <= x2 and y1 <= cy <= y2:
-                            assoc_id = tid
-                            break
-
                     # If no tracker id, skip saving (best-only needs a stable ID)
+                    assoc_id = int(assoc_ids[j])
                     if assoc_id == -1:
                         continue
 
                     ts = time.time()
                     stamp = datetime.fromtimestamp(ts).strftime("%Y%m%d_%H%M%S_%f")
 
+                    new_score = quality_score(crop) if (args.best_only or ocr_worker is not None) else None
+
+                    if ocr_worker is not None:
+                        ocr_best.add(assoc_id, new_score, crop, ts, frame_idx)
+
                     # ----- BEST-ONLY logic -----
                     if args.best_only:
-                        new_score = quality_score(crop)
                         prev = best_plate.get(assoc_id)
 
                         # if we already have one, only replace if significantly better
@@ -334,19 +395,25 @@ def main():
                             if new_score < prev["score"] * float(args.min_improve):
                                 continue  # not better enough, skip saving
                             # delete old best image
-                            try:
-                                if os.path.exists(prev["path"]):
-                                    os.remove(prev["path"])
-                            except Exception:
-                                pass
+                            if crop_store is None:
+                                try:
+                                    if os.path.exists(prev["path"]):
+                                        os.remove(prev["path"])
+                                except Exception:
+                                    pass
 
                         out_name = f"plate_{stamp}_vid{assoc_id}.jpg"
-                        out_path = os.path.join(plates_dir, out_name)
-
-                        ok_write = cv2.imwrite(out_path, crop)
-                        if not ok_write:
-                            print(f"⚠️ Failed to write plate crop: {out_path}", flush=True)
-                            continue
+                        if crop_store is None:
+                            out_path = os.path.join(plates_dir, out_name)
+                            ok_write = cv2.imwrite(out_path, crop)
+                            if not ok_write:
+                                print(f"⚠️ Failed to write plate crop: {out_path}", flush=True)
+                                continue
+                            crop_data = None
+                        else:
+                            # packs are append-only: hold the current best in memory until the track goes stale
+                            out_path = f"{args.crop_store}#{out_name}"
+                            crop_data = crop
 
                         row = {
                             "timestamp": datetime.fromtimestamp(ts).isoformat(),
@@ -359,14 +426,17 @@ def main():
                             "plate_quality_score": new_score,
                         }
 
-                        best_plate[assoc_id] = {"score": new_score, "path": out_path, "row": row}
+                        best_plate[assoc_id] = {"score": new_score, "path": out_path, "row": row, "crop": crop_data, "ts": ts}
 
                     # ----- Old behavior (save multiple) -----
                     else:
                         out_name = f"plate_{stamp}_vid{assoc_id}.jpg"
-                        out_path = os.path.join(plates_dir, out_name)
-
-                        ok_write = cv2.imwrite(out_path, crop)
+                        if crop_store is None:
+                            out_path = os.path.join(plates_dir, out_name)
+                            ok_write = cv2.imwrite(out_path, crop)
+                        else:
+                            out_path = f"{args.crop_store}#{out_name}"
+                            ok_write = crop_store.append_image(crop, assoc_id, ts) is not None
                         if not ok_write:
                             print(f"⚠️ Failed to write plate crop: {out_path}", flush=True)
                             continue
@@ -383,6 +453,19 @@ def main():
                             }
                         )
 
+        # tracks not seen for a while are final: hand their best crop to OCR
+        if ocr_worker is not None:
+            for tid in [t for t in ocr_best if frame_idx - last_seen.get(t, frame_idx) > track_timeout]:
+                hand_over(tid)
+        if crop_store is not None and args.best_only:
+            for tid in [t for t, v in best_plate.items()
+                        if v["crop"] is not None and frame_idx - last_seen.get(t, frame_idx) > track_timeout]:
+                store_best(tid)
+
+        if frame_idx == 1:
+            print(f"⏱ first frame processed {time.perf_counter() - t_main:.2f}s after start "
+                  f"({time.perf_counter() - t_first:.2f}s inference)", flush=True)
+
         # status print every ~2 seconds
         if frame_idx % max(1, int(fps * 2)) == 0:
             elapsed = time.time() - t0
@@ -395,8 +478,36 @@ def main():
     buffer_writer.close()
     processed_writer.release()
 
+    if ocr_worker is not None:
+        for tid in list(ocr_best):
+            hand_over(tid)
+        ocr_worker.close()
+        if watchlist is not None:
+            watchlist.close()
+        st = ocr_worker.stats
+        print(f"OCR: {st['done']} tracks, {st['reads'] / max(1, st['done']):.2f} crops read per track "
+              f"(top-k {args.ocr_top_k}), {st['dropped']} dropped", flush=True)
+        if watchlist is not None:
+            wl = watchlist.summary()
+            print(f"Watchlist: {wl['alerts']} alerts from {wl['checked']} reads, match p95 "
+                  f"{(wl['match']['latency_p95_s'] or 0) * 1000:.1f}ms, read->alert p95 {wl['alert']['latency_p95_s']}s", flush=True)
+
+        # attach plate text to the log rows
+        rows = [v["row"] for v in best_plate.values()] if args.best_only else log_rows
+        for row in rows:
+            res = ocr_results.get(row["associated_vehicle_id"])
+            row["plate_text"] = res.text if res else ""
+            row["plate_text_conf"] = round(res.conf, 4) if res else 0.0
+
+    if crop_store is not None:
+        if args.best_only:
+            for tid, _ in sorted(best_plate.items(), key=lambda kv: kv[1]["ts"]):
+                store_best(tid)
+        crop_store.close()
 
     # Save log
+    import pandas as pd
+
     csv_path = os.path.join(logs_dir, "plate_log.csv")
 
     if args.best_only:
@@ -408,10 +519,12 @@ def main():
     print("\n✅ DONE", flush=True)
     print("Frames actually read:", frame_idx, flush=True)
     print("Chunks:", chunks_dir, flush=True)
-    print("Plates:", plates_dir, flush=True)
+    print("Plates:", args.crop_store if crop_store is not None else plates_dir, flush=True)
     print("Log:", csv_path, flush=True)
     if args.best_only:
         print(f"Best-only saved plates (unique vehicles): {len(best_plate)}", flush=True)
+    if ocr_worker is not None:
+        print(f"Plates read (OCR worker): {sum(1 for r in ocr_results.values() if r.text)}/{len(ocr_results)}", flush=True)
 
 
 if __name__ == "__main__":
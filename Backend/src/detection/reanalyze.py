@@ -0,0 +1,231 @@
+# reanalyze.py (re-run detection + OCR over the encrypted archive in GridFS)
+import os
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bson import ObjectId
+
+
+DEFAULT_CHECKPOINT = os.environ.get('EV_REANALYZE_CHECKPOINT', 'data/reanalyze.done')
+
+# Per-process state, filled once by _init_worker
+_W = {}
+
+
+def default_tmp_dir():
+    """Plaintext never goes to persistent disk: tmpfs (/dev/shm) unless EV_TMP_DIR_PLAIN names a directory."""
+    explicit = os.environ.get('EV_TMP_DIR_PLAIN')
+    if explicit:
+        return explicit
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    raise RuntimeError("❌ No tmpfs (/dev/shm) for decrypted video; set EV_TMP_DIR_PLAIN or --tmp-dir to allow a directory")
+
+
+def _init_worker(car_model, plate_model, detect_every, tmp_dir, torch_threads):
+    """Runs once per pool process: load models, key and DB handle."""
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except Exception:
+            pass
+
+    from gridfs import GridFSBucket
+    from src.server.mongo import get_db
+    from src.encryption import decryption as decryption_mod
+    from src.detection.live_detect import LiveDetector
+
+    detector = LiveDetector(car_model=car_model, plate_model=plate_model, detect_every=detect_every, track_timeout=0)
+    detector._load_models()
+
+    db = get_db()
+    _W.update(
+        detector=detector,
+        bucket=GridFSBucket(db),
+        key=decryption_mod.load_key(),
+        tmp_dir=tmp_dir,
+    )
+
+    # build the easyocr.Reader once in this process, before the first video
+    from src.detection.consensus import read_track
+    from src.detection.models import get_ocr_reader
+    get_ocr_reader()
+    _W["read_track"] = read_track
+
+
+def analyze_video(video_id: str, gridfs_id: str):
+    """Decrypt one archived segment to tmpfs, detect + OCR, return (video_id, plates)."""
+    import cv2
+    from src.encryption import decryption as decryption_mod
+
+    detector = _W["detector"]
+    detector.reset_tracker()
+    t0 = time.time()
+
+    grid_out = _W["bucket"].open_download_stream(ObjectId(gridfs_id))
+    tmpf = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4", dir=_W["tmp_dir"])
+    try:
+        with tmpf:
+            for chunk in decryption_mod.decrypt_stream_generator(grid_out, _W["key"]):
+                tmpf.write(chunk)
+
+        cap = cv2.VideoCapture(tmpf.name)
+        frame_no = 0
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if frame_no % detector.detect_every == 0:
+                    detector.process_frame(video_id, frame_no, frame, time.time())
+                frame_no += 1
+        finally:
+            cap.release()
+    finally:
+        try:
+            os.remove(tmpf.name)
+        except Exception:
+            pass
+
+    plates = set()
+    tracks = detector.best.pop(video_id, None)
+    detector.last_seen.pop(video_id, None)
+    for tid in (tracks or ()):
+        text, _, _ = _W["read_track"]([crop for _, crop, _, _ in tracks.pop(tid)])
+        if text:
+            plates.add(text)
+
+    return video_id, sorted(plates), frame_no, time.time() - t0
+
+
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def build_query(camera_id, start, end):
+    query = {'gridfs_id': {'$exists': True}}
+    if camera_id:
+        query['camera_id'] = camera_id
+    if start or end:
+        query['upload_date'] = {}
+        if start:
+            query['upload_date']['$gte'] = start
+        if end:
+            query['upload_date']['$lt'] = end
+    return query
+
+
+def flush_updates(db, pending, replace, checkpoint_fh):
+    """Bulk-write a batch of results, then checkpoint the ids it covered."""
+    from pymongo import UpdateOne
+    from src.detection.plate_text import plate_keys
+
+    if not pending:
+        return
+    ops = []
+    for video_id, plates in pending:
+        keys = plate_keys(plates)
+        if replace:
+            update = {'$set': {'plate_numbers': plates, 'plate_keys': keys, 'reanalyzed_at': datetime.utcnow()}}
+        else:
+            update = {
+                '$addToSet': {'plate_numbers': {'$each': plates}, 'plate_keys': {'$each': keys}},
+                '$set': {'reanalyzed_at': datetime.utcnow()},
+            }
+        ops.append(UpdateOne({'_id': ObjectId(video_id)}, update))
+    db.videos.bulk_write(ops, ordered=False)
+
+    for video_id, _ in pending:
+        checkpoint_fh.write(video_id + "\n")
+    checkpoint_fh.flush()
+    os.fsync(checkpoint_fh.fileno())
+    pending.clear()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-run plate detection over encrypted videos in MongoDB")
+    ap.add_argument("--camera-id", default=None)
+    ap.add_argument("--start", default=None, help="YYYY-MM-DD (inclusive, UTC)")
+    ap.add_argument("--end", default=None, help="YYYY-MM-DD (inclusive, UTC)")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--torch-threads", type=int, default=None, help="torch threads per worker (default: cores / workers)")
+    ap.add_argument("--car-model", default=os.environ.get('EV_CAR_MODEL', 'yolov8n.pt'))
+    ap.add_argument("--plate-model", default=os.environ.get('EV_PLATE_MODEL', ''))
+    ap.add_argument("--detect-every", type=int, default=int(os.environ.get('EV_DETECT_EVERY', 2)))
+    ap.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="file of finished video ids (resume support)")
+    ap.add_argument("--batch", type=int, default=50, help="results per bulk write")
+    ap.add_argument("--replace", action="store_true", help="overwrite plate_numbers instead of merging")
+    ap.add_argument("--tmp-dir", default=None, help="where decrypted plaintext lives briefly (default: /dev/shm)")
+    args = ap.parse_args()
+    args.tmp_dir = args.tmp_dir or default_tmp_dir()
+
+    if not args.plate_model or not os.path.exists(args.plate_model):
+        raise RuntimeError(f"Plate model not found: {args.plate_model!r}")
+
+    from src.server.mongo import get_db
+
+    db = get_db()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else None
+    end = datetime.strptime(args.end, "%Y-%m-%d") + timedelta(days=1) if args.end else None
+
+    done = load_checkpoint(args.checkpoint)
+    todo = [
+        (str(v['_id']), str(v['gridfs_id']))
+        for v in db.videos.find(build_query(args.camera_id, start, end), {'gridfs_id': 1}).sort('_id', 1)
+        if str(v['_id']) not in done
+    ]
+    print(f"Re-analysis: {len(todo)} videos to do, {len(done)} already done, {args.workers} workers, tmp={args.tmp_dir}")
+
+    ckpt_dir = os.path.dirname(args.checkpoint)
+    if ckpt_dir:
+        os.makedirs(ckpt_dir, exist_ok=True)
+
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // args.workers)
+    t0 = time.time()
+    n_done = 0
+    pending = []
+
+    with open(args.checkpoint, "a", encoding="utf-8") as ckpt, ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(args.car_model, args.plate_model, args.detect_every, args.tmp_dir, torch_threads),
+    ) as pool:
+        futures = {pool.submit(analyze_video, vid, gid): vid for vid, gid in todo}
+        try:
+            for fut in as_completed(futures):
+                vid = futures[fut]
+                try:
+                    _, plates, frames, secs = fut.result()
+                except Exception as e:
+                    # not checkpointed: picked up again on the next run
+                    print(f"✗ {vid}: {e}", flush=True)
+                    continue
+
+                n_done += 1
+                pending.append((vid, plates))
+                print(f"✓ {vid}: {len(plates)} plates, {frames} frames in {secs:.1f}s [{n_done}/{len(todo)}]", flush=True)
+
+                if len(pending) >= args.batch:
+                    flush_updates(db, pending, args.replace, ckpt)
+        except KeyboardInterrupt:
+            # leaving the with block would otherwise still run every queued video
+            print("\n🛑 Interrupted: cancelling queued videos (finished ones are checkpointed)", flush=True)
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            flush_updates(db, pending, args.replace, ckpt)
+
+    elapsed = time.time() - t0
+    print(f"\nDONE ✅ {n_done} videos in {elapsed:.1f}s ({n_done / max(elapsed, 1e-6) * 3600:.0f} videos/hour)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 import os
+import json
 import time
 from pathlib import Path
 from datetime import datetime
-from pymongo import MongoClient
 from gridfs import GridFSBucket
 from bson import ObjectId
 
+from src.detection.plate_text import plate_keys
+from src.server.mongo import get_client
+
 
 class VideoUploader:
     def __init__(
@@ -24,7 +27,7 @@ class VideoUploader:
         if not mongo_uri:
             raise ValueError("MongoDB URI required (set EV_MONGO)")
 
-        self.client = MongoClient(mongo_uri)
+        self.client = get_client(mongo_uri)
         self.db = self.client[db_name]
 
         # Use GridFS for large files (avoids BSON 16MB limit and full-file reads)
@@ -36,6 +39,8 @@ class VideoUploader:
             self.db.fs.files.create_index('uploadDate', expireAfterSeconds=604800)
             self.db.fs.files.create_index('metadata.camera_id')
             self.db.fs.files.create_index('metadata.plate_numbers')
+            self.db.videos.create_index('segment')
+            self.db.segment_plates.create_index('segment', unique=True)
         except Exception:
             pass
         
@@ -53,9 +58,39 @@ class VideoUploader:
         size2 = filepath.stat().st_size
         return size1 == size2
     
+    def read_sidecar(self, filepath):
+        """Segment info the encryptor left next to the encrypted file (may be missing)."""
+        sidecar = filepath.with_suffix('.json')
+        try:
+            with open(sidecar) as fh:
+                return json.load(fh)
+        except Exception:
+            return {}
+
+    def attach_detected_plates(self, segment, video_id):
+        """Merge plates the live detection stage already recorded for this segment."""
+        try:
+            # sightings written before this doc existed point at the segment only
+            self.db.plate_sightings.update_many(
+                {'segment': segment, 'video_id': None},
+                {'$set': {'video_id': video_id}},
+            )
+            found = self.db.segment_plates.find_one({'segment': segment}, {'plate_numbers': 1})
+            plates = (found or {}).get('plate_numbers') or []
+            if plates:
+                self.db.videos.update_one(
+                    {'_id': video_id},
+                    {'$addToSet': {'plate_numbers': {'$each': plates}, 'plate_keys': {'$each': plate_keys(plates)}}},
+                )
+        except Exception as e:
+            print(f"⚠️ Failed to attach plates for {segment}: {e}")
+
     def upload_video(self, filepath):
         """Upload encrypted video to MongoDB."""
         try:
+            info = self.read_sidecar(filepath)
+            segment = info.get('segment')
+
             # Stream the file into GridFS to avoid reading the whole file into memory
             metadata = {
                 'camera_id': self.camera_id,
@@ -84,16 +119,28 @@ class VideoUploader:
                     'gridfs_id': file_id,
                     'file_size': file_size,
                 }
+                if segment:
+                    doc['segment'] = segment
+                # capture interval from the recorder (epoch seconds -> UTC datetimes)
+                for field in ('capture_start', 'capture_end'):
+                    if info.get(field) is not None:
+                        doc[field] = datetime.utcfromtimestamp(float(info[field]))
+                if info.get('frames') is not None:
+                    doc['frames'] = int(info['frames'])
+                    doc['fps'] = info.get('fps')
                 result = self.db.videos.insert_one(doc)
                 print(f"✓ Metadata inserted: {result.inserted_id}")
+                if segment:
+                    self.attach_detected_plates(segment, result.inserted_id)
             except Exception as e:
                 print(f"⚠️ Failed to insert metadata doc: {e}")
 
-            # Delete local file after successful upload
-            try:
-                filepath.unlink()
-            except Exception:
-                pass
+            # Delete local file (and sidecar) after successful upload
+            for path in (filepath, filepath.with_suffix('.json')):
+                try:
+                    path.unlink()
+                except Exception:
+                    pass
 
             return result.inserted_id if 'result' in locals() else file_id
             
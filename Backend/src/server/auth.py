@@ -1,5 +1,7 @@
 import os
 import jwt
+import time
+import threading
 from functools import wraps
 from datetime import datetime, timezone, timedelta
 from flask import request, jsonify, current_app
@@ -23,6 +25,56 @@ def verify_password(stored, provided):
     return False
 
 
+class TokenCache:
+    """
+    Verified JWT payloads keyed by the token string, so a session's requests
+    skip the signature check. An entry lives for at most `ttl` seconds and never
+    past the token's own exp; the oldest entry is dropped when full.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 4096):
+        self.ttl = ttl
+        self.max_size = max(1, int(max_size))
+        self.entries = {}  # token -> (payload, expires_at)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, token):
+        entry = self.entries.get(token)
+        if entry is None or entry[1] <= time.time():
+            self.stats["misses"] += 1
+            if entry is not None:
+                self.discard(token)
+            return None
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def put(self, token, payload):
+        expires_at = time.time() + self.ttl
+        if payload.get('exp') is not None:
+            expires_at = min(expires_at, float(payload['exp']))
+        with self.lock:
+            self.entries.pop(token, None)
+            while len(self.entries) >= self.max_size:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[token] = (payload, expires_at)
+
+    def discard(self, token):
+        with self.lock:
+            self.entries.pop(token, None)
+
+
+def decode_token(token):
+    """The token's payload, from the app's TokenCache when it is there; raises like jwt.decode."""
+    cache = current_app.config.get('TOKEN_CACHE')
+    payload = cache.get(token) if cache is not None else None
+    if payload is None:
+        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=["HS256"])
+        if cache is not None:
+            cache.put(token, payload)
+    return payload
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -30,9 +82,7 @@ def token_required(f):
         if not token:
             return jsonify({"error": "Authentication required"}), 401
         try:
-            secret = current_app.config.get('SECRET_KEY')
-            payload = jwt.decode(token, secret, algorithms=["HS256"])
-            request.user = payload
+            request.user = decode_token(token)
         except jwt.ExpiredSignatureError:
             return jsonify({"error": "Token expired"}), 401
         except Exception:
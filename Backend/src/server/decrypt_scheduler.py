@@ -0,0 +1,133 @@
+# decrypt_scheduler.py (bounded worker pool for video decryption, interactive before bulk)
+import os
+import math
+import time
+import queue
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+
+class SchedulerBusy(Exception):
+    """The queue is full; retry_after is a rough wait in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"decryption queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DecryptScheduler:
+    """
+    Runs decryption jobs on a fixed number of worker threads so concurrent
+    viewers can't start unbounded full-file decrypts next to recording and
+    encryption. Jobs wait in a priority queue (interactive playback first,
+    FIFO within a priority); past max_queue waiting jobs, submit() raises
+    SchedulerBusy. Bulk jobs may only fill half the queue, so playback still
+    gets in while an export backlog is waiting.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = 16, window: int = 500):
+        self.workers = max(1, int(workers or max(1, (os.cpu_count() or 2) // 2)))
+        self.max_queue = max(1, int(max_queue))
+        self.q = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self.lock = threading.Lock()
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        self.running = 0
+
+        self.waits = deque(maxlen=window)      # seconds queued before a worker took the job
+        self.durations = deque(maxlen=window)  # seconds per job
+        self.stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "bytes": 0, "busy_s": 0.0}
+
+        for i in range(self.workers):
+            threading.Thread(target=self._run, daemon=True, name=f"Decrypt-{i}").start()
+
+    def submit(self, fn, *args, priority: int = INTERACTIVE) -> Future:
+        """Queue fn(*args); its result (or exception) arrives on the returned Future."""
+        limit = self.max_queue if priority == INTERACTIVE else max(1, self.max_queue // 2)
+        with self.lock:
+            if sum(self.waiting.values()) >= self.max_queue or self.waiting[priority] >= limit:
+                self.stats["rejected"] += 1
+                raise SchedulerBusy(self.retry_after())
+            self.waiting[priority] += 1
+            self.stats["submitted"] += 1
+        fut = Future()
+        self.q.put((priority, next(self._seq), time.perf_counter(), fut, fn, args))
+        return fut
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained, from recent job times."""
+        per_job = (sum(self.durations) / len(self.durations)) if self.durations else 1.0
+        backlog = sum(self.waiting.values()) + self.running
+        return max(1, math.ceil(backlog * per_job / self.workers))
+
+    def _run(self):
+        while True:
+            priority, _, queued_at, fut, fn, args = self.q.get()
+            with self.lock:
+                self.waiting[priority] -= 1
+                self.running += 1
+            if not fut.set_running_or_notify_cancel():
+                with self.lock:
+                    self.running -= 1
+                continue
+
+            started = time.perf_counter()
+            result, error = None, None
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                error = e
+            elapsed = time.perf_counter() - started
+            # output size before the caller gets (and may delete) the file
+            size = os.path.getsize(result) if isinstance(result, str) and os.path.exists(result) else 0
+
+            with self.lock:
+                self.running -= 1
+                self.waits.append(started - queued_at)
+                self.durations.append(elapsed)
+                self.stats["done" if error is None and result is not None else "failed"] += 1
+                self.stats["busy_s"] += elapsed
+                self.stats["bytes"] += size
+
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            waits = sorted(self.waits)
+            stats = dict(self.stats)
+            waiting = {PRIORITY_NAMES[p]: n for p, n in self.waiting.items()}
+            running = self.running
+
+        def pct(q):
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else None
+
+        busy = stats.pop("busy_s")
+        return {
+            **stats,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "waiting": waiting,
+            "queue_wait_ms_p50": pct(0.50),
+            "queue_wait_ms_p95": pct(0.95),
+            # plaintext MB per second of worker time (per-worker decrypt speed)
+            "throughput_mb_s": round(stats["bytes"] / busy / 1e6, 1) if busy else None,
+        }
+
+
+def from_env() -> DecryptScheduler:
+    workers = os.environ.get('EV_DECRYPT_WORKERS')
+    return DecryptScheduler(
+        workers=int(workers) if workers else None,
+        max_queue=int(os.environ.get('EV_DECRYPT_MAX_QUEUE', 16)),
+    )
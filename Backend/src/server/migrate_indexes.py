@@ -0,0 +1,28 @@
+# migrate_indexes.py (one-off: drop videos indexes made redundant by the compound search indexes)
+from src.server.mongo import get_db
+
+
+# single-field indexes that are prefixes of compound ones create_app() builds
+OBSOLETE_INDEXES = (
+    'camera_id_1',
+    'plate_numbers_1',
+)
+
+
+def drop_obsolete(db):
+    """Drop whichever obsolete indexes still exist; running it again is a no-op."""
+    existing = db.videos.index_information()
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            db.videos.drop_index(name)
+            print(f"videos: dropped {name}")
+        else:
+            print(f"videos: {name} already gone")
+
+
+def main():
+    drop_obsolete(get_db())
+
+
+if __name__ == '__main__':
+    main()
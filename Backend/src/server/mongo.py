@@ -0,0 +1,153 @@
+# mongo.py (one MongoClient per process, tuned from env, shared by server, user store, uploader and detection)
+import os
+import time
+import threading
+from collections import deque
+
+from pymongo import MongoClient, ReadPreference, monitoring
+
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+
+def client_options() -> dict:
+    """Pool size and timeouts (ms) from env; 0 for a timeout means none."""
+    def ms(name, default):
+        value = int(os.environ.get(name, default))
+        return value or None
+
+    return {
+        'maxPoolSize': int(os.environ.get('EV_MONGO_MAX_POOL', 50)),
+        'minPoolSize': int(os.environ.get('EV_MONGO_MIN_POOL', 0)),
+        'serverSelectionTimeoutMS': ms('EV_MONGO_SERVER_SELECTION_MS', 5000),
+        'connectTimeoutMS': ms('EV_MONGO_CONNECT_TIMEOUT_MS', 5000),
+        'socketTimeoutMS': ms('EV_MONGO_SOCKET_TIMEOUT_MS', 30000),
+        'waitQueueTimeoutMS': ms('EV_MONGO_WAIT_QUEUE_MS', 2000),
+    }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server: open / checked out now, checkouts, failures, wait time."""
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.servers = {}  # "host:port" -> counters
+        self.waits = deque(maxlen=window)
+        self._started = threading.local()
+
+    def _server(self, address):
+        key = "%s:%s" % address
+        s = self.servers.get(key)
+        if s is None:
+            s = self.servers[key] = {"open": 0, "checked_out": 0, "checkouts": 0, "failed": 0, "cleared": 0}
+        return s
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self._server(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self.lock:
+            self._server(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self.lock:
+            self._server(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        self._started.t = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self._server(event.address)["failed"] += 1
+
+    def connection_checked_out(self, event):
+        wait = getattr(event, 'duration', None)
+        if wait is None:
+            wait = time.perf_counter() - getattr(self._started, 't', time.perf_counter())
+        with self.lock:
+            s = self._server(event.address)
+            s["checked_out"] += 1
+            s["checkouts"] += 1
+            self.waits.append(wait)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self._server(event.address)["checked_out"] -= 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            waits = sorted(self.waits)
+            servers = {k: dict(v) for k, v in self.servers.items()}
+
+        def pct(q):
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 3) if waits else None
+
+        return {
+            "servers": servers,
+            "checked_out": sum(s["checked_out"] for s in servers.values()),
+            "wait_ms_p50": pct(0.50),
+            "wait_ms_p95": pct(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 3) if waits else None,
+        }
+
+
+POOL_METRICS = PoolMetrics()
+
+_lock = threading.Lock()
+_clients = {}  # (pid, uri) -> MongoClient; a forked worker builds its own
+
+
+def get_client(uri: str = None) -> MongoClient:
+    """The process-wide MongoClient for `uri` (default: ev_mongo)."""
+    uri = uri or os.environ.get('ev_mongo')
+    if not uri:
+        raise RuntimeError('EV_MONGO environment variable must be set')
+    key = (os.getpid(), uri)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = MongoClient(uri, event_listeners=[POOL_METRICS], **client_options())
+    return client
+
+
+def get_db(name: str = None, uri: str = None):
+    return get_client(uri)[name or os.environ.get('EV_DB_NAME', 'video_storage_db')]
+
+
+def search_db(name: str = None, uri: str = None):
+    """
+    Handle for read-only search queries: EV_MONGO_SEARCH_READ (e.g. secondaryPreferred)
+    moves them off the primary on a replica set; default primary.
+    """
+    mode = os.environ.get('EV_MONGO_SEARCH_READ', 'primary')
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"EV_MONGO_SEARCH_READ must be one of {', '.join(READ_PREFERENCES)}")
+    return get_client(uri).get_database(
+        name or os.environ.get('EV_DB_NAME', 'video_storage_db'),
+        read_preference=READ_PREFERENCES[mode],
+    )
+
+
+def pool_stats() -> dict:
+    return POOL_METRICS.snapshot()
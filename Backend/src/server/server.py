@@ -1,5 +1,10 @@
 from flask import Flask
-from pymongo import MongoClient
+from gridfs import GridFSBucket
+from src.server.mongo import get_db, search_db
+from src.server import decrypt_scheduler
+from src.server.auth import TokenCache
+from src.encryption import decryption as decryption_mod
+from src.detection.plate_text import ensure_sighting_indexes
 import os
 
 
@@ -17,13 +22,28 @@ def create_app():
     if not mongo_url:
         raise RuntimeError('EV_MONGO environment variable must be set')
 
-    client = MongoClient(mongo_url)
-    db = client[db_name]
+    # one pooled client per process, shared with the user store and the uploader
+    db = get_db(db_name, mongo_url)
     app.config['DB'] = db
+    app.config['SEARCH_DB'] = search_db(db_name, mongo_url)
 
-    # Helpful startup info for debugging
+    # Built once per process instead of per request: GridFS bucket, video key, verified tokens
+    app.config['GRIDFS'] = GridFSBucket(db)
     try:
-        total = db.videos.count_documents({})
+        app.config['VIDEO_KEY'] = decryption_mod.load_key()
+    except FileNotFoundError as e:
+        app.config['VIDEO_KEY'] = None
+        print(f"⚠️ {e} (video routes will load it on first use)")
+    # all video decryption runs here: bounded workers, interactive before bulk
+    app.config['DECRYPT'] = decrypt_scheduler.from_env()
+    app.config['TOKEN_CACHE'] = TokenCache(
+        ttl=float(os.environ.get('EV_TOKEN_CACHE_TTL', 60)),
+        max_size=int(os.environ.get('EV_TOKEN_CACHE_SIZE', 4096)),
+    )
+
+    # Helpful startup info for debugging (collection metadata, no scan)
+    try:
+        total = db.videos.estimated_document_count()
     except Exception:
         total = 'unknown'
     print(f"Connected to MongoDB DB: {db_name} (total videos: {total})")
@@ -31,11 +51,23 @@ def create_app():
     # Create indexes
     try:
         db.videos.create_index('upload_date', expireAfterSeconds=604800)
-        db.videos.create_index('camera_id')
-        db.videos.create_index('plate_numbers')
+        # /search: equality filter first, then the newest-first (upload_date, _id) sort
+        db.videos.create_index([('upload_date', -1), ('_id', -1)])
+        db.videos.create_index([('camera_id', 1), ('upload_date', -1), ('_id', -1)])
+        db.videos.create_index([('plate_numbers', 1), ('upload_date', -1), ('_id', -1)])
+        # fuzzy plate search (deletion-neighbourhood + 3-gram keys, see detection/plate_text.py)
+        db.videos.create_index([('plate_keys', 1), ('upload_date', -1)])
+        # capture-time window search, sorted by capture_start (see videos_routes._overlapping)
+        db.videos.create_index([('camera_id', 1), ('capture_start', -1), ('_id', -1)])
+        db.videos.create_index([('capture_start', -1), ('_id', -1)])
     except Exception:
         pass
-        # Register blueprints
+    # the single-field indexes these replace are dropped once, by migrate_indexes.py
+
+    # /sightings and /plates/bulk read plate_sightings whether or not a detector runs here
+    ensure_sighting_indexes(db)
+
+    # Register blueprints
     from src.server.users_routes import bp as users_bp
     from src.server.videos_routes import bp as videos_bp
 
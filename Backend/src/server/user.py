@@ -1,19 +1,31 @@
 import bcrypt
 from datetime import datetime, timezone
-import os
-from pymongo import MongoClient
+import threading
 
-# Simple helper functions for user management used by server
-client = MongoClient(os.environ.get('ev_mongo'))
-db = client.user_storage_db
-db.users.create_index("email", unique=True)
-db.users.create_index("username", unique=True)
+from src.server.mongo import get_client
+
+# Simple helper functions for user management used by server.
+# The users collection lives on the shared client; indexes are ensured on first use, not at import.
+_indexes_lock = threading.Lock()
+_indexes_ready = False
+
+
+def users():
+    global _indexes_ready
+    coll = get_client().user_storage_db.users
+    if not _indexes_ready:
+        with _indexes_lock:
+            if not _indexes_ready:
+                coll.create_index("email", unique=True)
+                coll.create_index("username", unique=True)
+                _indexes_ready = True
+    return coll
 
 
 def create_user(username, email, password, role='viewer', cameras=None):
     cameras = cameras or []
     hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    user_id = db.users.insert_one({
+    user_id = users().insert_one({
         'username': username,
         'email': email,
         'password': hashed_pw,
@@ -26,8 +38,8 @@ def create_user(username, email, password, role='viewer', cameras=None):
 
 
 def find_by_email(email):
-    return db.users.find_one({'email': email})
+    return users().find_one({'email': email})
 
 
 def find_by_username(username):
-    return db.users.find_one({'username': username})
+    return users().find_one({'username': username})
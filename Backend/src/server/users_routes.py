@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from src.server.user import find_by_email, find_by_username, create_user
-from src.server.auth import verify_password, make_token_for_user
+from src.server.auth import verify_password, make_token_for_user, decode_token, token_required
+from src.server.mongo import pool_stats
 
 bp = Blueprint('users', __name__)
 
@@ -33,8 +34,7 @@ def me():
     if not token:
         return jsonify({"authenticated": False}), 200
     try:
-        import jwt
-        payload = jwt.decode(token, current_app.config.get('SECRET_KEY'), algorithms=["HS256"])
+        payload = decode_token(token)
         return jsonify({"authenticated": True, "user": payload}), 200
     except Exception:
         return jsonify({"authenticated": False}), 200
@@ -43,12 +43,29 @@ def me():
 @bp.route('/auth/logout', methods=['POST'])
 def auth_logout():
     # Clear the ev_token cookie
+    cache = current_app.config.get('TOKEN_CACHE')
+    if cache is not None and request.cookies.get('ev_token'):
+        cache.discard(request.cookies.get('ev_token'))
     resp = jsonify({'ok': True})
     secure_flag = current_app.config.get('SECURE_COOKIES', False)
     resp.set_cookie('ev_token', '', httponly=True, secure=secure_flag, samesite='Lax', max_age=0)
     return resp, 200
 
 
+@bp.route('/admin/stats')
+@token_required
+def admin_stats():
+    """Process-level counters for operators: Mongo pool, decryption queue, token cache."""
+    if request.user.get('role') != 'admin':
+        return jsonify({'error': 'Admin only'}), 403
+    cache = current_app.config.get('TOKEN_CACHE')
+    return jsonify({
+        'mongo_pool': pool_stats(),
+        'decrypt': current_app.config['DECRYPT'].snapshot() if current_app.config.get('DECRYPT') else None,
+        'token_cache': dict(cache.stats, size=len(cache.entries)) if cache is not None else None,
+    }), 200
+
+
 def admin_create_user():
     # simple admin endpoint to create users if needed (protect externally)
     data = request.get_json() or {}
@@ -1,17 +1,72 @@
 from flask import Blueprint, request, jsonify, current_app, Response
 from bson.objectid import ObjectId
 from src.server.auth import token_required
+from src.server.decrypt_scheduler import SchedulerBusy, INTERACTIVE, BULK
 from src.encryption import decryption as decryption_mod
+from src.detection.plate_text import clean_text, lookup_filter, rank_plates
 import os
+import json
+import base64
+import secrets
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from gridfs import GridFSBucket
+from werkzeug.http import http_date, is_resource_modified, parse_date, quote_etag
+from concurrent.futures import TimeoutError as FuturesTimeout
 import tempfile
 
 bp = Blueprint('videos', __name__)
+
+# longest a request waits for its decryption job (queue + decrypt)
+DECRYPT_TIMEOUT_S = float(os.environ.get('EV_DECRYPT_TIMEOUT_S', 60))
+# browsers may reuse a video (private cache) this long before revalidating with ETag/Last-Modified
+VIDEO_CACHE_SECONDS = int(os.environ.get('EV_VIDEO_CACHE_SECONDS', 3600))
+# more ranges than this in one request are served as the single span covering them
+MAX_RANGES = 16
+
+
+def _video_key():
+    """The key create_app loaded; read from disk once if it was missing at startup."""
+    key = current_app.config.get('VIDEO_KEY')
+    if key is None:
+        key = current_app.config['VIDEO_KEY'] = decryption_mod.load_key()
+    return key
+
+
+def _bucket(db):
+    return current_app.config.get('GRIDFS') or GridFSBucket(db)
+
+
+def _search_db():
+    """Read-only search handle (EV_MONGO_SEARCH_READ may send it to a secondary)."""
+    db = current_app.config.get('SEARCH_DB')
+    return db if db is not None else current_app.config['DB']
+
+
 @bp.route('/video/<video_id>')
 @token_required
 def stream_video(video_id):
     # Return decrypted stream by default for frontend compatibility
+    return _stream_authorized(video_id, INTERACTIVE)
+
+
+@bp.route('/video/decrypted/<video_id>')
+@token_required
+def stream_decrypted(video_id):
+    # Whole-file fetches (exports); ?priority=interactive when a player uses this route
+    return _stream_authorized(video_id, BULK)
+
+
+def _request_priority(default):
+    value = request.args.get('priority')
+    if value == 'interactive':
+        return INTERACTIVE
+    if value == 'bulk' or request.args.get('download'):
+        return BULK
+    return default
+
+
+def _stream_authorized(video_id, default_priority):
     db = current_app.config['DB']
     video = db.videos.find_one({'_id': ObjectId(video_id)})
 
@@ -23,429 +78,769 @@ def stream_video(video_id):
     if user_payload.get('role') != 'admin' and cam_id not in user_payload.get('assigned_cameras', []):
         return jsonify({"error": "Not authorized to view this camera's video"}), 403
 
+    # conditional requests are answered before anything is decrypted
+    etag, last_modified = _validators(video)
+    headers = _cache_headers(etag, last_modified)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return Response(status=304, headers=headers)
+
     range_header = request.headers.get('Range', None)
-    return _decrypted_response_for_video(db, video, range_header)
+    if range_header and not _if_range_matches(etag, last_modified):
+        range_header = None  # the client's copy is stale: send the whole file
+    return _decrypted_response_for_video(db, video, range_header, _request_priority(default_priority), headers)
 
 
-def _decrypted_response_for_video(db, video, range_header=None):
-    """Helper: returns a Flask Response streaming the decrypted MP4 for the given video document.
-    Supports Range requests by decrypting to a temp file when a Range header is present.
+def _validators(video):
     """
-    key = decryption_mod.load_key()
-
-    def send_range_from_file(path):
-        file_size = os.path.getsize(path)
-        if not range_header:
-            def gen():
-                with open(path, 'rb') as f:
-                    try:
-                        while True:
-                            chunk = f.read(64 * 1024)
-                            if not chunk:
-                                break
-                            yield chunk
-                    finally:
-                        try:
-                            os.remove(path)
-                        except Exception:
-                            pass
-
-            return Response(gen(), status=200, mimetype='video/mp4', headers={
-                'Content-Length': str(file_size),
-                'Accept-Ranges': 'bytes'
-            })
-
-        try:
-            units, rng = range_header.split('=')
-            start_str, end_str = rng.split('-')
-            start = int(start_str) if start_str else 0
-            end = int(end_str) if end_str else file_size - 1
-        except Exception:
-            return jsonify({'error': 'Invalid Range header'}), 400
+    (etag, last_modified) for a video. Uploaded ciphertext is never rewritten, so
+    its storage id plus upload date pin the decrypted bytes.
+    """
+    uploaded = video.get('upload_date')
+    if uploaded is not None:
+        uploaded = uploaded.replace(tzinfo=timezone.utc, microsecond=0)
+    stamp = int(uploaded.timestamp()) if uploaded else 0
+    return f"{video.get('gridfs_id') or video['_id']}-{stamp:x}", uploaded
+
+
+def _cache_headers(etag, last_modified):
+    headers = {
+        'ETag': quote_etag(etag),
+        'Cache-Control': f'private, max-age={VIDEO_CACHE_SECONDS}',
+        'Accept-Ranges': 'bytes',
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def _if_range_matches(etag, last_modified):
+    """If-Range: a strong ETag match or the exact Last-Modified date; no header counts as a match."""
+    value = (request.headers.get('If-Range') or '').strip()
+    if not value:
+        return True
+    if value.startswith('W/'):
+        return False
+    if value.startswith('"'):
+        return value == quote_etag(etag)
+    date = parse_date(value)
+    return date is not None and last_modified is not None and date == last_modified
+
+
+def _byte_ranges(range_header, size):
+    """
+    [(start, end)] inclusive, sorted and coalesced, for a bytes Range header;
+    [] when none is satisfiable, None when the header is malformed.
+    """
+    units, _, spec = range_header.partition('=')
+    if units.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    spans = []
+    for item in spec.split(','):
+        first, dash, last = item.strip().partition('-')
+        if not dash or not (first or last) or not (first + last).isdigit():
+            return None
+        if not first:  # suffix: the last N bytes
+            if int(last) == 0:
+                continue
+            start, end = max(0, size - int(last)), size - 1
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last), size - 1) if last else size - 1
+        if start < size:
+            spans.append((start, end))
+    spans.sort()
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
 
-        if start >= file_size:
-            return Response(status=416)
 
-        end = min(end, file_size - 1)
-        length = end - start + 1
+def _send_plaintext(path, range_header, headers):
+    """Serve a decrypted temp file (deleted once sent): whole, one range, or multipart/byteranges."""
+    file_size = os.path.getsize(path)
 
-        def partial_gen():
-            with open(path, 'rb') as f:
-                f.seek(start)
-                remaining = length
-                try:
+    def discard():
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+    def read_spans(spans, parts=None):
+        with open(path, 'rb') as f:
+            try:
+                for i, (start, end) in enumerate(spans):
+                    if parts:
+                        yield parts[i]
+                    f.seek(start)
+                    remaining = end - start + 1
                     while remaining > 0:
-                        chunk_size = min(64 * 1024, remaining)
-                        chunk = f.read(chunk_size)
+                        chunk = f.read(min(64 * 1024, remaining))
                         if not chunk:
                             break
                         remaining -= len(chunk)
                         yield chunk
-                finally:
-                    try:
-                        os.remove(path)
-                    except Exception:
-                        pass
-
-        headers = {
+                    if parts:
+                        yield b'\r\n'
+                if parts:
+                    yield parts[-1]
+            finally:
+                discard()
+
+    if not range_header:
+        return Response(read_spans([(0, file_size - 1)]), status=200, mimetype='video/mp4',
+                        headers={**headers, 'Content-Length': str(file_size)})
+
+    spans = _byte_ranges(range_header, file_size)
+    if spans is None:
+        discard()
+        return jsonify({'error': 'Invalid Range header'}), 400
+    if not spans:
+        discard()
+        return Response(status=416, headers={'Content-Range': f'bytes */{file_size}'})
+    if len(spans) > MAX_RANGES:
+        spans = [(spans[0][0], spans[-1][1])]
+
+    if len(spans) == 1:
+        start, end = spans[0]
+        return Response(read_spans(spans), status=206, mimetype='video/mp4', headers={
+            **headers,
             'Content-Range': f'bytes {start}-{end}/{file_size}',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(length),
-        }
-        return Response(partial_gen(), status=206, mimetype='video/mp4', headers=headers)
+            'Content-Length': str(end - start + 1),
+        })
 
-    # Inline blob
+    boundary = secrets.token_hex(16)
+    parts = [
+        f'--{boundary}\r\nContent-Type: video/mp4\r\nContent-Range: bytes {start}-{end}/{file_size}\r\n\r\n'.encode()
+        for start, end in spans
+    ] + [f'--{boundary}--\r\n'.encode()]
+    length = sum(len(p) for p in parts) + sum(end - start + 1 + 2 for start, end in spans)
+    return Response(read_spans(spans, parts), status=206, content_type=f'multipart/byteranges; boundary={boundary}',
+                    headers={**headers, 'Content-Length': str(length)})
+
+
+def _decrypt_to_temp(bucket, video, key):
+    """
+    Scheduler job: decrypt a video (inline blob, GridFS or file on disk) to a temp
+    .mp4. Returns the path, None if decryption failed; FileNotFoundError if the
+    encrypted data is nowhere.
+    """
     encrypted_data = video.get('video_data')
     if encrypted_data:
-        tmp_mp4 = decryption_mod.decrypt_blob_to_path(encrypted_data, key)
-        if not tmp_mp4 or not os.path.exists(tmp_mp4):
-            return jsonify({"error": "Decryption failed"}), 500
-
-        return send_range_from_file(tmp_mp4)
+        return decryption_mod.decrypt_blob_to_path(encrypted_data, key)
 
-    # GridFS
     gridfs_id = video.get('gridfs_id')
     if gridfs_id:
+        src = bucket.open_download_stream(ObjectId(gridfs_id))
+    else:
+        data_root = Path(__file__).resolve().parents[3] / 'data'
+        encrypted_path = data_root / 'encrypted' / (video.get('filename') or '')
+        if not video.get('filename') or not encrypted_path.exists():
+            raise FileNotFoundError(encrypted_path)
+        src = open(encrypted_path, 'rb')
+
+    tmpf = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    tmpf.close()
+    try:
+        ok = decryption_mod.decrypt_stream_to_path(src, tmpf.name, key)
+    finally:
         try:
-            bucket = GridFSBucket(db)
-            grid_out = bucket.open_download_stream(ObjectId(gridfs_id))
-
-            if range_header:
-                tmpf = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                tmpf.close()
-                ok = decryption_mod.decrypt_stream_to_path(grid_out, tmpf.name, key)
-                try:
-                    grid_out.close()
-                except Exception:
-                    pass
-                if not ok:
-                    try:
-                        os.remove(tmpf.name)
-                    except Exception:
-                        pass
-                    return jsonify({"error": "Decryption failed"}), 500
-
-                return send_range_from_file(tmpf.name)
-
-            def decrypted_gen():
-                try:
-                    for chunk in decryption_mod.decrypt_stream_generator(grid_out, key):
-                        yield chunk
-                finally:
-                    try:
-                        grid_out.close()
-                    except Exception:
-                        pass
+            src.close()
+        except Exception:
+            pass
+    if not ok:
+        try:
+            os.remove(tmpf.name)
+        except Exception:
+            pass
+        return None
+    return tmpf.name
 
-            return Response(decrypted_gen(), mimetype='video/mp4', headers={'Accept-Ranges': 'bytes'})
+
+def _remove_when_done(fut):
+    """A job the request gave up on still finishes; drop its output."""
+    try:
+        path = fut.result()
+    except Exception:
+        return
+    if path:
+        try:
+            os.remove(path)
         except Exception:
-            return jsonify({"error": "Decryption failed"}), 500
+            pass
+
+
+def _decrypted_response_for_video(db, video, range_header=None, priority=INTERACTIVE, headers=None):
+    """Helper: returns a Flask Response streaming the decrypted MP4 for the given video document.
+    Decryption runs on the shared DecryptScheduler (503 + Retry-After when its queue is full);
+    the plaintext temp file is then served whole or as the requested ranges.
+    """
+    key = _video_key()
 
-    # Disk fallback
+    scheduler = current_app.config['DECRYPT']
     try:
-        filename = video.get('filename')
-        data_root = Path(__file__).resolve().parents[3] / 'data'
-        encrypted_path = data_root / 'encrypted' / filename
-        if encrypted_path.exists():
-            fobj = open(encrypted_path, 'rb')
-
-            if range_header:
-                tmpf = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                tmpf.close()
-                ok = decryption_mod.decrypt_stream_to_path(fobj, tmpf.name, key)
-                try:
-                    fobj.close()
-                except Exception:
-                    pass
-                if not ok:
-                    try:
-                        os.remove(tmpf.name)
-                    except Exception:
-                        pass
-                    return jsonify({"error": "Decryption failed"}), 500
-
-                return send_range_from_file(tmpf.name)
-
-            def decrypted_file_gen():
-                try:
-                    for chunk in decryption_mod.decrypt_stream_generator(fobj, key):
-                        yield chunk
-                finally:
-                    try:
-                        fobj.close()
-                    except Exception:
-                        pass
+        fut = scheduler.submit(_decrypt_to_temp, _bucket(db), video, key, priority=priority)
+    except SchedulerBusy as e:
+        resp = jsonify({'error': 'Server busy decrypting other videos, retry shortly'})
+        resp.headers['Retry-After'] = str(e.retry_after)
+        return resp, 503
 
-            return Response(decrypted_file_gen(), mimetype='video/mp4', headers={'Accept-Ranges': 'bytes'})
-        else:
-            return jsonify({"error": "Video data not found"}), 404
+    try:
+        tmp_mp4 = fut.result(timeout=DECRYPT_TIMEOUT_S)
+    except FuturesTimeout:
+        if not fut.cancel():
+            fut.add_done_callback(_remove_when_done)
+        resp = jsonify({'error': 'Decryption timed out, retry shortly'})
+        resp.headers['Retry-After'] = str(scheduler.retry_after())
+        return resp, 503
+    except FileNotFoundError:
+        return jsonify({"error": "Video data not found"}), 404
     except Exception:
-        return jsonify({"error": "Video not found"}), 404
-    
-    
-@bp.route('/video/decrypted/<video_id>')
-@token_required
-def stream_decrypted(video_id):
-    db = current_app.config['DB']
-    video = db.videos.find_one({'_id': ObjectId(video_id)})
+        return jsonify({"error": "Decryption failed"}), 500
 
-    if not video:
-        return jsonify({"error": "Video not found"}), 404
+    if not tmp_mp4 or not os.path.exists(tmp_mp4):
+        return jsonify({"error": "Decryption failed"}), 500
+    return _send_plaintext(tmp_mp4, range_header, headers or {'Accept-Ranges': 'bytes'})
 
-    cam_id = video.get('camera_id')
-    user_payload = request.user
-    if user_payload.get('role') != 'admin' and cam_id not in user_payload.get('assigned_cameras', []):
-        return jsonify({"error": "Not authorized to view this camera's video"}), 403
 
-    key = decryption_mod.load_key()
+SEARCH_PAGE_SIZE = int(os.environ.get('EV_SEARCH_PAGE_SIZE', 100))
+SEARCH_MAX_PAGE_SIZE = 500
+SEARCH_COUNT_CAP = int(os.environ.get('EV_SEARCH_COUNT_CAP', 1000))
 
-    range_header = request.headers.get('Range', None)
+# Upper bound on one segment's capture length; bounds the capture_start range scan
+MAX_SEGMENT_SECONDS = int(os.environ.get('EV_MAX_SEGMENT_SECONDS', 600))
+IST_OFFSET = timedelta(hours=5, minutes=30)
 
-    def send_range_from_file(path):
-        file_size = os.path.getsize(path)
-        if not range_header:
-            def gen():
-                with open(path, 'rb') as f:
-                    try:
-                        while True:
-                            chunk = f.read(64 * 1024)
-                            if not chunk:
-                                break
-                            yield chunk
-                    finally:
-                        try:
-                            os.remove(path)
-                        except Exception:
-                            pass
-
-            return Response(gen(), status=200, mimetype='video/mp4', headers={
-                'Content-Length': str(file_size),
-                'Accept-Ranges': 'bytes'
-            })
+# Fuzzy plate search: newest candidates pulled from the plate_keys index, then ranked
+FUZZY_CANDIDATES = int(os.environ.get('EV_PLATE_FUZZY_CANDIDATES', 500))
+FUZZY_MAX_COST = float(os.environ.get('EV_PLATE_FUZZY_MAX_COST', 2.0))
 
-        # Parse range
-        try:
-            units, rng = range_header.split('=')
-            start_str, end_str = rng.split('-')
-            start = int(start_str) if start_str else 0
-            end = int(end_str) if end_str else file_size - 1
-        except Exception:
-            return jsonify({'error': 'Invalid Range header'}), 400
 
-        if start >= file_size:
-            return Response(status=416)
+def _fuzzy(request_args):
+    """Plate searches are fuzzy unless ?exact=1."""
+    return request_args.get('exact', '').lower() not in ('1', 'true', 'yes')
 
-        end = min(end, file_size - 1)
-        length = end - start + 1
 
-        def partial_gen():
-            with open(path, 'rb') as f:
-                f.seek(start)
-                remaining = length
-                try:
-                    while remaining > 0:
-                        chunk_size = min(64 * 1024, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-                finally:
-                    try:
-                        os.remove(path)
-                    except Exception:
-                        pass
+def _rank_fuzzy(plate, docs, field):
+    """Keep docs whose closest plate is within FUZZY_MAX_COST, cheapest first (stable, so newest first on ties)."""
+    ranked = []
+    for doc in docs:
+        value = doc.get(field)
+        cost, matched = rank_plates(plate, value if isinstance(value, list) else [value])
+        if cost <= FUZZY_MAX_COST:
+            ranked.append((cost, matched, doc))
+    ranked.sort(key=lambda r: r[0])
+    return ranked
 
-        headers = {
-            'Content-Range': f'bytes {start}-{end}/{file_size}',
-            'Accept-Ranges': 'bytes',
-            'Content-Length': str(length),
-        }
-        return Response(partial_gen(), status=206, mimetype='video/mp4', headers=headers)
 
-    # If encrypted blob stored directly on document (legacy), decrypt to temp file for range support
-    encrypted_data = video.get('video_data')
-    if encrypted_data:
-        tmp_mp4 = decryption_mod.decrypt_blob_to_path(encrypted_data, key)
-        if not tmp_mp4 or not os.path.exists(tmp_mp4):
-            return jsonify({"error": "Decryption failed"}), 500
+def _overlapping(utc_start, utc_end):
+    """
+    Segments whose capture interval overlaps [utc_start, utc_end). A segment starting
+    before utc_start - MAX_SEGMENT_SECONDS can't reach the window, so sorted by
+    capture_start this is one bounded scan of the (camera_id, capture_start, _id) index.
+    """
+    return {
+        'capture_start': {'$gte': utc_start - timedelta(seconds=MAX_SEGMENT_SECONDS), '$lt': utc_end},
+        'capture_end': {'$gt': utc_start},
+    }
 
-        return send_range_from_file(tmp_mp4)
 
-    # If stored in GridFS, for Range requests decrypt to temp file; otherwise stream decrypt on-the-fly
-    gridfs_id = video.get('gridfs_id')
-    if gridfs_id:
-        try:
-            bucket = GridFSBucket(db)
-            grid_out = bucket.open_download_stream(ObjectId(gridfs_id))
-
-            if range_header:
-                # decrypt whole stream to temp file then serve range
-                tmpf = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                tmpf.close()
-                ok = decryption_mod.decrypt_stream_to_path(grid_out, tmpf.name, key)
-                try:
-                    grid_out.close()
-                except Exception:
-                    pass
-                if not ok:
-                    try:
-                        os.remove(tmpf.name)
-                    except Exception:
-                        pass
-                    return jsonify({"error": "Decryption failed"}), 500
-
-                return send_range_from_file(tmpf.name)
-
-            # No Range header: stream decrypted bytes on-the-fly
-            def decrypted_gen():
-                try:
-                    for chunk in decryption_mod.decrypt_stream_generator(grid_out, key):
-                        yield chunk
-                finally:
-                    try:
-                        grid_out.close()
-                    except Exception:
-                        pass
+def _legacy_window(utc_start, utc_end):
+    """Docs uploaded before capture times were recorded: upload_date stands in (upload_date index)."""
+    return {'capture_start': {'$exists': False}, 'upload_date': {'$gte': utc_start, '$lt': utc_end}}
 
-            return Response(decrypted_gen(), mimetype='video/mp4', headers={'Accept-Ranges': 'bytes'})
-        except Exception:
-            return jsonify({"error": "Decryption failed"}), 500
 
-    # Fallback: encrypted file on disk
-    try:
-        filename = video.get('filename')
-        data_root = Path(__file__).resolve().parents[3] / 'data'
-        encrypted_path = data_root / 'encrypted' / filename
-        if encrypted_path.exists():
-            fobj = open(encrypted_path, 'rb')
-
-            if range_header:
-                tmpf = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                tmpf.close()
-                ok = decryption_mod.decrypt_stream_to_path(fobj, tmpf.name, key)
-                try:
-                    fobj.close()
-                except Exception:
-                    pass
-                if not ok:
-                    try:
-                        os.remove(tmpf.name)
-                    except Exception:
-                        pass
-                    return jsonify({"error": "Decryption failed"}), 500
-
-                return send_range_from_file(tmpf.name)
-
-            def decrypted_file_gen():
-                try:
-                    for chunk in decryption_mod.decrypt_stream_generator(fobj, key):
-                        yield chunk
-                finally:
-                    try:
-                        fobj.close()
-                    except Exception:
-                        pass
+def _search_phases(query, window):
+    """
+    (sort field, query) pairs paged one after the other, newest first within each:
+    with a window, segments by capture_start, then legacy docs by upload_date.
+    """
+    if not window:
+        return [('upload_date', query)]
+    return [
+        ('capture_start', {**query, **_overlapping(*window)}),
+        ('upload_date', {**query, **_legacy_window(*window)}),
+    ]
 
-            return Response(decrypted_file_gen(), mimetype='video/mp4', headers={'Accept-Ranges': 'bytes'})
-        else:
-            return jsonify({"error": "Video data not found"}), 404
-    except Exception:
-        return jsonify({"error": "Video not found"}), 404
 
-# In videos_routes.py - MODIFY the search_videos function
+def _fetch_phases(coll, phases, n, start=None, projection=None):
+    """Up to n (field, doc) rows, continuing after the cursor position start=(value, _id, field)."""
+    rows = []
+    for field, q in phases:
+        if start is not None:
+            if field != start[2]:
+                continue
+            q = {'$and': [q, _after_cursor(start[0], start[1], field)]}
+            start = None
+        docs = coll.find(q, projection).sort([(field, -1), ('_id', -1)]).limit(n - len(rows))
+        rows.extend((field, doc) for doc in docs)
+        if len(rows) >= n:
+            break
+    return rows
+
+
+def _ist(utc_time):
+    return (utc_time + IST_OFFSET).strftime('%Y-%m-%d %H:%M:%S') if utc_time else None
+
+
+def _encode_cursor(doc, field='upload_date'):
+    """Opaque continuation token: position of the last row in (field, _id) order."""
+    pos = {'d': doc[field].isoformat() if doc.get(field) else None, 'i': str(doc['_id']), 'f': field}
+    return base64.urlsafe_b64encode(json.dumps(pos, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    """(value, _id, field) of the row the token points at."""
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    pos = json.loads(raw)
+    return (datetime.fromisoformat(pos['d']) if pos['d'] else None), ObjectId(pos['i']), pos.get('f', 'upload_date')
+
+
+def _after_cursor(value, last_id, field='upload_date'):
+    """Rows strictly after the cursor in newest-first (field, _id) order."""
+    if value is None:
+        return {field: None, '_id': {'$lt': last_id}}
+    return {'$or': [
+        {field: {'$lt': value}},
+        {field: value, '_id': {'$lt': last_id}},
+    ]}
+
+
+def _page_limit():
+    return min(max(1, int(request.args.get('limit', SEARCH_PAGE_SIZE))), SEARCH_MAX_PAGE_SIZE)
+
+
+def _ist_window():
+    """(utc_start, utc_end) from the date/start_time/end_time args (IST), or None. Raises ValueError."""
+    date_str = request.args.get('date')
+    if not date_str:
+        return None
+    start_time_str = request.args.get('start_time')
+    end_time_str = request.args.get('end_time')
+    base_date = datetime.strptime(date_str, '%Y-%m-%d')
+    if start_time_str and end_time_str:
+        t_start = datetime.strptime(start_time_str, '%H:%M:%S').time()
+        t_end = datetime.strptime(end_time_str, '%H:%M:%S').time()
+        ist_start = datetime.combine(base_date, t_start)
+        ist_end = datetime.combine(base_date, t_end)
+    else:
+        ist_start = base_date
+        ist_end = ist_start + timedelta(days=1)
+    return ist_start - IST_OFFSET, ist_end - IST_OFFSET
+
 
 @bp.route('/search')
 @token_required
 def search_videos():
     plate = request.args.get('plate')
-    date_str = request.args.get('date')
     camera_id = request.args.get('camera_id')
-    start_time_str = request.args.get('start_time')
-    end_time_str = request.args.get('end_time')
+    cursor_token = request.args.get('cursor')
+
+    try:
+        limit = _page_limit()
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
 
     query = {}
+    window_start = None
+    fuzzy = bool(plate) and _fuzzy(request.args)
     
     # Build query only if filters provided
-    if plate:
-        query['plate_numbers'] = plate
+    if plate and fuzzy:
+        keys = lookup_filter(plate)
+        if keys is None:
+            return jsonify({'error': 'Plate search needs at least 3 characters'}), 400
+        query.update(keys)
+    elif plate:
+        query['plate_numbers'] = clean_text(plate)
     if camera_id:
         query['camera_id'] = camera_id
 
-    if date_str:
-        try:
-            from datetime import datetime, timedelta
-            base_date = datetime.strptime(date_str, '%Y-%m-%d')
-            if start_time_str and end_time_str:
-                t_start = datetime.strptime(start_time_str, '%H:%M:%S').time()
-                t_end = datetime.strptime(end_time_str, '%H:%M:%S').time()
-                ist_start = datetime.combine(base_date, t_start)
-                ist_end = datetime.combine(base_date, t_end)
-            else:
-                ist_start = base_date
-                ist_end = ist_start + timedelta(days=1)
-            utc_start = ist_start - timedelta(hours=5, minutes=30)
-            utc_end = ist_end - timedelta(hours=5, minutes=30)
-            query['upload_date'] = {'$gte': utc_start, '$lt': utc_end}
-        except ValueError:
-            return jsonify({'error': 'Invalid format. Use Date: YYYY-MM-DD, Time: HH:MM:SS'}), 400
-
-    db = current_app.config['DB']
-    
-    # Query count for logging
-    total_count = db.videos.count_documents({})
-    filtered_count = db.videos.count_documents(query) if query else total_count
-    
-    print(f"[SEARCH] Total videos: {total_count}, Filtered: {filtered_count}, Query: {query}")
+    try:
+        window = _ist_window()
+    except ValueError:
+        return jsonify({'error': 'Invalid format. Use Date: YYYY-MM-DD, Time: HH:MM:SS'}), 400
+    if window:
+        window_start = window[0]
+    phases = _search_phases(query, window)
+
+    db = _search_db()
     
-    # Exclude video_data from results + sort by newest first + limit to 100
-    cursor = db.videos.find(query, {'video_data': 0}).sort('upload_date', -1).limit(100)
+    # Counts for logging/UI: collection metadata for the total, a capped count for
+    # the filter (exact below SEARCH_COUNT_CAP), and only on the first page
+    total_count = filtered_count = None
+    capped = False
+    if not cursor_token:
+        total_count = db.videos.estimated_document_count()
+        if fuzzy:
+            pass  # counted after ranking
+        elif query or window:
+            filtered_count = min(SEARCH_COUNT_CAP, sum(
+                db.videos.count_documents(q, limit=SEARCH_COUNT_CAP) for _, q in phases))
+            capped = filtered_count >= SEARCH_COUNT_CAP
+        else:
+            filtered_count = total_count
+        print(f"[SEARCH] Total videos: ~{total_count}, Filtered: {filtered_count}, Query: {[q for _, q in phases]}")
+
+    start = None
+    if cursor_token and not fuzzy:
+        try:
+            start = _decode_cursor(cursor_token)
+        except Exception:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if start[2] not in [field for field, _ in phases]:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    # Exclude video_data from results + newest first; (field, _id) keeps the order total
+    projection = {'video_data': 0}
+    truncated = False
+    if fuzzy:
+        # one ranked page: closest plates first, no continuation; truncated says
+        # matches were left out (past the page, or older than the candidate pool)
+        candidates = [doc for _, doc in _fetch_phases(db.videos, phases, FUZZY_CANDIDATES, projection=projection)]
+        ranked = _rank_fuzzy(plate, candidates, 'plate_numbers')
+        filtered_count, capped = len(ranked), len(candidates) >= FUZZY_CANDIDATES
+        truncated = capped or len(ranked) > limit
+        print(f"[SEARCH] fuzzy plate={plate!r}: {len(candidates)} candidates, {len(ranked)} within cost {FUZZY_MAX_COST}")
+        matches = {id(doc): (cost, matched) for cost, matched, doc in ranked}
+        videos = [doc for _, _, doc in ranked[:limit]]
+        next_token = None
+    else:
+        rows = _fetch_phases(db.videos, phases, limit + 1, start, projection)
+        next_token = _encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        videos = [doc for _, doc in rows[:limit]]
     
     results = []
-    from datetime import timedelta
-    for video in cursor:
-        utc_time = video.get('upload_date')
-        if utc_time:
-            ist_time = utc_time + timedelta(hours=5, minutes=30)
-            upload_str = ist_time.strftime('%Y-%m-%d %H:%M:%S')
-        else:
-            upload_str = 'Unknown'
+    for video in videos:
+        capture_start = video.get('capture_start')
+        # where in this segment the requested window begins (0 if it starts inside the window)
+        seek = None
+        if capture_start and window_start:
+            seek = max(0.0, (window_start - capture_start).total_seconds())
             
         results.append({
             'video_id': str(video['_id']),
             'filename': video.get('filename', 'Unknown'),
             'camera_id': video.get('camera_id', 'Unknown'),
-            'upload_date_ist': upload_str,
+            'upload_date_ist': _ist(video.get('upload_date')) or 'Unknown',
+            'capture_start_ist': _ist(capture_start),
+            'capture_end_ist': _ist(video.get('capture_end')),
+            'seek_offset_s': seek,
             'plates_found': video.get('plate_numbers', []),
             'file_size': video.get('file_size', 0)
         })
+        if fuzzy:
+            cost, matched = matches[id(video)]
+            results[-1].update(matched_plate=matched, match_cost=cost)
     
     return jsonify({
         'total': total_count,
         'filtered': filtered_count,
-        'results': results
+        'filtered_capped': capped,
+        'results': results,
+        'next_cursor': next_token,
+        'truncated': truncated,
     }), 200
 
+@bp.route('/sightings')
+@token_required
+def search_sightings():
+    """
+    Individual plate sightings, newest first, each with the video to open and the
+    second to seek to. Same date/time/camera args and cursor paging as /search.
+    """
+    plate = request.args.get('plate')
+    camera_id = request.args.get('camera_id')
+    cursor_token = request.args.get('cursor')
+    if not plate and not camera_id:
+        return jsonify({'error': 'plate or camera_id is required'}), 400
+
+    try:
+        limit = _page_limit()
+        window = _ist_window()
+    except ValueError:
+        return jsonify({'error': 'Invalid format. Use Date: YYYY-MM-DD, Time: HH:MM:SS, limit: integer'}), 400
+
+    query = {}
+    fuzzy = bool(plate) and _fuzzy(request.args)
+    if plate and fuzzy:
+        keys = lookup_filter(plate)
+        if keys is None:
+            return jsonify({'error': 'Plate search needs at least 3 characters'}), 400
+        query.update(keys)
+    elif plate:
+        query['plate'] = clean_text(plate)
+    if camera_id:
+        query['camera_id'] = camera_id
+    user_payload = request.user
+    if user_payload.get('role') != 'admin':
+        allowed = user_payload.get('assigned_cameras', [])
+        if camera_id and camera_id not in allowed:
+            return jsonify({"error": "Not authorized to view this camera's video"}), 403
+        query.setdefault('camera_id', {'$in': allowed})
+    if window:
+        query['ts'] = {'$gte': window[0], '$lt': window[1]}
+    if cursor_token and not fuzzy:
+        try:
+            value, last_id, _ = _decode_cursor(cursor_token)
+        except Exception:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = {'$and': [query, _after_cursor(value, last_id, field='ts')]}
+
+    db = _search_db()
+    cursor = db.plate_sightings.find(query).sort([('ts', -1), ('_id', -1)])
+    costs = {}
+    truncated = False
+    if fuzzy:
+        # one ranked page: closest plates first, no continuation (see /search)
+        candidates = list(cursor.limit(FUZZY_CANDIDATES))
+        ranked = _rank_fuzzy(plate, candidates, 'plate')
+        truncated = len(candidates) >= FUZZY_CANDIDATES or len(ranked) > limit
+        ranked = ranked[:limit]
+        costs = {r['_id']: cost for cost, _, r in ranked}
+        rows = [r for _, _, r in ranked]
+        next_token = None
+    else:
+        rows = list(cursor.limit(limit + 1))
+        next_token = _encode_cursor(rows[limit - 1], field='ts') if len(rows) > limit else None
+        rows = rows[:limit]
+
+    # one lookup for the page: the videos these sightings point into (by id, or by
+    # segment when the sighting was written before the upload)
+    ids = {r['video_id'] for r in rows if r.get('video_id')}
+    segments = {r['segment'] for r in rows if not r.get('video_id') and r.get('segment')}
+    clauses = ([{'_id': {'$in': list(ids)}}] if ids else []) + ([{'segment': {'$in': list(segments)}}] if segments else [])
+    videos_by_id, videos_by_segment = {}, {}
+    if clauses:
+        for v in db.videos.find({'$or': clauses}, {'segment': 1, 'capture_start': 1, 'fps': 1}):
+            videos_by_id[v['_id']] = v
+            if v.get('segment'):
+                videos_by_segment[v['segment']] = v
+
+    results = []
+    for r in rows:
+        video = videos_by_id.get(r.get('video_id')) or videos_by_segment.get(r.get('segment'))
+        seek = None
+        if video and video.get('capture_start'):
+            seek = max(0.0, (r['ts'] - video['capture_start']).total_seconds())
+        elif video and r.get('frame') is not None:
+            seek = r['frame'] / float(video.get('fps') or 20)
+        results.append({
+            'plate': r.get('plate'),
+            'camera_id': r.get('camera_id'),
+            'seen_at_ist': _ist(r.get('ts')),
+            'video_id': str(video['_id']) if video else None,
+            'seek_offset_s': round(seek, 2) if seek is not None else None,
+            'frame': r.get('frame'),
+            'confidence': r.get('conf'),
+        })
+        if fuzzy:
+            results[-1]['match_cost'] = costs[r['_id']]
+
+    return jsonify({'results': results, 'next_cursor': next_token, 'truncated': truncated}), 200
+
+
+# Bulk plate writes (detection pipelines, re-analysis, manual fixes)
+PLATE_BULK_MAX_ITEMS = int(os.environ.get('EV_PLATE_BULK_MAX_ITEMS', 1000))
+PLATE_WRITER_ROLES = ('uploader', 'admin')
+
+
+def _parse_ts(value):
+    """Sighting time: epoch seconds or ISO-8601 (UTC); None when missing."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    return ts.replace(tzinfo=None) - (ts.utcoffset() or timedelta(0))
+
+
+def _apply_plate_batch(db, items, user_payload):
+    """
+    Apply [{video_id | segment, plates, sightings?, camera_id?}, ...] in one pass:
+    one find for the referenced videos (and pending segments), one unordered
+    bulk_write each for videos and segment_plates, one insert_many of sightings.
+    Returns a result per item, in order; a failed write marks only its own item.
+
+    An item naming a segment that is not uploaded yet goes to segment_plates;
+    the uploader merges it into the video when it arrives. A pending segment
+    keeps the camera it was first recorded with, and that camera is the one
+    checked against the caller's.
+    """
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+    from src.detection.plate_text import plate_keys
+
+    is_admin = user_payload.get('role') == 'admin'
+    allowed = set(user_payload.get('assigned_cameras', []))
+    results = [None] * len(items)
+    parsed = []  # (index, video_id or None, segment or None, plates, sightings, camera_id)
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {'index': i, 'status': 'invalid', 'error': 'Item must be an object'}
+            continue
+        plates = item.get('plates', item.get('plate_numbers')) or []
+        if isinstance(plates, str):
+            plates = [plates]
+        plates = sorted({clean_text(p) for p in plates if isinstance(p, str)} - {''})
+        try:
+            video_id = ObjectId(item['video_id']) if item.get('video_id') else None
+            sightings = [
+                {**s, 'plate': clean_text(s.get('plate')), 'ts': _parse_ts(s.get('ts'))}
+                for s in item.get('sightings') or []
+            ]
+        except Exception:
+            results[i] = {'index': i, 'status': 'invalid', 'error': 'Bad video_id or sighting'}
+            continue
+        if video_id is None and not item.get('segment'):
+            results[i] = {'index': i, 'status': 'invalid', 'error': 'video_id or segment is required'}
+            continue
+        if any(not s['plate'] or s['ts'] is None for s in sightings):
+            results[i] = {'index': i, 'status': 'invalid', 'error': 'Every sighting needs plate and ts'}
+            continue
+        plates = sorted(set(plates) | {s['plate'] for s in sightings})
+        if not plates:
+            results[i] = {'index': i, 'status': 'invalid', 'error': 'No plate number provided'}
+            continue
+        parsed.append((i, video_id, item.get('segment'), plates, sightings, item.get('camera_id')))
+
+    # the videos this batch touches, in one query
+    ids = [p[1] for p in parsed if p[1] is not None]
+    segments = [p[2] for p in parsed if p[1] is None]
+    clauses = ([{'_id': {'$in': ids}}] if ids else []) + ([{'segment': {'$in': segments}}] if segments else [])
+    by_id, by_segment = {}, {}
+    if clauses:
+        for v in db.videos.find({'$or': clauses}, {'camera_id': 1, 'segment': 1}):
+            by_id[v['_id']] = v
+            if v.get('segment'):
+                by_segment[v['segment']] = v
+
+    # segments not uploaded yet that detection (or an earlier batch) already recorded
+    pending = [s for s in segments if s not in by_segment]
+    pending_cams = {}
+    if pending:
+        for d in db.segment_plates.find({'segment': {'$in': pending}}, {'segment': 1, 'camera_id': 1}):
+            pending_cams[d['segment']] = d.get('camera_id')
+
+    ops, op_items, segment_ops, segment_items = [], [], [], []
+    sighting_docs, sighting_items = [], []
+    now = datetime.utcnow()
+    for i, video_id, segment, plates, sightings, camera_id in parsed:
+        video = by_id.get(video_id) if video_id is not None else by_segment.get(segment)
+        if video is None and video_id is not None:
+            results[i] = {'index': i, 'status': 'not_found', 'error': 'Video not found'}
+            continue
+        if video is not None:
+            cam = video.get('camera_id')
+        elif segment in pending_cams:
+            cam = pending_cams[segment]
+        else:
+            cam = camera_id
+        if not is_admin and cam not in allowed:
+            results[i] = {'index': i, 'status': 'forbidden', 'error': "Not authorized for this camera's video"}
+            continue
+
+        update = {'$addToSet': {'plate_numbers': {'$each': plates}, 'plate_keys': {'$each': plate_keys(plates)}}}
+        if video is not None:
+            ops.append(UpdateOne({'_id': video['_id']}, update))
+            op_items.append(i)
+            results[i] = {'index': i, 'status': 'ok', 'video_id': str(video['_id']), 'plates': len(plates)}
+        else:
+            update['$addToSet'].pop('plate_keys')
+            update['$set'] = {'detected_at': now}
+            # camera in the filter: a new doc gets it, an existing one is never moved to another camera
+            segment_ops.append(UpdateOne({'segment': segment, 'camera_id': cam}, update, upsert=True))
+            segment_items.append(i)
+            pending_cams[segment] = cam
+            results[i] = {'index': i, 'status': 'pending', 'segment': segment, 'plates': len(plates)}
+
+        for s in sightings:
+            sighting_items.append(i)
+            sighting_docs.append({
+                'plate': s['plate'],
+                'plate_keys': plate_keys([s['plate']]),
+                'camera_id': cam,
+                'ts': s['ts'],
+                'segment': (video or {}).get('segment', segment),
+                'video_id': video['_id'] if video else None,
+                'frame': s.get('frame'),
+                'conf': s.get('conf'),
+                'track_id': s.get('track_id'),
+            })
+        if sightings:
+            results[i]['sightings'] = len(sightings)
+
+    def failures(write, items):
+        """Run one unordered batch; (item index, message) for each of its writeErrors."""
+        if not items:
+            return []
+        try:
+            write()
+        except BulkWriteError as e:
+            return [(items[err['index']], err.get('errmsg', 'Write failed')) for err in e.details.get('writeErrors', [])]
+        return []
+
+    for i, msg in (failures(lambda: db.videos.bulk_write(ops, ordered=False), op_items)
+                   + failures(lambda: db.segment_plates.bulk_write(segment_ops, ordered=False), segment_items)):
+        results[i] = {'index': i, 'status': 'error', 'error': msg}
+    for i, msg in failures(lambda: db.plate_sightings.insert_many(sighting_docs, ordered=False), sighting_items):
+        if results[i]['status'] != 'error':
+            # plates went in; some of the item's sightings did not
+            results[i].update(status='error', error=f'Sighting write failed: {msg}')
+        results[i]['sightings_failed'] = results[i].get('sightings_failed', 0) + 1
+
+    return results
+
+
+def _plate_writer(user_payload):
+    return user_payload.get('role') in PLATE_WRITER_ROLES
+
+
+@bp.route('/plates/bulk', methods=['POST'])
+@token_required
+def bulk_update_plates():
+    """
+    Add plates (and optionally sightings) to many videos at once.
+
+    Body: {"items": [{"video_id" | "segment", "plates": [...], "camera_id"?,
+    "sightings"?: [{"plate", "ts", "frame"?, "conf"?, "track_id"?}]}]}.
+    Items are independent: each gets its own status in "results".
+    """
+    if not _plate_writer(request.user):
+        return jsonify({'error': 'No permission to update metadata'}), 403
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > PLATE_BULK_MAX_ITEMS:
+        return jsonify({'error': f'At most {PLATE_BULK_MAX_ITEMS} items per request'}), 413
+
+    results = _apply_plate_batch(current_app.config['DB'], items, request.user)
+    applied = sum(1 for r in results if r['status'] in ('ok', 'pending'))
+    return jsonify({'applied': applied, 'failed': len(results) - applied, 'results': results}), 200
+
+
+@bp.route('/video/<video_id>/plates', methods=['POST'])
 @token_required
 def update_plate(video_id):
-    payload = request.user
-    db = current_app.config['DB']
-    user = db.users.find_one({'username': payload.get('username')})
-    
-    if not user or user.get('role') not in ['uploader', 'admin']:
+    if not _plate_writer(request.user):
         return jsonify({'error': 'No permission to update metadata'}), 403
-    
-    data = request.get_json() or {}
-    plate_numbers = data.get('plate_numbers')
-    if not plate_numbers:
-        return jsonify({'error': 'No plate number provided'}), 400
-    
-    result = db.videos.update_one(
-        {'_id': ObjectId(video_id)}, 
-        {'$push': {'plate_numbers': plate_numbers}}
-    )
-    
-    if result.matched_count == 0:
+
+    data = request.get_json(silent=True) or {}
+    item = {'video_id': video_id, 'plates': data.get('plate_numbers'), 'sightings': data.get('sightings')}
+    result = _apply_plate_batch(current_app.config['DB'], [item], request.user)[0]
+
+    if result['status'] == 'invalid':
+        return jsonify({'error': result['error']}), 400
+    if result['status'] == 'not_found':
         return jsonify({'error': 'Video not found'}), 404
-    
-    return jsonify({'message': 'Plate added to metadata'}), 200
\ No newline at end of file
+    if result['status'] == 'forbidden':
+        return jsonify({'error': result['error']}), 403
+    if result['status'] == 'error':
+        return jsonify({'error': result['error']}), 500
+    return jsonify({'message': 'Plate added to metadata'}), 200
@@ -0,0 +1,13 @@
+# conftest.py (run the suite from anywhere: `src` resolves to Backend/src)
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+# a case-sensitive checkout splits Backend/ and backend/ (one directory on Windows/macOS)
+OTHER = os.path.join(os.path.dirname(BACKEND), "backend")
+if os.path.isdir(OTHER) and not os.path.samefile(OTHER, BACKEND):
+    import src.encryption
+    src.encryption.__path__.append(os.path.join(OTHER, "src", "encryption"))
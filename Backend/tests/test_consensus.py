@@ -0,0 +1,60 @@
+# test_consensus.py (top-K crops per track and the multi-read plate vote)
+import pytest
+
+from src.detection.consensus import TopKCrops, read_track
+
+
+def reader(reads):
+    """read_fn stand-in: crops are keys into `reads`; records what was read."""
+    seen = []
+
+    def read_fn(crop, min_len=6):
+        seen.append(crop)
+        text, conf = reads[crop]
+        return text, conf, "otsu", 1.0
+
+    read_fn.seen = seen
+    return read_fn
+
+
+def test_top_k_keeps_the_best_crops():
+    top = TopKCrops(k=2)
+    for score, crop in ((0.2, "a"), (0.9, "b"), (0.5, "c"), (0.1, "d")):
+        top.add(7, score, crop, ts=score)
+    assert 7 in top and len(top) == 1
+    assert [(s, c) for s, c, _, _ in top.pop(7)] == [(0.9, "b"), (0.5, "c")]
+    assert 7 not in top and top.pop(7) == []
+
+
+def test_top_k_iterates_over_a_copy():
+    top = TopKCrops(k=1)
+    top.add(1, 0.5, "a", ts=0)
+    top.add(2, 0.5, "b", ts=0)
+    for tid in top:
+        top.pop(tid)
+    assert len(top) == 0
+
+
+def test_confident_first_read_stops():
+    fn = reader({"a": ("MH12AB1234", 0.95), "b": ("MH12AB1284", 0.9)})
+    assert read_track(["a", "b"], read_fn=fn) == ("MH12AB1234", 0.95, 1)
+    assert fn.seen == ["a"]
+
+
+def test_stops_once_the_leader_holds():
+    fn = reader({"a": ("MH12AB1234", 0.6), "b": ("MH12AB1284", 0.5), "c": ("MH12AB1284", 0.5)})
+    text, _, used = read_track(["a", "b", "c"], read_fn=fn)
+    assert (text, used) == ("MH12AB1234", 2)
+
+
+def test_characters_are_voted():
+    fn = reader({"a": ("MH12AB1234", 0.6), "b": ("MH12AB1284", 0.5), "c": ("MH12AB1284", 0.5)})
+    text, conf, used = read_track(["a", "b", "c"], patience=3, read_fn=fn)
+    assert (text, used) == ("MH12AB1284", 3)
+    assert conf == pytest.approx((9 * 1.6 + 1.0) / 10 / 3)
+
+
+def test_short_or_empty_reads_give_nothing():
+    fn = reader({"a": ("", 0.0), "b": ("AB12", 0.8)})
+    assert read_track(["a", "b"], read_fn=fn) == ("", 0.0, 2)
+    assert read_track([], read_fn=fn) == ("", 0.0, 0)
@@ -0,0 +1,94 @@
+# test_crop_store.py (pack + index round trip, rollover, several writers)
+import numpy as np
+
+from src.detection.crop_store import CropStoreWriter, CropStoreReader, INDEX_DTYPE, INDEX_NAME
+
+
+def test_round_trip(tmp_path):
+    blobs = [bytes([i]) * (10 + i) for i in range(5)]
+    with CropStoreWriter(str(tmp_path), camera_id="cam_01") as w:
+        offsets = [w.append(b, track=i, ts=100.0 + i) for i, b in enumerate(blobs)]
+    assert offsets == [0, 10, 21, 33, 46]
+
+    with CropStoreReader(str(tmp_path)) as r:
+        assert len(r) == 5
+        recs = list(r)
+        assert [bytes(rec.data) for rec in recs] == blobs
+        assert [rec.track for rec in recs] == list(range(5))
+        assert recs[2].camera == "cam_01" and recs[2].ts == 102.0
+        assert list(r.select(since=101.0, until=103.0)) == [1, 2]
+        assert [rec.track for rec in r.iter_records(track=4)] == [4]
+
+
+def test_rollover_and_resume(tmp_path):
+    with CropStoreWriter(str(tmp_path), max_pack_bytes=25) as w:
+        for i in range(3):
+            w.append(b"x" * 10, track=i, ts=i)
+    with CropStoreWriter(str(tmp_path), max_pack_bytes=25) as w:
+        assert w.pack_id == 1
+        w.append(b"y" * 10, track=3, ts=3)
+
+    with CropStoreReader(str(tmp_path)) as r:
+        assert list(r.index["pack"]) == [0, 0, 1, 1]
+        assert list(r.index["offset"]) == [0, 10, 0, 10]
+        assert bytes(r.get(3).data) == b"y" * 10
+
+
+def test_writers_share_a_store(tmp_path):
+    a = CropStoreWriter(str(tmp_path), camera_id="a", max_pack_bytes=35)
+    b = CropStoreWriter(str(tmp_path), camera_id="b", max_pack_bytes=35)
+    for i in range(6):
+        (a if i % 2 == 0 else b).append(bytes([65 + i]) * 10, track=i, ts=i)
+    a.close()
+    b.close()
+
+    with CropStoreReader(str(tmp_path)) as r:
+        assert [bytes(rec.data) for rec in r] == [bytes([65 + i]) * 10 for i in range(6)]
+        assert [rec.camera for rec in r] == ["a", "b"] * 3
+
+
+def test_torn_record_and_refresh(tmp_path):
+    with CropStoreWriter(str(tmp_path)) as w:
+        w.append(b"first", track=1, ts=1.0)
+    with open(tmp_path / INDEX_NAME, "ab") as fh:
+        fh.write(b"\0" * (INDEX_DTYPE.itemsize // 2))
+
+    r = CropStoreReader(str(tmp_path))
+    assert len(r) == 1
+    assert bytes(r.get(0).data) == b"first"
+    assert list(r.refresh()) == []
+    r.close()
+
+    with CropStoreWriter(str(tmp_path)) as w:
+        w.append(b"second", track=2, ts=2.0)
+    with CropStoreReader(str(tmp_path)) as r:
+        assert [bytes(rec.data) for rec in r] == [b"first", b"second"]
+
+
+def test_refresh_picks_up_appends(tmp_path):
+    w = CropStoreWriter(str(tmp_path))
+    w.append(b"one", track=1, ts=1.0)
+    r = CropStoreReader(str(tmp_path))
+    assert bytes(r.get(0).data) == b"one"
+
+    w.append(b"two", track=2, ts=2.0)
+    w.append(b"three", track=3, ts=3.0)
+    assert list(r.refresh()) == [1, 2]
+    assert [bytes(rec.data) for rec in r] == [b"one", b"two", b"three"]
+    assert np.array_equal(r.select(track=3), [2])
+    w.close()
+    r.close()
+
+
+def test_refresh_grows_without_rereading(tmp_path):
+    w = CropStoreWriter(str(tmp_path))
+    r = CropStoreReader(str(tmp_path))
+    assert len(r) == 0
+    for i in range(50):
+        w.append(str(i).encode(), track=i, ts=float(i))
+        assert list(r.refresh()) == [i]
+    assert len(r) == 50
+    assert [int(t) for t in r.index["track"]] == list(range(50))
+    assert bytes(r.get(42).data) == b"42"
+    w.close()
+    r.close()
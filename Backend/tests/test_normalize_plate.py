@@ -0,0 +1,35 @@
+# test_normalize_plate.py (cheapest plate reading: confusion and trim costs)
+import math
+
+from src.detection.ocr_plates import (
+    CONFUSION_COST, TRIM_COST, INDIA_STATE_CODES, normalize_plate, fix_india_plate,
+)
+
+
+def test_exact_plates_cost_nothing():
+    assert normalize_plate("MH12AB1234") == ("MH12AB1234", 0.0)
+    assert normalize_plate("DL1CA6957") == ("DL1CA6957", 0.0)
+    assert normalize_plate("mh-12 ab 1234") == ("MH12AB1234", 0.0)
+
+
+def test_confusions_and_trims_are_priced():
+    assert normalize_plate("MHI2AB1234") == ("MH12AB1234", CONFUSION_COST)
+    assert normalize_plate("0L1CA6957") == ("OL1CA6957", CONFUSION_COST)
+    assert normalize_plate("XMH12AB1234Y") == ("MH12AB1234", 2 * TRIM_COST)
+    assert normalize_plate("DL01AB123456") == ("DL01AB1234", 2 * TRIM_COST)
+
+
+def test_unreadable_text_costs_inf():
+    assert normalize_plate("MH12AB12") == ("MH12AB12", math.inf)
+    assert normalize_plate("HELLO") == ("HELLO", math.inf)
+
+
+def test_state_codes():
+    assert normalize_plate("ZZ12AB1234") == ("ZZ12AB1234", 0.0)
+    assert normalize_plate("ZZ12AB1234", INDIA_STATE_CODES)[1] == math.inf
+    assert normalize_plate("0L1CA6957", INDIA_STATE_CODES)[1] == math.inf
+    assert normalize_plate("MHI2AB1234", INDIA_STATE_CODES) == ("MH12AB1234", CONFUSION_COST)
+
+
+def test_fix_india_plate_takes_the_cheapest_reading():
+    assert fix_india_plate("IND MH12AB1234") == "MH12AB1234"
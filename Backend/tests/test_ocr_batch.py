@@ -0,0 +1,33 @@
+# test_ocr_batch.py (batched OCR reads the same pixels, and scores the same, as read_plate)
+import zlib
+
+import numpy as np
+
+from src.detection import ocr_plates
+
+READS = ["MH12AB1234", "DL1CA6957", "MHI2AB1234", "KA0", ""]
+
+
+class FakeReader:
+    """Stands in for easyocr.Reader: the read is a function of the exact pixels it gets."""
+
+    def readtext(self, img, **kw):
+        h = zlib.crc32(np.ascontiguousarray(img).tobytes()) ^ zlib.crc32(repr(img.shape).encode())
+        text = READS[h % len(READS)]
+        box = [[0, 0], [10, 0], [10, 10], [0, 10]]
+        return [(box, text, (h >> 8) % 100 / 100.0)] if text else []
+
+    def readtext_batched(self, images, batch_size=1, **kw):
+        assert len({img.shape for img in images}) == 1
+        return [self.readtext(img) for img in images]
+
+
+def test_batched_reads_match_per_crop_reads(monkeypatch):
+    monkeypatch.setattr(ocr_plates, "get_ocr_reader", lambda: FakeReader())
+    rng = np.random.default_rng(0)
+    sizes = [(30, 120), (44, 150), (30, 120), (60, 200), (25, 90), (44, 151)]
+    crops = [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for h, w in sizes]
+
+    single = [ocr_plates.read_plate(c) for c in crops]
+    assert ocr_plates.read_plates_batch(crops, batch_size=5) == single
+    assert any(text for text, *_ in single)
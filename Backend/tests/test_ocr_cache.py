@@ -0,0 +1,32 @@
+# test_ocr_cache.py (exact-by-default lookups, per-mode persistence)
+from src.detection.ocr_cache import OcrCache
+
+READ = ("DL01AB1234", 0.9, "otsu", 120.0)
+
+
+def test_exact_by_default():
+    cache = OcrCache(path="")
+    cache.put(0b1011, READ)
+    assert cache.get(0b1011) == READ
+    assert cache.get(0b1010) is None
+
+    near = OcrCache(path="", max_distance=3)
+    near.put(0b1011, READ)
+    assert near.get(0b1010) == READ
+    assert near.get(0b0100) is None
+
+
+def test_modes_are_kept_apart(tmp_path):
+    path = str(tmp_path / "cache.json")
+    a = OcrCache(path, mode="all,min_len=6")
+    a.put(1, READ)
+    a.save()
+
+    b = OcrCache(path, mode="cascade@0.6,min_len=6")
+    assert b.get(1) is None
+    b.put(2, ("MH12XY0001", 0.8, "clahe", 90.0))
+    b.save()
+
+    a = OcrCache(path, mode="all,min_len=6")
+    assert a.get(1) == READ and a.get(2) is None
+    assert OcrCache(path, mode="cascade@0.6,min_len=6").get(2)[0] == "MH12XY0001"
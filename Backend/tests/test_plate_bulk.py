@@ -0,0 +1,130 @@
+# test_plate_bulk.py (_apply_plate_batch: per-item statuses, batched writes, write-error mapping)
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from src.server.videos_routes import _apply_plate_batch
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if key == '$or':
+            if not any(_matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict) and '$in' in cond:
+            if doc.get(key) not in cond['$in']:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Just enough of a collection for _apply_plate_batch; fail={index: errmsg} fails those writes."""
+
+    def __init__(self, name, docs=()):
+        self.name = name
+        self.docs = list(docs)
+        self.calls = []
+        self.fail = {}
+
+    def find(self, query, projection=None):
+        return [d for d in self.docs if _matches(d, query)]
+
+    def _run(self, kind, items):
+        self.calls.append((kind, list(items)))
+        if self.fail:
+            raise BulkWriteError({'writeErrors': [{'index': i, 'code': 11000, 'errmsg': m} for i, m in self.fail.items()]})
+
+    def bulk_write(self, ops, ordered=True):
+        self._run('bulk_write', ops)
+
+    def insert_many(self, docs, ordered=True):
+        self._run('insert_many', docs)
+
+    def update_one(self, *a, **kw):
+        raise AssertionError('writes must be batched')
+
+
+class FakeDb:
+    def __init__(self, videos=(), pending=()):
+        self.videos = FakeCollection('videos', videos)
+        self.segment_plates = FakeCollection('segment_plates', pending)
+        self.plate_sightings = FakeCollection('plate_sightings')
+
+
+V1, V2 = ObjectId(), ObjectId()
+UPLOADER = {'role': 'uploader', 'assigned_cameras': ['cam_a']}
+ADMIN = {'role': 'admin'}
+
+
+@pytest.fixture
+def db():
+    return FakeDb(
+        videos=[{'_id': V1, 'camera_id': 'cam_a', 'segment': 'seg1'}, {'_id': V2, 'camera_id': 'cam_b', 'segment': 'seg2'}],
+        pending=[{'segment': 'seg_b', 'camera_id': 'cam_b'}],
+    )
+
+
+def test_statuses_in_item_order(db):
+    items = [
+        {'video_id': str(V1), 'plates': ['dl 01 ab 1234', 'DL01AB1234']},
+        'not an object',
+        {'video_id': 'nope', 'plates': ['X']},
+        {'video_id': str(ObjectId()), 'plates': ['MH12XY0001']},
+        {'video_id': str(V2), 'plates': ['MH12XY0001']},
+        {'segment': 'seg_new', 'camera_id': 'cam_a', 'plates': ['KA01ZZ0001']},
+        {'segment': 'seg1', 'plates': []},
+    ]
+    results = _apply_plate_batch(db, items, UPLOADER)
+    assert [r['status'] for r in results] == ['ok', 'invalid', 'invalid', 'not_found', 'forbidden', 'pending', 'invalid']
+    assert [r['index'] for r in results] == list(range(len(items)))
+    assert results[0]['plates'] == 1
+
+    # one batch per collection, no per-item writes
+    assert [k for k, _ in db.videos.calls] == ['bulk_write']
+    assert [k for k, _ in db.segment_plates.calls] == ['bulk_write']
+    assert len(db.segment_plates.calls[0][1]) == 1
+
+
+def test_pending_segment_keeps_its_camera(db):
+    items = [
+        # uploader names an allowed camera for a segment recorded by cam_b
+        {'segment': 'seg_b', 'camera_id': 'cam_a', 'plates': ['DL01AB1234']},
+        {'segment': 'seg_a', 'camera_id': 'cam_a', 'plates': ['DL01AB1234']},
+    ]
+    results = _apply_plate_batch(db, items, UPLOADER)
+    assert [r['status'] for r in results] == ['forbidden', 'pending']
+    op = db.segment_plates.calls[0][1][0]
+    assert op._filter == {'segment': 'seg_a', 'camera_id': 'cam_a'}
+    assert 'camera_id' not in op._doc['$set']
+
+    results = _apply_plate_batch(db, [{'segment': 'seg_b', 'camera_id': 'cam_x', 'plates': ['DL01AB1234']}], ADMIN)
+    assert results[0]['status'] == 'pending'
+    assert db.segment_plates.calls[-1][1][0]._filter == {'segment': 'seg_b', 'camera_id': 'cam_b'}
+
+
+def test_write_errors_map_back_to_items(db):
+    db.videos.fail = {1: 'boom'}
+    db.plate_sightings.fail = {0: 'dup'}
+    ts = datetime(2024, 5, 1).isoformat()
+    items = [
+        {'segment': 'seg1', 'plates': ['DL01AB1234'], 'sightings': [{'plate': 'DL01AB1234', 'ts': ts}]},
+        {'video_id': str(V1), 'plates': ['MH12XY0001']},
+        {'segment': 'seg_new', 'camera_id': 'cam_a', 'plates': ['KA01ZZ0001']},
+    ]
+    results = _apply_plate_batch(db, items, UPLOADER)
+    assert [r['status'] for r in results] == ['error', 'error', 'pending']
+    assert results[0]['sightings_failed'] == 1 and 'dup' in results[0]['error']
+    assert results[1]['error'] == 'boom'
+
+    sighting = db.plate_sightings.calls[0][1][0]
+    assert sighting['video_id'] == V1 and sighting['camera_id'] == 'cam_a' and sighting['ts'] == datetime(2024, 5, 1)
+
+
+def test_sightings_need_plate_and_ts(db):
+    results = _apply_plate_batch(db, [{'video_id': str(V1), 'sightings': [{'plate': 'DL01AB1234'}]}], ADMIN)
+    assert results[0]['status'] == 'invalid'
+    assert db.plate_sightings.calls == []
@@ -0,0 +1,50 @@
+# test_plate_text.py (folding, index keys and edit costs behind fuzzy plate search)
+from src.detection.plate_text import (
+    CONFUSABLE_COST, EDIT_COST, clean_text, fold, deletion_keys, plate_keys,
+    lookup_filter, plate_distance, rank_plates,
+)
+
+
+def test_clean_and_fold():
+    assert clean_text(" dl-1 ca 6957 ") == "DL1CA6957"
+    assert clean_text(None) == ""
+    assert fold("DL1LAA69S7") == fold("DL1LAA6957") == "0111AA6957"
+
+
+def test_deletion_keys_meet_within_one_edit():
+    assert deletion_keys("ABC") == {"ABC", "BC", "AC", "AB"}
+    a, b = fold("MH12AB1234"), fold("MH12AB134")   # one char dropped
+    assert deletion_keys(a) & deletion_keys(b)
+    c = fold("MH12XY9999")
+    assert not deletion_keys(a) & deletion_keys(c)
+
+
+def test_plate_keys():
+    keys = plate_keys(["DL1CA6957", "", None])
+    f = fold("DL1CA6957")
+    assert "d:" + f in keys and "g:" + f[:3] in keys
+    assert keys == sorted(keys)
+    assert len([k for k in keys if k.startswith("g:")]) == len(f) - 2
+
+
+def test_lookup_filter():
+    full = lookup_filter("MH12AB1234")
+    assert "d:" + fold("MH12AB1234") in full["plate_keys"]["$in"]
+    assert lookup_filter("AB12", field="plate") == {"plate": {"$all": sorted(["g:" + fold("AB1"), "g:" + fold("B12")])}}
+    assert lookup_filter("AB") is None
+    assert lookup_filter("--") is None
+
+
+def test_plate_distance():
+    assert plate_distance("MH12AB1234", "mh12ab1234") == 0.0
+    assert plate_distance("MH12A81234", "MH12AB1234") == CONFUSABLE_COST
+    assert plate_distance("MH12AX1234", "MH12AB1234") == EDIT_COST
+    assert plate_distance("MH12AB123", "MH12AB1234") == EDIT_COST
+    assert plate_distance("AB12", "MH12AB1234", partial=True) == 0.0
+    assert plate_distance("AB12", "MH12AB1234") > EDIT_COST
+
+
+def test_rank_plates():
+    assert rank_plates("MH12A81234", ["DL1CA6957", "MH12AB1234"]) == (CONFUSABLE_COST, "MH12AB1234")
+    assert rank_plates("CA69", ["DL1CA6957"]) == (0.0, "DL1CA6957")
+    assert rank_plates("MH12AB1234", []) == (float("inf"), None)
@@ -0,0 +1,25 @@
+# test_preprocess.py (reused per-thread buffers give the same variants as fresh arrays)
+import numpy as np
+
+from src.detection import ocr_plates
+
+
+def test_reused_buffers_match_fresh_arrays():
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for h, w in ((40, 160), (38, 151), (90, 300), (41, 158))]
+    for crop in crops:
+        fresh = ocr_plates.preprocess_variants(crop)
+        reused = ocr_plates.preprocess_variants(crop, reuse=True)
+        for (tag, a), (_, b) in zip(fresh, reused):
+            assert np.array_equal(a, b), tag
+
+
+def test_buffers_grow_once_and_are_views():
+    ocr_plates._buffers((10, 10))
+    big = ocr_plates._buffers((60, 200))["otsu"]
+    backing = ocr_plates._PRE.flat["otsu"]
+    for shape in ((40, 150), (41, 151), (59, 200)):
+        view = ocr_plates._buffers(shape)["otsu"]
+        assert view.shape == shape and view.flags.c_contiguous
+        assert np.shares_memory(view, big)
+    assert ocr_plates._PRE.flat["otsu"] is backing
@@ -0,0 +1,84 @@
+# test_routes.py (/search and /sightings through create_app and the auth cookie)
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from src.server import server
+from src.server.auth import make_token_for_user
+
+
+class PymongoLikeDb:
+    """A mongomock database that, like pymongo's Database, refuses bool()."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    def __bool__(self):
+        raise NotImplementedError("Database objects do not implement truth value testing")
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setenv('ev_mongo', 'mongodb://test')
+    monkeypatch.setenv('EV_SECRET_KEY', 'test-secret-' + 'x' * 32)
+    monkeypatch.setattr(server, 'get_db', lambda *a, **kw: PymongoLikeDb(db))
+    monkeypatch.setattr(server, 'search_db', lambda *a, **kw: PymongoLikeDb(db))
+    monkeypatch.setattr(server, 'GridFSBucket', lambda db: None)
+    app = server.create_app()
+    with app.app_context():
+        token = make_token_for_user({'username': 'admin', 'role': 'admin'})
+    c = app.test_client()
+    c.set_cookie('ev_token', token)
+    return c
+
+
+def test_search_and_sightings(db, client):
+    now = datetime.utcnow().replace(microsecond=0)
+    video = db.videos.insert_one({'camera_id': 'cam_a', 'upload_date': now, 'plate_numbers': ['DL1LAA6957'],
+                                  'capture_start': now - timedelta(seconds=60), 'capture_end': now}).inserted_id
+    db.plate_sightings.insert_one({'plate': 'DL1LAA6957', 'camera_id': 'cam_a', 'ts': now - timedelta(seconds=30),
+                                   'video_id': video, 'conf': 0.9})
+
+    resp = client.get('/search?camera_id=cam_a')
+    assert resp.status_code == 200
+    assert [r['video_id'] for r in resp.get_json()['results']] == [str(video)]
+
+    resp = client.get('/sightings?camera_id=cam_a')
+    assert resp.status_code == 200
+    [row] = resp.get_json()['results']
+    assert (row['plate'], row['video_id'], row['seek_offset_s']) == ('DL1LAA6957', str(video), 30.0)
+
+
+def test_exact_plate_is_normalised_on_both_endpoints(db, client):
+    now = datetime.utcnow().replace(microsecond=0)
+    db.videos.insert_one({'camera_id': 'cam_a', 'upload_date': now, 'plate_numbers': ['DL1LAA6957']})
+    db.plate_sightings.insert_one({'plate': 'DL1LAA6957', 'camera_id': 'cam_a', 'ts': now})
+
+    for path in ('/search', '/sightings'):
+        resp = client.get(path + '?plate=dl 1la a6957&exact=1')
+        assert resp.status_code == 200
+        assert len(resp.get_json()['results']) == 1, path
+
+
+def test_create_app_builds_sighting_indexes(db, client):
+    keys = [list(ix['key']) for ix in db.plate_sightings.index_information().values()]
+    assert [('plate_keys', 1), ('ts', -1)] in keys
+    assert [('camera_id', 1), ('ts', -1), ('_id', -1)] in keys
+
+
+def test_search_needs_a_token(client):
+    client.delete_cookie('ev_token')
+    assert client.get('/search').status_code == 401
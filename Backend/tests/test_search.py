@@ -0,0 +1,69 @@
+# test_search.py (capture-window search: bounded capture_start phase, then legacy upload_date docs)
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from src.server import videos_routes as vr
+
+T0 = datetime(2024, 5, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def videos():
+    coll = mongomock.MongoClient().db.videos
+    # 60s segments every minute from 09:50 to 10:09, cam_a
+    for m in range(-10, 10):
+        start = T0 + timedelta(minutes=m)
+        coll.insert_one({'camera_id': 'cam_a', 'capture_start': start, 'capture_end': start + timedelta(seconds=60),
+                         'upload_date': start + timedelta(minutes=5)})
+    # legacy docs: no capture times
+    for m in (1, 2, 30):
+        coll.insert_one({'camera_id': 'cam_a', 'upload_date': T0 + timedelta(minutes=m)})
+    return coll
+
+
+def test_overlapping_is_one_capture_start_range():
+    q = vr._overlapping(T0, T0 + timedelta(minutes=5))
+    assert '$or' not in q
+    assert q['capture_start'] == {'$gte': T0 - timedelta(seconds=vr.MAX_SEGMENT_SECONDS), '$lt': T0 + timedelta(minutes=5)}
+    assert q['capture_end'] == {'$gt': T0}
+
+
+def test_window_pages_capture_docs_then_legacy(videos):
+    window = (T0 + timedelta(seconds=30), T0 + timedelta(minutes=3))
+    phases = vr._search_phases({'camera_id': 'cam_a'}, window)
+    assert [f for f, _ in phases] == ['capture_start', 'upload_date']
+
+    seen, start = [], None
+    while True:
+        rows = vr._fetch_phases(videos, phases, 3, start)
+        page = rows[:2]
+        seen += [(f, d.get('capture_start') or d['upload_date']) for f, d in page]
+        if len(rows) <= 2:
+            break
+        field, last = page[-1]
+        start = vr._decode_cursor(vr._encode_cursor(last, field))
+
+    # segments overlapping 10:00:30-10:03, newest capture first, then legacy uploads in the window
+    assert seen == [
+        ('capture_start', T0 + timedelta(minutes=2)),
+        ('capture_start', T0 + timedelta(minutes=1)),
+        ('capture_start', T0),
+        ('upload_date', T0 + timedelta(minutes=2)),
+        ('upload_date', T0 + timedelta(minutes=1)),
+    ]
+
+
+def test_no_window_sorts_by_upload_date(videos):
+    phases = vr._search_phases({}, None)
+    rows = vr._fetch_phases(videos, phases, 100)
+    dates = [d['upload_date'] for _, d in rows]
+    assert len(rows) == 23 and dates == sorted(dates, reverse=True)
+
+
+def test_cursor_keeps_its_sort_field():
+    doc = {'_id': vr.ObjectId(), 'capture_start': T0}
+    value, _id, field = vr._decode_cursor(vr._encode_cursor(doc, 'capture_start'))
+    assert (value, _id, field) == (T0, doc['_id'], 'capture_start')
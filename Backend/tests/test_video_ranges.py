@@ -0,0 +1,133 @@
+# test_video_ranges.py (Range parsing, If-Range / ETag validators and the plaintext responses)
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from werkzeug.http import is_resource_modified
+
+from src.server import videos_routes as vr
+
+APP = Flask(__name__)
+DATA = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.fixture
+def plain(tmp_path):
+    path = tmp_path / "plain.mp4"
+    path.write_bytes(DATA)
+    return path
+
+
+def send(path, range_header, **headers):
+    with APP.test_request_context(headers=headers):
+        resp = vr._send_plaintext(str(path), range_header, {'ETag': '"x"'})
+        if isinstance(resp, tuple):
+            resp, status = resp
+            resp.status_code = status
+        resp.direct_passthrough = False
+        body = resp.get_data()
+    return resp, body
+
+
+def test_byte_ranges():
+    assert vr._byte_ranges("bytes=0-99", 1000) == [(0, 99)]
+    assert vr._byte_ranges("bytes=900-", 1000) == [(900, 999)]
+    assert vr._byte_ranges("bytes=-100", 1000) == [(900, 999)]
+    assert vr._byte_ranges("bytes=-5000", 1000) == [(0, 999)]
+    assert vr._byte_ranges("bytes=500-2000", 1000) == [(500, 999)]
+    # sorted and coalesced (overlapping or adjacent)
+    assert vr._byte_ranges("bytes=200-299, 0-99,100-149,250-400", 1000) == [(0, 149), (200, 400)]
+
+
+def test_unsatisfiable_and_malformed_ranges():
+    assert vr._byte_ranges("bytes=1000-", 1000) == []
+    assert vr._byte_ranges("bytes=-0", 1000) == []
+    for header in ("bytes=", "items=0-1", "bytes=5", "bytes=-", "bytes=9-3", "bytes=a-b", "bytes=0-1,x"):
+        assert vr._byte_ranges(header, 1000) is None, header
+
+
+def test_whole_file(plain):
+    resp, body = send(plain, None)
+    assert resp.status_code == 200
+    assert body == DATA and resp.headers['Content-Length'] == str(len(DATA))
+    assert resp.headers['ETag'] == '"x"'
+    assert not plain.exists()
+
+
+def test_single_range(plain):
+    resp, body = send(plain, "bytes=-24")
+    assert resp.status_code == 206
+    assert body == DATA[1000:]
+    assert resp.headers['Content-Range'] == 'bytes 1000-1023/1024'
+    assert resp.headers['Content-Length'] == '24'
+
+
+def test_multiple_ranges(plain):
+    resp, body = send(plain, "bytes=0-9,100-119")
+    assert resp.status_code == 206
+    assert resp.mimetype == 'multipart/byteranges'
+    boundary = resp.mimetype_params['boundary']
+    assert resp.headers['Content-Length'] == str(len(body))
+    parts = body.split(f'--{boundary}'.encode())
+    assert parts[0] == b'' and parts[-1] == b'--\r\n'
+    assert parts[1].endswith(b'Content-Range: bytes 0-9/1024\r\n\r\n' + DATA[0:10] + b'\r\n')
+    assert parts[2].endswith(b'Content-Range: bytes 100-119/1024\r\n\r\n' + DATA[100:120] + b'\r\n')
+
+
+def test_too_many_ranges_become_one_span(plain):
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(vr.MAX_RANGES + 1))
+    resp, body = send(plain, header)
+    assert resp.status_code == 206
+    assert resp.headers['Content-Range'] == f'bytes 0-{vr.MAX_RANGES * 10 + 1}/1024'
+    assert body == DATA[:vr.MAX_RANGES * 10 + 2]
+
+
+def test_bad_ranges(plain, tmp_path):
+    resp, _ = send(plain, "bytes=2000-")
+    assert resp.status_code == 416
+    assert resp.headers['Content-Range'] == 'bytes */1024'
+    assert not plain.exists()
+
+    other = tmp_path / "other.mp4"
+    other.write_bytes(DATA)
+    resp, _ = send(other, "bytes=oops")
+    assert resp.status_code == 400
+    assert not other.exists()
+
+
+def test_validators():
+    video = {'_id': 'abc', 'gridfs_id': 'f00', 'upload_date': datetime(2024, 5, 1, 10, 0, 0, 123456)}
+    etag, last_modified = vr._validators(video)
+    assert etag == f"f00-{int(last_modified.timestamp()):x}"
+    assert last_modified.microsecond == 0 and last_modified.tzinfo is not None
+    assert vr._validators({'_id': 'abc'}) == ("abc-0", None)
+
+
+def test_if_range():
+    video = {'_id': 'abc', 'upload_date': datetime(2024, 5, 1, 10, 0, 0)}
+    etag, last_modified = vr._validators(video)
+    headers = vr._cache_headers(etag, last_modified)
+    cases = [
+        ({}, True),
+        ({'If-Range': headers['ETag']}, True),
+        ({'If-Range': '"abc-1"'}, False),
+        ({'If-Range': 'W/' + headers['ETag']}, False),
+        ({'If-Range': headers['Last-Modified']}, True),
+        ({'If-Range': 'Wed, 01 May 2024 10:00:01 GMT'}, False),
+    ]
+    for request_headers, expected in cases:
+        with APP.test_request_context(headers=request_headers):
+            assert vr._if_range_matches(etag, last_modified) is expected, request_headers
+
+
+def test_not_modified_from_cache_headers():
+    etag, last_modified = vr._validators({'_id': 'abc', 'upload_date': datetime(2024, 5, 1, 10, 0, 0)})
+    headers = vr._cache_headers(etag, last_modified)
+    for request_headers, modified in (
+        ({'If-None-Match': headers['ETag']}, False),
+        ({'If-None-Match': '"other"'}, True),
+        ({'If-Modified-Since': headers['Last-Modified']}, False),
+        ({}, True),
+    ):
+        with APP.test_request_context(headers=request_headers) as ctx:
+            assert is_resource_modified(ctx.request.environ, etag=etag, last_modified=last_modified) is modified
@@ -15,13 +15,14 @@ ENCRYPTED_DIR = DATA_DIR / 'encrypted'
 CAMERA_ID = os.environ.get('EV_CAMERA_ID', 'cam_01')
 
 
-def record_thread(stop_event):
+def record_thread(stop_event, detector=None):
     from src.camera.record import ContinuousRecorder
     try:
         recorder = ContinuousRecorder(
             camera_id=int(os.environ.get('EV_CAMERA_ID_NUM', 0)),
             output_dir=str(RAW_DIR),
-            segment_duration=int(os.environ.get('EV_SEGMENT_DURATION', 180))
+            segment_duration=int(os.environ.get('EV_SEGMENT_DURATION', 180)),
+            detector=detector
         )
         recorder.record()
     except Exception as e:
@@ -29,6 +30,21 @@ def record_thread(stop_event):
         import traceback; traceback.print_exc()
 
 
+def make_detector():
+    if os.environ.get('EV_LIVE_DETECT', 'true').lower() != 'true':
+        return None
+    plate_model = os.environ.get('EV_PLATE_MODEL', '')
+    if not plate_model or not os.path.exists(plate_model):
+        print(f'⚠️ detection stage off: plate model not provided/found ({plate_model!r}, set EV_PLATE_MODEL)')
+        return None
+    try:
+        from src.detection.live_detect import LiveDetector
+        return LiveDetector(camera_id=CAMERA_ID)
+    except Exception as e:
+        print(f'❌ detection stage: {e}')
+        return None
+
+
 def encryption_thread(stop_event):
     from src.encryption.encryption import VideoEncryptor
     try:
@@ -91,9 +107,10 @@ def main():
     (ROOT / 'configs').mkdir(parents=True, exist_ok=True)
     
     stop_event = threading.Event()
+    detector = make_detector()
 
     threads = [
-        threading.Thread(target=record_thread, args=(stop_event,), daemon=True, name="Recording"),
+        threading.Thread(target=record_thread, args=(stop_event, detector), daemon=True, name="Recording"),
         threading.Thread(target=encryption_thread, args=(stop_event,), daemon=True, name="Encryption"),
         threading.Thread(target=uploader_thread, args=(stop_event,), daemon=True, name="Upload"),
         threading.Thread(target=server_thread, args=(stop_event,), daemon=True, name="Server"),
@@ -107,6 +124,10 @@ def main():
         t.start()
         print(f"✅ {t.name}")
 
+    if detector is not None:
+        detector.start()
+        print("✅ Detection")
+
     print("\n📊 Running. Ctrl+C to stop.\n")
 
     try:
@@ -115,6 +136,9 @@ def main():
     except KeyboardInterrupt:
         print('\n🛑 Stopping...')
         stop_event.set()
+        if detector is not None:
+            # finish queued OCR and deliver pending watchlist alerts
+            detector.close()
 
 
 if __name__ == '__main__':
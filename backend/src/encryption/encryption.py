@@ -44,6 +44,14 @@ class VideoEncryptor:
         size2 = filepath.stat().st_size
         return size1 == size2
     
+    def read_segment_info(self, filepath):
+        """Capture info the recorder wrote next to the raw segment (may be missing)."""
+        try:
+            with open(filepath.with_suffix('.json')) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
     def encrypt_file(self, filepath):
         """Encrypt a single video file using AES-EAX."""
         try:
@@ -60,6 +68,14 @@ class VideoEncryptor:
             output_name = f"enc_{timestamp}.WattLagGyi"
             output_path = self.out_folder / output_name
             
+            # Sidecar first so the uploader can tie the upload back to the raw segment;
+            # it carries the recorder's capture interval (file mtime ~ last frame if missing)
+            raw_info = self.read_segment_info(filepath)
+            info = {**raw_info, 'segment': filepath.name}
+            info.setdefault('capture_end', filepath.stat().st_mtime)
+            with open(output_path.with_suffix('.json'), 'w') as f:
+                json.dump(info, f)
+            
             # Write encrypted file: nonce + tag + ciphertext
             with open(output_path, 'wb') as f:
                 f.write(cipher.nonce)  # 16 bytes
@@ -68,8 +84,12 @@ class VideoEncryptor:
             
             print(f"✓ Encrypted: {filepath.name} -> {output_name} ({len(ciphertext)} bytes)")
             
-            # Delete original
+            # Delete original (and the recorder's sidecar)
             filepath.unlink()
+            try:
+                filepath.with_suffix('.json').unlink()
+            except FileNotFoundError:
+                pass
             
             return output_path
             